@@ -0,0 +1,266 @@
+"""
+ASGI-middleware сжатия ответов (Brotli или gzip) с учетом Accept-Encoding.
+
+Сжимаются только ответы с текстовыми типами содержимого размером не меньше
+порога. Уже сжатые медиафайлы (изображения, видео, HLS-сегменты) пропускаются.
+Потоковые ответы сжимаются по частям без буферизации всего тела.
+"""
+import os
+import zlib
+from typing import Optional
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # Brotli необязателен: без него используется только gzip
+    brotli = None
+
+# Минимальный размер ответа для сжатия в байтах
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Уровень сжатия gzip (1-9) и качество Brotli (0-11)
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_CONTENT_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/vnd.apple.mpegurl",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """
+    Разбирает заголовок Accept-Encoding в словарь {кодировка: q}
+
+    Args:
+        header (str): Значение заголовка
+
+    Returns:
+        dict: Кодировки в нижнем регистре с их весами
+    """
+    encodings = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[token] = q
+    return encodings
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    """
+    Выбирает кодировку ответа: Brotli предпочтительнее gzip
+
+    Args:
+        header (str): Значение заголовка Accept-Encoding
+
+    Returns:
+        Optional[str]: 'br', 'gzip' или None, если сжатие не поддерживается клиентом
+    """
+    encodings = parse_accept_encoding(header)
+    wildcard = encodings.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    for encoding in candidates:
+        if encodings.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def is_compressible(content_type: str) -> bool:
+    """
+    Проверяет, входит ли тип содержимого в список сжимаемых
+    """
+    content_type = content_type.split(";")[0].strip().lower()
+    return any(
+        content_type.startswith(allowed) if allowed.endswith("/") else content_type == allowed
+        for allowed in COMPRESSIBLE_CONTENT_TYPES
+    )
+
+
+class _Compressor:
+    """
+    Обертка над потоковыми компрессорами gzip и Brotli с единым интерфейсом
+    """
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31 - формат gzip (заголовок и контрольная сумма)
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Сжимает очередную часть тела и сбрасывает буфер, чтобы клиент сразу ее получил
+        """
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """
+        Завершает поток сжатия
+        """
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы в соответствии с Accept-Encoding клиента
+
+    Args:
+        app: ASGI-приложение
+        minimum_size (int): Минимальный размер ответа для сжатия
+        gzip_level (int): Уровень сжатия gzip
+        brotli_quality (int): Качество сжатия Brotli
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(send, encoding, self.minimum_size, self.gzip_level, self.brotli_quality)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """
+    Перехватывает сообщения ответа и принимает решение о сжатии
+    по первой части тела
+    """
+
+    def __init__(self, send, encoding: str, minimum_size: int, gzip_level: int, brotli_quality: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.start_message = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def send(self, message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.start_message = message
+            headers = {name.lower(): value for name, value in message.get("headers", [])}
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            status = message.get("status", 200)
+            # Не трогаем ответы без тела, уже сжатые и не текстовые
+            if (
+                status < 200 or status in (204, 206, 304)
+                or b"content-encoding" in headers
+                or not is_compressible(content_type)
+            ):
+                self.passthrough = True
+                await self._send(message)
+                return
+            # Длина известна заранее: маленькие ответы не сжимаем, даже если
+            # тело придет несколькими сообщениями
+            content_length = headers.get(b"content-length")
+            if content_length is not None and int(content_length) < self.minimum_size:
+                self.passthrough = True
+                metrics.increment("compression.skipped_small")
+                await self._send(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            # Первая часть тела: маленькие ответы отдаем как есть
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                metrics.increment("compression.skipped_small")
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding, self.gzip_level, self.brotli_quality)
+            headers = [
+                (name, value) for name, value in self.start_message.get("headers", [])
+                if name.lower() not in (b"content-length", b"vary")
+            ]
+            headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+            headers.append((b"vary", b"Accept-Encoding"))
+
+            if not more_body:
+                # Весь ответ в одном сообщении: сжимаем целиком и указываем длину
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                self.start_message["headers"] = headers
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                self._record(len(body), len(compressed))
+                return
+
+            self.start_message["headers"] = headers
+            await self._send(self.start_message)
+
+        # Потоковый ответ: сжимаем каждую часть по мере поступления
+        compressed = self.compressor.compress(body) if body else b""
+        if not more_body:
+            compressed += self.compressor.finish()
+        self.bytes_in += len(body)
+        self.bytes_out += len(compressed)
+        await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+        if not more_body:
+            self._record(self.bytes_in, self.bytes_out)
+
+    def _record(self, bytes_in: int, bytes_out: int):
+        """
+        Обновляет метрики сжатия
+        """
+        metrics.increment(f"compression.{self.encoding}.responses")
+        metrics.increment("compression.bytes_in", bytes_in)
+        metrics.increment("compression.bytes_out", bytes_out)
+        metrics.increment("compression.bytes_saved", bytes_in - bytes_out)
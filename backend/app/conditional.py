@@ -0,0 +1,114 @@
+"""
+Поддержка условных GET-запросов: заголовки ETag/Last-Modified и ответ 304.
+
+ETag строится из типа ресурса, его ID и версии (revision), поэтому для проверки
+If-None-Match достаточно выбрать из БД одну колонку, не загружая объект целиком.
+ETag слабые (W/), так как тело ответа может быть сжато по-разному.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(resource: str, resource_id: int, revision: int) -> str:
+    """
+    Формирует слабый ETag ресурса
+
+    Args:
+        resource (str): Тип ресурса (например, 'animal')
+        resource_id (int): ID ресурса
+        revision (int): Версия ресурса
+
+    Returns:
+        str: Значение заголовка ETag
+    """
+    return f'W/"{resource}-{resource_id}-r{revision}"'
+
+
+def _http_date(value: datetime) -> str:
+    """
+    Форматирует дату (UTC без часового пояса) для HTTP-заголовков
+    """
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Слабое сравнение ETag со значением If-None-Match (список через запятую или '*')
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Проверяет, актуальна ли копия ресурса у клиента
+
+    If-Modified-Since учитывается только при отсутствии If-None-Match.
+
+    Args:
+        request (Request): HTTP-запрос
+        etag (str): Текущий ETag ресурса
+        last_modified (datetime, optional): Время последнего изменения ресурса (UTC)
+
+    Returns:
+        bool: True, если можно ответить 304 Not Modified
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    """
+    Формирует заголовки валидации кэша
+
+    Браузер хранит ответ, но перед использованием перепроверяет его
+    (Cache-Control: no-cache), получая 304 при неизменной версии.
+
+    Args:
+        etag (str): ETag ресурса
+        last_modified (datetime, optional): Время последнего изменения ресурса (UTC)
+
+    Returns:
+        dict: Заголовки ответа
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """
+    Формирует ответ 304 Not Modified
+
+    Args:
+        etag (str): ETag ресурса
+        last_modified (datetime, optional): Время последнего изменения ресурса (UTC)
+
+    Returns:
+        Response: Пустой ответ со статусом 304
+    """
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, text, inspect, Delete, Insert, Update
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.elements import TextClause
 import os
 import traceback
 import psycopg2
@@ -13,6 +14,13 @@ POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT")
 
+# Размер пула соединений каждого процесса (при нескольких воркерах соединений будет в workers раз больше)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Реплики для чтения: хосты через запятую (host или host:port), учетные данные и имя БД как у основной
+POSTGRES_REPLICA_HOSTS = os.getenv("POSTGRES_REPLICA_HOSTS", "")
+
 # Формируем URL подключения к базе данных
 DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
@@ -75,6 +83,8 @@ try:
         DATABASE_URL,
         pool_pre_ping=True,
         pool_recycle=3600,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
         connect_args={"connect_timeout": 10}
     )
     
@@ -92,8 +102,58 @@ except Exception as e:
     print("Использование резервной базы данных SQLite в памяти")
     engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
 
+def create_replica_engines(hosts: str) -> list:
+    """
+    Создает движки реплик для чтения
+    
+    Args:
+        hosts (str): Хосты реплик через запятую (host или host:port)
+        
+    Returns:
+        list: Движки SQLAlchemy (пустой список, если реплики не заданы)
+    """
+    replicas = []
+    for item in hosts.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
+        replicas.append(create_engine(
+            f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{host}:{port or POSTGRES_PORT}/{POSTGRES_DB}",
+            pool_pre_ping=True,
+            pool_recycle=3600,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            # Недоступная реплика не должна надолго задерживать запрос: он уйдет на основную БД
+            connect_args={"connect_timeout": 2}
+        ))
+    return replicas
+
+
+# Реплики используются только вместе с основной PostgreSQL (не с резервной SQLite)
+replica_engines = create_replica_engines(POSTGRES_REPLICA_HOSTS) if engine.dialect.name == "postgresql" else []
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая читает с реплики, если она назначена сессии (info["replica"],
+    см. app.replicas.get_read_db). Запись (flush, INSERT/UPDATE/DELETE и текстовые
+    запросы) всегда выполняется на основной БД, после чего сессия до конца
+    читает с основной БД и видит свои изменения
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None:
+            if self._flushing or isinstance(clause, (Insert, Update, Delete, TextClause)):
+                del self.info["replica"]
+            else:
+                return replica
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
 # Создаем фабрику сессий
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 # Базовый класс для всех моделей
 Base = declarative_base()
@@ -182,6 +242,95 @@ def populate_initial_data():
         print(f"ОШИБКА при заполнении начальными данными: {str(e)}")
         traceback.print_exc()
 
+def add_missing_columns():
+    """
+    Добавляет в существующие таблицы колонки, которые появились в моделях позже.
+    
+    create_all создает только отсутствующие таблицы и не изменяет существующие,
+    поэтому новые колонки добавляются через ALTER TABLE. Колонки добавляются
+    допускающими NULL, со значением по умолчанию из server_default модели.
+    SQLite не допускает в ADD COLUMN неконстантное значение по умолчанию
+    (например, now()), поэтому такие колонки добавляются без него и
+    заполняются отдельным UPDATE.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            
+            column_type = column.type.compile(dialect=engine.dialect)
+            statements = [f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}']
+            if column.server_default is not None:
+                default = column.server_default.arg
+                if isinstance(default, str):
+                    statements[0] += f" DEFAULT '{default}'"
+                else:
+                    default_sql = str(default.compile(dialect=engine.dialect))
+                    if engine.dialect.name == "sqlite":
+                        statements.append(
+                            f"UPDATE {table.name} SET {column.name} = {default_sql} WHERE {column.name} IS NULL"
+                        )
+                    else:
+                        statements[0] += f" DEFAULT {default_sql}"
+            
+            # Каждая колонка добавляется в своей транзакции, чтобы ошибка
+            # в одной не мешала остальным
+            try:
+                with engine.begin() as connection:
+                    for statement in statements:
+                        connection.execute(text(statement))
+                print(f"Добавлена колонка {table.name}.{column.name}")
+            except Exception as e:
+                print(f"ОШИБКА при добавлении колонки {table.name}.{column.name}: {str(e)}")
+
+def remove_duplicate_favorites():
+    """
+    Удаляет повторные записи избранного (одно и то же животное у одного пользователя),
+    оставляя самую раннюю. Нужно перед созданием уникального индекса в существующей БД.
+    """
+    try:
+        with engine.begin() as connection:
+            result = connection.execute(text(
+                "DELETE FROM favorite_animals WHERE id NOT IN "
+                "(SELECT MIN(id) FROM favorite_animals GROUP BY user_id, animal_id)"
+            ))
+        if result.rowcount:
+            print(f"Удалено повторяющихся записей избранного: {result.rowcount}")
+    except Exception as e:
+        print(f"ОШИБКА при удалении повторяющихся записей избранного: {str(e)}")
+
+def add_missing_indexes():
+    """
+    Создает индексы моделей, которых еще нет в существующих таблицах.
+    
+    create_all создает индексы только вместе с новой таблицей, поэтому
+    индексы, добавленные в модели позже, создаются здесь.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            
+            try:
+                index.create(bind=engine)
+                print(f"Создан индекс {index.name}")
+            except Exception as e:
+                print(f"ОШИБКА при создании индекса {index.name}: {str(e)}")
+
 # Функция для создания всех таблиц в БД, если они не существуют
 def init_db():
     """
@@ -200,11 +349,18 @@ def init_db():
         from .models import User, AnimalType, Animal, Habitat, AnimalPhoto
         from .models import Test, Question, QuestionType, AnswerOption
         from .models import QuestionAnswer, TestQuestion, TestScore, FavoriteAnimal
+        from .models import VideoTranscodeJob, TestLeaderboardEntry, TestLeaderboardState, MediaObject, RateLimitBucket
+        from .models import RevokedToken
         
         # Создаем все таблицы
         print("Создание таблиц, если они не существуют...")
         Base.metadata.create_all(bind=engine)
         
+        # Добавляем новые колонки и индексы в уже существующие таблицы
+        add_missing_columns()
+        remove_duplicate_favorites()
+        add_missing_indexes()
+        
         # Проверяем наличие таблиц
         inspector = inspect(engine)
         tables = inspector.get_table_names()
@@ -223,22 +379,20 @@ def get_db():
     """
     Функция-генератор для получения сессии базы данных.
     Используется как зависимость в FastAPI для предоставления сессии в запросах.
+    Все зависимости и обработчик запроса получают одну и ту же сессию
+    (FastAPI кэширует зависимость в пределах запроса), поэтому запрос
+    занимает не больше одного соединения из пула.
     
     Yields:
         Session: Сессия базы данных
         
     Примечание:
-        Функция автоматически закрывает сессию после использования
-        и обрабатывает возможные исключения.
+        Соединение берется из пула при первом запросе к БД (проверку
+        соединения выполняет pool_pre_ping), а после ответа сессия закрывается
+        и соединение возвращается в пул.
     """
     db = SessionLocal()
     try:
-        db.execute(text("SELECT 1"))
-        print("Сессия БД успешно создана")
         yield db
-    except Exception as e:
-        print(f"ОШИБКА при работе с сессией БД: {str(e)}")
-        raise
     finally:
-        print("Закрытие сессии БД")
-        db.close()
\ No newline at end of file
+        db.close()
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import Optional
@@ -11,18 +11,30 @@ from starlette.requests import Request
 from starlette.responses import Response
 import sys
 
-from .database import engine, get_db, init_db, Base
+from .database import engine, get_db, init_db, Base, SessionLocal, replica_engines
 from .models import Base
 from .routers import router, auth, animal_types, animals, habitats, media, tests, question, test_scores
+from .services import video_transcoding_service, media_processing_service, leaderboard_service, media_gc, scratch_space
+from .services import token_revocation
+from .services.auth_service import Principal, get_current_admin_user
+from .compression import CompressionMiddleware
+from .replicas import ReplicaStickinessMiddleware
+from . import metrics
+
+# Структуру БД создает главный процесс, если приложение запущено через app.server
+DB_INIT_ON_IMPORT = os.getenv("DB_INIT_ON_IMPORT", "true").lower() == "true"
 
 # Создаем таблицы БД
-Base.metadata.create_all(bind=engine)
+if DB_INIT_ON_IMPORT:
+    Base.metadata.create_all(bind=engine)
 
 # Инициализация приложения FastAPI с настройкой для больших файлов
 app = FastAPI(
     title="Zooracle API",
     description="API для приложения Zooracle",
-    version="0.1.0"
+    version="0.1.0",
+    # orjson сериализует ответы заметно быстрее стандартного json
+    default_response_class=ORJSONResponse
 )
 
 # Класс middleware для увеличения лимита на размер файлов
@@ -35,6 +47,12 @@ class LargeFileMiddleware(BaseHTTPMiddleware):
 # Добавляем middleware для больших файлов
 app.add_middleware(LargeFileMiddleware)
 
+# Сжимаем текстовые ответы (JSON, плейлисты) по Accept-Encoding клиента
+app.add_middleware(CompressionMiddleware)
+
+# После изменения данных чтения клиента временно идут на основную БД, а не на реплики
+app.add_middleware(ReplicaStickinessMiddleware)
+
 # Настраиваем кроссдоменные запросы (CORS)
 site_ip = os.environ.get("FRONTEND_URL", "").strip()
 frontend_url = os.environ.get("FRONTEND_URL", "").strip()
@@ -77,12 +95,66 @@ app.add_middleware(
 
 # Инициализируем структуру базы данных при запуске приложения
 try:
-    init_db()
+    if DB_INIT_ON_IMPORT:
+        init_db()
 except Exception as e:
     print(f"КРИТИЧЕСКАЯ ОШИБКА: Не удалось инициализировать базу данных: {str(e)}")
     print("Детали ошибки:")
     traceback.print_exc()
 
+@app.on_event("startup")
+def start_background_workers():
+    """
+    Запускает фоновые потоки уборки временных файлов, обработки медиафайлов,
+    перекодирования видео и сборки мусора в хранилище
+    """
+    # Уборка выполняется до запуска перекодирования, удаляя файлы, брошенные прошлым запуском
+    scratch_space.start_janitor()
+    media_processing_service.start_workers()
+    video_transcoding_service.start_workers()
+    media_gc.start_gc()
+
+@app.on_event("startup")
+def start_token_revocation():
+    """
+    Загружает состояние отзыва токенов и подписывается на его изменения в других воркерах
+    """
+    token_revocation.start()
+
+@app.on_event("startup")
+def backfill_leaderboard():
+    """
+    Заполняет сводную таблицу рейтинга по ранее сохраненным результатам тестов
+    """
+    db = SessionLocal()
+    try:
+        leaderboard_service.backfill_from_scores(db)
+    except Exception as e:
+        print(f"ОШИБКА при заполнении рейтинга тестов: {str(e)}")
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    """
+    Останавливает фоновые потоки уборки временных файлов, обработки медиафайлов,
+    перекодирования видео, сборки мусора в хранилище и слушатель отзыва токенов
+    """
+    media_processing_service.stop_workers()
+    video_transcoding_service.stop_workers()
+    media_gc.stop_gc()
+    scratch_space.stop_janitor()
+    token_revocation.stop()
+
+@app.on_event("shutdown")
+def close_database_pools():
+    """
+    Закрывает соединения пулов основной БД и реплик при остановке воркера
+    """
+    engine.dispose()
+    for replica in replica_engines:
+        replica.dispose()
+
 # Подключаем все API-маршруты через единый роутер
 app.include_router(router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
@@ -132,6 +204,21 @@ def db_status(db: Session = Depends(get_db)):
     except Exception as e:
         return {"status": "error", "message": f"Database connection failed: {str(e)}"}
 
+@app.get("/api/metrics")
+def get_metrics(current_user: Principal = Depends(get_current_admin_user)):
+    """
+    Эндпоинт с метриками текущего процесса (сжатие ответов и др.).
+    Доступен только администраторам: счетчики отказов авторизации, лимитов
+    и ошибок хранилища не должны быть видны извне.
+    
+    Args:
+        current_user (Principal): Текущий пользователь (администратор)
+    
+    Returns:
+        dict: Счетчики, текущие значения и распределения метрик
+    """
+    return metrics.snapshot()
+
 # Перехватываем все остальные GET-запросы, чтобы обрабатывать маршруты SPA
 @app.get("/{full_path:path}")
 async def catch_all(full_path: str):
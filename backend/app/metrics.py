@@ -0,0 +1,74 @@
+"""
+Простейший реестр метрик приложения.
+
+Счетчики, значения и распределения хранятся в памяти процесса, поэтому при
+запуске нескольких воркеров каждый из них отдает свои собственные значения.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+_summaries: Dict[str, Dict[str, float]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """
+    Увеличивает счетчик
+
+    Args:
+        name (str): Имя метрики
+        value (float, optional): Величина приращения. По умолчанию 1.
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """
+    Устанавливает текущее значение метрики (например, занятое место на диске)
+
+    Args:
+        name (str): Имя метрики
+        value (float): Значение
+    """
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float) -> None:
+    """
+    Добавляет наблюдение в распределение (например, задержку операции)
+
+    Args:
+        name (str): Имя метрики
+        value (float): Наблюдаемое значение
+    """
+    with _lock:
+        summary = _summaries.get(name)
+        if summary is None:
+            _summaries[name] = {"count": 1, "sum": value, "max": value}
+        else:
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+
+def snapshot() -> dict:
+    """
+    Возвращает копию всех метрик
+
+    Returns:
+        dict: Словарь с разделами counters, gauges и summaries
+    """
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "summaries": {
+                name: {**summary, "avg": summary["sum"] / summary["count"]}
+                for name, summary in _summaries.items()
+            },
+        }
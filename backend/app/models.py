@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Text
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Float, Text, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime, timedelta
 import secrets
@@ -14,6 +14,8 @@ class User(Base):
     email = Column(Text, nullable=False)
     password = Column(Text, nullable=False)
     is_admin = Column(Boolean, nullable=False)
+    # Версия токенов: увеличивается при отзыве всех сессий пользователя
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
 
     favorite_animals = relationship("FavoriteAnimal", back_populates="user")
     test_scores = relationship("TestScore", back_populates="user")
@@ -25,7 +27,8 @@ class AnimalPhoto(Base):
 
     id = Column(Integer, primary_key=True)
     animal_id = Column(Integer, ForeignKey("animals.id"), nullable=False)
-    photo_id = Column(Text, nullable=False)
+    # Индекс нужен для подсчета ссылок на медиафайл (см. media_registry)
+    photo_id = Column(Text, nullable=False, index=True)
 
     animal = relationship("Animal", back_populates="photos")
 
@@ -47,9 +50,12 @@ class Animal(Base):
     animal_type_id = Column(Integer, ForeignKey("animal_types.id"))
     habitat_id = Column(Integer, ForeignKey("habitats.id"))
     description = Column(Text, nullable=False)
-    preview_id = Column(Text)
-    video_id = Column(Text)
+    preview_id = Column(Text, index=True)
+    video_id = Column(Text, index=True)
     test_id = Column(Integer, ForeignKey("tests.id"))
+    # Версия записи для ETag: увеличивается при любом изменении данных карточки животного
+    revision = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
 
     animal_type = relationship("AnimalType", back_populates="animals")
     habitat = relationship("Habitat", back_populates="animals")
@@ -70,6 +76,11 @@ class AnswerOption(Base):
 
 class FavoriteAnimal(Base):
     __tablename__ = "favorite_animals"
+    __table_args__ = (
+        # Одно животное попадает в избранное пользователя не более одного раза;
+        # индекс также служит целью для INSERT ... ON CONFLICT DO NOTHING
+        Index("ux_favorite_animals_user_animal", "user_id", "animal_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -130,14 +141,25 @@ class TestScore(Base):
         test_id (int): Идентификатор теста
         score (str): Результат теста в формате "X/Y" (количество верных/всего вопросов)
         date (DateTime): Дата и время прохождения теста
+        idempotency_key (str): Ключ идемпотентности попытки (защита от повторной записи при ретраях)
     """
     __tablename__ = "test_score"
+    __table_args__ = (
+        # Индексы для выгрузки результатов по периоду и по тесту,
+        # а также для выборки результатов пользователя
+        Index("ix_test_score_date", "date"),
+        Index("ix_test_score_test_id_date", "test_id", "date"),
+        Index("ix_test_score_user_id_date", "user_id", "date"),
+        # Одна попытка на ключ идемпотентности у пользователя (NULL не ограничивается)
+        Index("ux_test_score_user_idempotency_key", "user_id", "idempotency_key", unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     test_id = Column(Integer, ForeignKey("tests.id"))
     score = Column(Text, nullable=False)
     date = Column(DateTime, nullable=False)
+    idempotency_key = Column(Text, nullable=True)
 
     user = relationship("User", back_populates="test_scores")
     test = relationship("Test", back_populates="test_scores")
@@ -148,6 +170,9 @@ class Test(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(Text, nullable=False)
+    # Версия теста для ETag: увеличивается при изменении теста и его вопросов
+    revision = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
 
     animals = relationship("Animal", back_populates="test")
     test_scores = relationship("TestScore", back_populates="test")
@@ -227,4 +252,151 @@ class PasswordResetToken(Base):
         """
         Помечает токен как использованный
         """
-        self.is_used = True
\ No newline at end of file
+        self.is_used = True
+
+class VideoTranscodeJob(Base):
+    """
+    Модель задачи перекодирования видео в HLS
+    
+    Attributes:
+        id (int): Уникальный идентификатор задачи
+        video_id (str): Идентификатор исходного видео (совпадает с Animal.video_id)
+        source_object (str): Имя исходного объекта в хранилище (например, 'videos/<id>.mp4')
+        status (str): Статус задачи: pending, processing, completed или failed
+        progress (float): Прогресс перекодирования в процентах (0-100)
+        renditions (str): Список готовых качеств через запятую (например, '360p,720p')
+        error (str): Текст ошибки, если задача завершилась неудачно
+        claim_token (str): Метка выполнения, выданная при захвате задачи; записи результата
+            выполняются только с ней, поэтому перехваченная задача не перезапишет новый запуск
+        created_at (DateTime): Дата и время создания задачи
+        updated_at (DateTime): Дата и время последнего обновления задачи (обновляется
+            во время выполнения, см. video_transcoding_service)
+    """
+    __tablename__ = "video_transcode_jobs"
+
+    id = Column(Integer, primary_key=True)
+    video_id = Column(Text, nullable=False, index=True)
+    source_object = Column(Text, nullable=False)
+    status = Column(Text, nullable=False, default="pending")
+    progress = Column(Float, nullable=False, default=0.0)
+    renditions = Column(Text)
+    error = Column(Text)
+    claim_token = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class MediaObject(Base):
+    """
+    Медиафайл, сохраненный в хранилище под адресом по содержимому
+    
+    Attributes:
+        file_id (str): SHA-256 содержимого файла (используется как ID файла)
+        object_name (str): Имя объекта в хранилище (например, 'images/<sha256>.jpg')
+        size (int): Размер файла в байтах
+        content_type (str): MIME-тип файла, заявленный при загрузке
+        uploaded_at (DateTime): Дата и время последней загрузки этого содержимого
+        detected_type (str): MIME-тип, определенный по сигнатуре содержимого
+        width (int): Ширина изображения или кадра видео в пикселях (с учетом поворота)
+        height (int): Высота изображения или кадра видео в пикселях (с учетом поворота)
+        duration (float): Длительность видео в секундах
+        codec (str): Кодек видеопотока
+        processing_status (str): Статус обработки (pending, processing, completed, rejected, failed)
+        processing_error (str): Причина отклонения или текст ошибки обработки
+        processed_at (DateTime): Дата и время последнего изменения статуса обработки
+    """
+    __tablename__ = "media_objects"
+
+    file_id = Column(Text, primary_key=True)
+    object_name = Column(Text, nullable=False)
+    size = Column(Integer, nullable=False)
+    content_type = Column(Text)
+    uploaded_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    detected_type = Column(Text)
+    width = Column(Integer)
+    height = Column(Integer)
+    duration = Column(Float)
+    codec = Column(Text)
+    processing_status = Column(Text, default="pending", server_default="pending", nullable=False, index=True)
+    processing_error = Column(Text)
+    processed_at = Column(DateTime)
+
+
+class RevokedToken(Base):
+    """
+    Отозванный токен (выход из сессии или использованный токен обновления)
+    
+    Attributes:
+        jti (str): Идентификатор токена
+        user_id (int): ID пользователя, которому выдан токен
+        expires_at (DateTime): Срок действия токена; после него запись не нужна
+        revoked_at (DateTime): Дата и время отзыва
+    """
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(Text, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class RateLimitBucket(Base):
+    """
+    Состояние корзины токенов ограничителя частоты запросов, общее для всех воркеров
+    
+    Attributes:
+        key (str): Ключ корзины (область ограничения и IP-адрес или хэш email/логина)
+        tokens (float): Количество оставшихся токенов на момент updated_at
+        updated_at (float): Время последнего списания (секунды Unix)
+    """
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(Text, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)
+
+
+class TestLeaderboardEntry(Base):
+    """
+    Лучший результат пользователя по тесту (сводная таблица для рейтинга)
+    
+    Attributes:
+        id (int): Уникальный идентификатор записи
+        test_id (int): Идентификатор теста
+        user_id (int): Идентификатор пользователя
+        score_percentage (int): Лучший процент правильных ответов
+        correct_answers (int): Количество правильных ответов в лучшей попытке
+        total_questions (int): Количество вопросов в лучшей попытке
+        achieved_at (DateTime): Дата и время лучшей попытки
+        version (int): Версия рейтинга теста, в которой запись изменилась последний раз
+    """
+    __tablename__ = "test_leaderboard"
+    __table_args__ = (
+        Index("ux_test_leaderboard_test_user", "test_id", "user_id", unique=True),
+        # Для догрузки изменений рейтинга начиная с известной версии
+        Index("ix_test_leaderboard_test_version", "test_id", "version"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    test_id = Column(Integer, ForeignKey("tests.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    score_percentage = Column(Integer, nullable=False)
+    correct_answers = Column(Integer, nullable=False)
+    total_questions = Column(Integer, nullable=False)
+    achieved_at = Column(DateTime, nullable=False)
+    version = Column(Integer, nullable=False)
+
+
+class TestLeaderboardState(Base):
+    """
+    Текущая версия рейтинга теста. Увеличивается при каждом изменении
+    сводной таблицы рейтинга и позволяет воркерам догружать только изменения.
+    
+    Attributes:
+        test_id (int): Идентификатор теста
+        version (int): Версия рейтинга
+    """
+    __tablename__ = "test_leaderboard_state"
+
+    test_id = Column(Integer, ForeignKey("tests.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,156 @@
+"""
+Чтение с реплик PostgreSQL для маршрутов каталога и справочников.
+
+Маршрут, который только читает данные, получает сессию зависимостью
+get_read_db вместо get_db. Для GET/HEAD-запросов такая сессия читает с одной
+из реплик POSTGRES_REPLICA_HOSTS (по кругу), а любая запись в ней все равно
+уходит на основную БД (см. database.RoutingSession). Без настроенных реплик
+get_read_db ничем не отличается от get_db.
+
+Чтобы пользователь сразу видел свои изменения (например, после добавления
+животного в избранное), в течение REPLICA_STICKY_SECONDS после успешного
+изменяющего запроса его чтения идут на основную БД. Признак хранится в cookie
+(действует во всех воркерах) и по ID пользователя в памяти процесса (для
+клиентов без cookie). Значение должно превышать обычное отставание реплик.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from fastapi import Depends, Request
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .database import get_db, replica_engines
+from .services.auth_service import decode_token, optional_oauth2_scheme
+
+logger = logging.getLogger("replicas")
+
+# Сколько секунд после изменения данных чтения пользователя идут на основную БД
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+# Сколько секунд недоступная реплика не используется
+REPLICA_RETRY_SECONDS = int(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+# Cookie, направляющая чтения клиента на основную БД
+STICKY_COOKIE = "db_primary"
+
+# Методы, не изменяющие данные
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Максимальное количество пользователей в памяти процесса
+MAX_STICKY_USERS = 100_000
+
+_lock = threading.Lock()
+_next_replica = 0
+_down_until: Dict[int, float] = {}
+_sticky_users: Dict[int, float] = {}
+
+
+def mark_sticky(user_id: int):
+    """
+    Направляет чтения пользователя на основную БД на REPLICA_STICKY_SECONDS секунд
+    """
+    now = time.monotonic()
+    with _lock:
+        if len(_sticky_users) >= MAX_STICKY_USERS:
+            for expired in [uid for uid, until in _sticky_users.items() if until <= now]:
+                del _sticky_users[expired]
+        _sticky_users[user_id] = now + REPLICA_STICKY_SECONDS
+
+
+def _is_sticky(request: Request, token: Optional[str]) -> bool:
+    if STICKY_COOKIE in request.cookies:
+        return True
+    if not _sticky_users or not token:
+        return False
+    payload = decode_token(token)
+    if payload is None:
+        return False
+    return _sticky_users.get(payload["uid"], 0) > time.monotonic()
+
+
+def _replica_order() -> list:
+    """
+    Доступные реплики, начиная со следующей по кругу
+    """
+    global _next_replica
+    now = time.monotonic()
+    with _lock:
+        start = _next_replica
+        _next_replica = (_next_replica + 1) % len(replica_engines)
+    order = [(start + offset) % len(replica_engines) for offset in range(len(replica_engines))]
+    return [index for index in order if _down_until.get(index, 0) <= now]
+
+
+def get_read_db(
+    request: Request,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Session:
+    """
+    Сессия для маршрутов, которые только читают данные. Это та же сессия
+    запроса, что и у get_db, но для GET/HEAD-запросов ее чтения направляются
+    на реплику, если клиент недавно не изменял данные
+
+    Args:
+        request (Request): HTTP-запрос
+        token (Optional[str]): JWT-токен из заголовка Authorization
+        db (Session): Сессия запроса
+
+    Returns:
+        Session: Сессия базы данных
+    """
+    # Сессия, уже начавшая транзакцию на основной БД, продолжает работать с ней
+    if not replica_engines or request.method not in SAFE_METHODS or db.in_transaction():
+        return db
+    if _is_sticky(request, token):
+        metrics.increment("db.sticky_reads")
+        return db
+
+    for index in _replica_order():
+        replica = replica_engines[index]
+        try:
+            # Соединение берется сразу, чтобы при недоступной реплике перейти к следующей
+            db.connection(bind_arguments={"bind": replica})
+        except OperationalError as e:
+            db.rollback()
+            _down_until[index] = time.monotonic() + REPLICA_RETRY_SECONDS
+            metrics.increment("db.replica_errors")
+            logger.warning(f"Реплика {replica.url.host} недоступна, чтение с основной БД: {str(e)}")
+            continue
+        db.info["replica"] = replica
+        metrics.increment("db.replica_reads")
+        return db
+
+    metrics.increment("db.primary_reads")
+    return db
+
+
+class ReplicaStickinessMiddleware:
+    """
+    ASGI-middleware: после успешного изменяющего запроса направляет чтения
+    клиента на основную БД (cookie и ID пользователя из request.state.principal)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_engines or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                principal = scope.get("state", {}).get("principal")
+                if principal is not None:
+                    mark_sticky(principal.id)
+                cookie = f"{STICKY_COOKIE}=1; Max-Age={REPLICA_STICKY_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
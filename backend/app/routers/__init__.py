@@ -6,7 +6,6 @@ import os
 from ..database import get_db
 from ..models import User
 from ..schemas import UserCreate, UserResponse
-from ..services import minio_service
 from .auth import router as auth_router
 from .animals import router as animals_router
 from .animal_types import router as animal_types_router
@@ -4,7 +4,9 @@ from typing import List
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..database import get_db
-from ..models import AnimalType
+from ..replicas import get_read_db
+from ..models import AnimalType, Animal
+from ..services.revision_service import touch_animals
 from ..schemas import AnimalTypeCreate, AnimalTypeResponse
 from ..services.auth_service import get_current_admin_user
 
@@ -36,7 +38,7 @@ async def create_animal_type(
         )
     
     try:
-        new_animal_type = AnimalType(**animal_type.dict())
+        new_animal_type = AnimalType(**animal_type.model_dump())
         db.add(new_animal_type)
         db.commit()
         db.refresh(new_animal_type)
@@ -49,7 +51,7 @@ async def create_animal_type(
 async def get_animal_types(
     skip: int = 0, 
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение списка типов животных
@@ -68,7 +70,7 @@ async def get_animal_types(
 @router.get("/{animal_type_id}", response_model=AnimalTypeResponse)
 async def get_animal_type(
     animal_type_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение информации о конкретном типе животного
@@ -118,10 +120,12 @@ async def update_animal_type(
             )
     
     # Обновляем атрибуты типа животного
-    for key, value in animal_type.dict().items():
+    for key, value in animal_type.model_dump().items():
         setattr(db_animal_type, key, value)
     
     try:
+        # Название входит в карточку животного, поэтому меняем версию связанных животных
+        touch_animals(db, Animal.animal_type_id == animal_type_id)
         db.commit()
         db.refresh(db_animal_type)
         return db_animal_type
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional, Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import Dict, List, Optional, Literal
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import or_, desc, asc
+from sqlalchemy import or_, and_, desc, asc, func
 
 from ..database import get_db
-from ..models import Animal, AnimalPhoto, AnimalType, Habitat, FavoriteAnimal, User
+from ..replicas import get_read_db
+from ..models import Animal, AnimalPhoto, AnimalType, Habitat, FavoriteAnimal, Test, TestQuestion
 from ..schemas import (
     AnimalCreate, 
     AnimalResponse, 
@@ -14,20 +16,122 @@ from ..schemas import (
     AnimalPhotoResponse,
     FavoriteAnimalCreate,
     FavoriteAnimalResponse,
-    AnimalBase
+    AnimalBase,
+    AnimalSummaryResponse,
+    AnimalFullResponse,
+    AnimalTestSummary,
+    AnimalImportReport,
+    FavoriteAnimalBulkRequest,
+    FavoriteAnimalBulkResult
 )
-from ..services.auth_service import get_current_user, get_current_admin_user
-from ..services.minio_service import delete_files_by_ids
-
-# Определяем возможные расширения для изображений и видео
-ALLOWED_IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp"]
-ALLOWED_VIDEO_EXTENSIONS = [".mp4", ".avi"]
+from ..serialization import (
+    json_response,
+    animal_list_adapter,
+    animal_summary_list_adapter,
+    animal_favorite_list_adapter,
+    animal_summary_favorite_list_adapter
+)
+from ..conditional import make_etag, is_not_modified, cache_headers, not_modified_response
+from ..services.revision_service import touch_animals
+from ..services.animal_import_service import (
+    detect_manifest_format,
+    import_animals as run_animal_import,
+    export_animals as run_animal_export
+)
+from ..services.favorites_service import get_favorite_ids, add_favorites, remove_favorites
+from ..services.auth_service import Principal, get_current_user, get_current_admin_user, get_optional_current_user
+from ..services.media_registry import release_media
+from ..services import leaderboard_service
+from ..services.scratch_space import ScratchQuotaExceeded, scratch_space
 
-# Категории файлов
-FILE_CATEGORIES = ["images", "videos"]
+# Части, которые можно запросить у GET /animals/{id}/full через параметр include
+FULL_ANIMAL_PARTS = ("type", "habitat", "photos", "test", "favorite")
 
 router = APIRouter()
 
+def _filter_and_sort_animals(
+    query,
+    db: Session,
+    search: Optional[str],
+    animal_type_id: Optional[int],
+    habitat_id: Optional[int],
+    sort_by: Optional[str],
+    sort_order: Optional[str],
+    favorites_only: bool,
+    current_user: Optional[Principal]
+):
+    """
+    Применяет к запросу по животным поиск, фильтры и сортировку каталога
+    
+    Args:
+        query: Запрос SQLAlchemy, выбирающий животных или отдельные колонки Animal
+        db: Сессия базы данных
+        search: Строка поиска по названию
+        animal_type_id: ID типа животного для фильтрации
+        habitat_id: ID места обитания для фильтрации
+        sort_by: Поле для сортировки ('name' или 'id')
+        sort_order: Порядок сортировки ('asc' или 'desc')
+        favorites_only: Фильтровать только избранные для текущего пользователя
+        current_user: Текущий пользователь
+        
+    Returns:
+        Query: Запрос с примененными условиями
+    """
+    # Применяем поиск по названию, если указан
+    if search:
+        query = query.filter(Animal.name.ilike(f"%{search}%"))
+    
+    # Применяем фильтры, если они указаны
+    if animal_type_id:
+        query = query.filter(Animal.animal_type_id == animal_type_id)
+    if habitat_id:
+        query = query.filter(Animal.habitat_id == habitat_id)
+    
+    # Фильтруем по избранным, если запрошено и пользователь авторизован
+    if favorites_only and current_user:
+        favorite_animal_ids = db.query(FavoriteAnimal.animal_id).filter(
+            FavoriteAnimal.user_id == current_user.id
+        ).subquery()
+        
+        # Фильтруем животных по подзапросу
+        query = query.filter(Animal.id.in_(favorite_animal_ids))
+    
+    # Применяем сортировку
+    if sort_by == "name":
+        if sort_order == "desc":
+            query = query.order_by(desc(Animal.name))
+        else:
+            query = query.order_by(asc(Animal.name))
+    else:  # По умолчанию сортируем по ID
+        if sort_order == "desc":
+            query = query.order_by(desc(Animal.id))
+        else:
+            query = query.order_by(asc(Animal.id))
+    
+    return query
+
+def _with_favorite_flag(query, current_user: Principal):
+    """
+    Добавляет к запросу по животным признак is_favorite через LEFT JOIN с избранным
+    текущего пользователя, чтобы не проверять каждое животное отдельным запросом
+    
+    Args:
+        query: Запрос SQLAlchemy по колонкам Animal
+        current_user: Текущий пользователь
+        
+    Returns:
+        Query: Запрос с дополнительной колонкой is_favorite
+    """
+    return query.add_columns(
+        FavoriteAnimal.id.isnot(None).label("is_favorite")
+    ).outerjoin(
+        FavoriteAnimal,
+        and_(
+            FavoriteAnimal.animal_id == Animal.id,
+            FavoriteAnimal.user_id == current_user.id
+        )
+    )
+
 @router.post("/", response_model=AnimalResponse)
 async def create_animal(
     animal: AnimalCreate, 
@@ -46,7 +150,7 @@ async def create_animal(
         AnimalResponse: Созданное животное
     """
     try:
-        new_animal = Animal(**animal.dict())
+        new_animal = Animal(**animal.model_dump())
         db.add(new_animal)
         db.commit()
         db.refresh(new_animal)
@@ -65,8 +169,9 @@ async def get_animals(
     sort_by: Optional[Literal["name", "id"]] = "id",
     sort_order: Optional[Literal["asc", "desc"]] = "asc",
     favorites_only: bool = False,
-    current_user: Optional[User] = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    with_favorites: bool = False,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение списка животных с возможностью поиска, фильтрации и сортировки
@@ -80,69 +185,271 @@ async def get_animals(
         sort_by: Поле для сортировки ('name' или 'id')
         sort_order: Порядок сортировки ('asc' или 'desc')
         favorites_only: Фильтровать только избранные для текущего пользователя
+        with_favorites: Добавить к каждому животному признак is_favorite
         current_user: Текущий пользователь
         db: Сессия базы данных
         
     Returns:
         List[AnimalResponse]: Отфильтрованный и отсортированный список всех животных
     """
-    query = db.query(Animal)
-    
-    # Применяем поиск по названию, если указан
-    if search:
-        query = query.filter(Animal.name.ilike(f"%{search}%"))
+    if with_favorites and current_user:
+        # Выбираем колонки животного и признак избранного одним запросом
+        query = _with_favorite_flag(db.query(*Animal.__table__.columns), current_user)
+        adapter = animal_favorite_list_adapter
+    else:
+        query = db.query(Animal)
+        adapter = animal_list_adapter
+    
+    query = _filter_and_sort_animals(
+        query, db, search, animal_type_id, habitat_id,
+        sort_by, sort_order, favorites_only, current_user
+    )
+    
+    # Получаем результаты с пагинацией и сериализуем их сразу в JSON
+    animals = query.offset(skip).limit(limit).all()
+    return json_response(adapter, animals)
+
+@router.get("/summary", response_model=List[AnimalSummaryResponse])
+async def get_animals_summary(
+    skip: int = 0, 
+    limit: int = 10000,
+    search: Optional[str] = None,
+    animal_type_id: Optional[int] = None,
+    habitat_id: Optional[int] = None,
+    sort_by: Optional[Literal["name", "id"]] = "id",
+    sort_order: Optional[Literal["asc", "desc"]] = "asc",
+    favorites_only: bool = False,
+    with_favorites: bool = False,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Получение компактного списка животных для сетки каталога.
     
-    # Применяем фильтры, если они указаны
-    if animal_type_id:
-        query = query.filter(Animal.animal_type_id == animal_type_id)
-    if habitat_id:
-        query = query.filter(Animal.habitat_id == habitat_id)
+    Принимает те же параметры, что и GET /animals/, но выбирает из БД только
+    колонки, нужные карточке каталога (без описания), и не создает ORM-объекты.
     
-    # Фильтруем по избранным, если запрошено и пользователь авторизован
-    if favorites_only and current_user:
-        favorite_animal_ids = db.query(FavoriteAnimal.animal_id).filter(
-            FavoriteAnimal.user_id == current_user.id
-        ).subquery()
+    Args:
+        skip: Сколько записей пропустить
+        limit: Максимальное количество записей
+        search: Строка поиска по названию
+        animal_type_id: ID типа животного для фильтрации
+        habitat_id: ID места обитания для фильтрации
+        sort_by: Поле для сортировки ('name' или 'id')
+        sort_order: Порядок сортировки ('asc' или 'desc')
+        favorites_only: Фильтровать только избранные для текущего пользователя
+        with_favorites: Добавить к каждому животному признак is_favorite
+        current_user: Текущий пользователь
+        db: Сессия базы данных
         
-        # Фильтруем животных по подзапросу
-        query = query.filter(Animal.id.in_(favorite_animal_ids))
+    Returns:
+        List[AnimalSummaryResponse]: Краткие данные о животных
+    """
+    query = db.query(
+        Animal.id,
+        Animal.name,
+        Animal.animal_type_id,
+        Animal.habitat_id,
+        Animal.preview_id
+    )
+    adapter = animal_summary_list_adapter
+    if with_favorites and current_user:
+        query = _with_favorite_flag(query, current_user)
+        adapter = animal_summary_favorite_list_adapter
+    
+    query = _filter_and_sort_animals(
+        query, db, search, animal_type_id, habitat_id,
+        sort_by, sort_order, favorites_only, current_user
+    )
+    
+    rows = query.offset(skip).limit(limit).all()
+    return json_response(adapter, rows)
+
+@router.post("/import", response_model=AnimalImportReport)
+def import_animals(
+    manifest: UploadFile = File(...),
+    media: Optional[UploadFile] = File(None),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_admin_user)
+):
+    """
+    Массовый импорт животных (только для администраторов)
     
-    # Применяем сортировку
-    if sort_by == "name":
-        if sort_order == "desc":
-            query = query.order_by(desc(Animal.name))
-        else:
-            query = query.order_by(asc(Animal.name))
-    else:  # По умолчанию сортируем по ID
-        if sort_order == "desc":
-            query = query.order_by(desc(Animal.id))
-        else:
-            query = query.order_by(asc(Animal.id))
+    Манифест (NDJSON или CSV) содержит по одному животному в строке: name,
+    description, animal_type/animal_type_id, habitat/habitat_id и ссылки на
+    медиа - имена файлов из архива (preview, video, photos) или ID уже
+    загруженных файлов (preview_id, video_id, photo_ids). Списки в CSV
+    разделяются символом '|'. Строки с ошибками пропускаются.
     
-    # Получаем результаты с пагинацией
-    animals = query.offset(skip).limit(limit).all()
-    return animals
+    Обработчик синхронный: импорт выполняется в пуле потоков и не блокирует event loop.
+    
+    Args:
+        manifest: Файл манифеста (.ndjson, .jsonl или .csv)
+        media: ZIP-архив с медиафайлами (необязателен)
+        db: Сессия базы данных
+        current_user: Текущий пользователь (должен быть администратором)
+        
+    Returns:
+        AnimalImportReport: Отчет об импорте
+    """
+    manifest_format = detect_manifest_format(manifest.filename)
+    if manifest_format is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Недопустимый формат манифеста. Разрешены только NDJSON (.ndjson, .jsonl) и CSV (.csv)"
+        )
+    
+    # zipfile требует файл с произвольным доступом: сохраняем архив во временное пространство потоково
+    with scratch_space.file(suffix=".zip", prefix="import-") as temp_path:
+        archive_path = None
+        try:
+            if media is not None:
+                scratch_space.write_stream(media.file, temp_path)
+                archive_path = temp_path
+            
+            return run_animal_import(db, manifest.file, manifest_format, archive_path)
+        except ScratchQuotaExceeded as e:
+            raise HTTPException(status_code=507, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/export")
+async def export_animals(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_admin_user)
+):
+    """
+    Потоковая выгрузка всех животных (только для администраторов).
+    Формат выгрузки совпадает с форматом манифеста импорта.
+    
+    Args:
+        format: Формат выгрузки ('ndjson' или 'csv')
+        db: Сессия базы данных
+        current_user: Текущий пользователь (должен быть администратором)
+        
+    Returns:
+        StreamingResponse: Файл выгрузки
+    """
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        run_animal_export(db, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="animals.{format}"'}
+    )
 
 @router.get("/{animal_id}", response_model=AnimalDetailResponse)
 async def get_animal(
     animal_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение информации о конкретном животном
     
+    Поддерживает условные запросы: если версия животного совпадает с ETag из
+    If-None-Match, возвращается 304 без загрузки и сериализации данных.
+    
     Args:
         animal_id: ID животного
+        request: HTTP-запрос (заголовки If-None-Match/If-Modified-Since)
+        response: HTTP-ответ (заголовки ETag/Last-Modified)
         db: Сессия базы данных
         
     Returns:
         AnimalDetailResponse: Данные о животном
     """
+    version = db.query(Animal.revision, Animal.updated_at).filter(Animal.id == animal_id).first()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Животное не найдено")
+    
+    etag = make_etag("animal", animal_id, version.revision)
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified_response(etag, version.updated_at)
+    
     animal = db.query(Animal).filter(Animal.id == animal_id).first()
     if animal is None:
         raise HTTPException(status_code=404, detail="Животное не найдено")
+    
+    response.headers.update(cache_headers(etag, version.updated_at))
     return animal
 
+@router.get("/{animal_id}/full", response_model=AnimalFullResponse, response_model_exclude_unset=True)
+async def get_animal_full(
+    animal_id: int,
+    include: str = ",".join(FULL_ANIMAL_PARTS),
+    current_user: Optional[Principal] = Depends(get_optional_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Получение всех данных для страницы животного одним запросом
+    
+    Тип и место обитания загружаются вместе с животным через JOIN, фотографии,
+    сводка теста и признак избранного - не более чем одним запросом каждый.
+    Незапрошенные части не загружаются и отсутствуют в ответе.
+    
+    Args:
+        animal_id: ID животного
+        include: Список частей через запятую: type, habitat, photos, test, favorite
+        current_user: Текущий пользователь (для признака избранного, необязателен)
+        db: Сессия базы данных
+        
+    Returns:
+        AnimalFullResponse: Данные о животном с запрошенными связанными данными
+        
+    Raises:
+        HTTPException: 400 при неизвестной части в include, 404 если животное не найдено
+    """
+    parts = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = parts - set(FULL_ANIMAL_PARTS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестные части в include: {', '.join(sorted(unknown))}. "
+                   f"Допустимые значения: {', '.join(FULL_ANIMAL_PARTS)}"
+        )
+    
+    options = []
+    if "type" in parts:
+        options.append(joinedload(Animal.animal_type))
+    if "habitat" in parts:
+        options.append(joinedload(Animal.habitat))
+    if "photos" in parts:
+        options.append(selectinload(Animal.photos))
+    
+    animal = db.query(Animal).options(*options).filter(Animal.id == animal_id).first()
+    if animal is None:
+        raise HTTPException(status_code=404, detail="Животное не найдено")
+    
+    result = AnimalResponse.model_validate(animal).model_dump()
+    if "type" in parts:
+        result["animal_type"] = animal.animal_type
+    if "habitat" in parts:
+        result["habitat"] = animal.habitat
+    if "photos" in parts:
+        result["photos"] = animal.photos
+    if "test" in parts:
+        test_summary = None
+        if animal.test_id is not None:
+            test_summary = db.query(
+                Test.id,
+                Test.name,
+                func.count(TestQuestion.id).label("question_count")
+            ).outerjoin(
+                TestQuestion, TestQuestion.test_id == Test.id
+            ).filter(
+                Test.id == animal.test_id
+            ).group_by(Test.id, Test.name).first()
+        result["test"] = AnimalTestSummary.model_validate(test_summary) if test_summary else None
+    if "favorite" in parts:
+        result["is_favorite"] = (
+            current_user is not None
+            and bool(get_favorite_ids(db, current_user.id, [animal_id]))
+        )
+    
+    return result
+
 @router.put("/{animal_id}", response_model=AnimalResponse)
 async def update_animal(
     animal_id: int,
@@ -171,7 +478,7 @@ async def update_animal(
         raise HTTPException(status_code=404, detail="Животное не найдено")
     
     # Получаем только заполненные поля (не None)
-    update_data = {k: v for k, v in animal_data.dict().items() if v is not None}
+    update_data = {k: v for k, v in animal_data.model_dump().items() if v is not None}
     
     # Если нет полей для обновления, возвращаем существующее животное
     if not update_data:
@@ -182,6 +489,7 @@ async def update_animal(
         for key, value in update_data.items():
             setattr(db_animal, key, value)
         
+        touch_animals(db, Animal.id == animal_id)
         db.commit()
         db.refresh(db_animal)
         return db_animal
@@ -220,8 +528,8 @@ async def delete_animal(
         raise HTTPException(status_code=404, detail="Животное не найдено")
     
     try:
-        # Собираем все идентификаторы файлов для удаления с вариантами путей в MinIO
-        file_patterns_to_delete = []
+        # Собираем ID связанных файлов: после удаления животного удаляются те, на которые больше нет ссылок
+        file_ids_to_release = []
         
         # Проверяем наличие связанного теста и удаляем его со всеми зависимостями
         if db_animal.test_id:
@@ -237,6 +545,9 @@ async def delete_animal(
                 for score in test_scores:
                     db.delete(score)
                 print(f"Удалено {scores_count} результатов теста с ID {test_id}")
+
+                # Удаление рейтинга теста
+                leaderboard_service.delete_test_leaderboard(db, test_id)
                 
                 # Получаем все вопросы теста через связь TestQuestion
                 test_questions = db.query(TestQuestion).filter(TestQuestion.test_id == test_id).all()
@@ -288,37 +599,19 @@ async def delete_animal(
             except Exception as e:
                 print(f"Ошибка при каскадном удалении теста: {str(e)}")
         
-        # Добавляем все возможные варианты пути для обложки
-        if db_animal.preview_id:
-            for ext in ALLOWED_IMAGE_EXTENSIONS:
-                for category in FILE_CATEGORIES:
-                    file_patterns_to_delete.append(f"{category}/{db_animal.preview_id}{ext}")
-        
-        # Добавляем все возможные варианты пути для видео
-        if db_animal.video_id:
-            for ext in ALLOWED_VIDEO_EXTENSIONS:
-                file_patterns_to_delete.append(f"videos/{db_animal.video_id}{ext}")
-            for ext in ALLOWED_VIDEO_EXTENSIONS:
-                file_patterns_to_delete.append(f"images/{db_animal.video_id}{ext}")
-        
-        # Получаем и добавляем все возможные варианты путей для фотографий
+        # Обложка, видео и фотографии животного
+        file_ids_to_release.extend([db_animal.preview_id, db_animal.video_id])
         photos = db.query(AnimalPhoto).filter(AnimalPhoto.animal_id == animal_id).all()
-        for photo in photos:
-            if photo.photo_id:
-                for ext in ALLOWED_IMAGE_EXTENSIONS:
-                    file_patterns_to_delete.append(f"images/{photo.photo_id}{ext}")
-        
-        print(f"Всего путей для поиска и удаления файлов: {len(file_patterns_to_delete)}")
-        print(f"Пути для удаления: {file_patterns_to_delete}")
+        file_ids_to_release.extend(photo.photo_id for photo in photos)
+        video_ids = [db_animal.video_id] if db_animal.video_id else []
         
         # Удаляем животное из базы данных
         db.delete(db_animal)
         db.commit()
         
-        # Удаляем все связанные файлы из MinIO после успешного удаления из БД
-        if file_patterns_to_delete:
-            deletion_result = await delete_files_by_ids(file_patterns_to_delete)
-            print(f"Результат удаления файлов из MinIO: {deletion_result}")
+        # Удаляем из хранилища файлы, на которые больше не ссылаются другие животные
+        deletion_result = release_media(db, file_ids_to_release, video_ids)
+        print(f"Результат удаления файлов из хранилища: {deletion_result}")
         
         return {"message": "Животное и все связанные с ним данные успешно удалены"}
     except SQLAlchemyError as e:
@@ -361,6 +654,7 @@ async def add_photo(
     
     try:
         db.add(new_photo)
+        touch_animals(db, Animal.id == animal_id)
         db.commit()
         db.refresh(new_photo)
         return new_photo
@@ -371,7 +665,7 @@ async def add_photo(
 @router.get("/{animal_id}/photos/", response_model=List[AnimalPhotoResponse])
 async def get_animal_photos(
     animal_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение всех фотографий животного
@@ -419,19 +713,14 @@ async def delete_animal_photo(
         raise HTTPException(status_code=404, detail="Фото не найдено")
     
     try:
-        # Формируем все возможные пути файла в MinIO
-        file_patterns_to_delete = []
-        for ext in ALLOWED_IMAGE_EXTENSIONS:
-            file_patterns_to_delete.append(f"images/{photo_id}{ext}")
-            
         # Удаляем запись из базы данных
         db.delete(photo)
+        touch_animals(db, Animal.id == animal_id)
         db.commit()
         
-        # Удаляем файл из MinIO
-        if file_patterns_to_delete:
-            deletion_result = await delete_files_by_ids(file_patterns_to_delete)
-            print(f"Результат удаления файла из MinIO: {deletion_result}")
+        # Удаляем файл из хранилища, если на него больше никто не ссылается
+        deletion_result = release_media(db, [photo_id])
+        print(f"Результат удаления файла из хранилища: {deletion_result}")
             
         return {"message": "Фото успешно удалено"}
     except SQLAlchemyError as e:
@@ -463,51 +752,123 @@ async def add_to_favorites(
         FavoriteAnimalResponse: Добавленное избранное животное
     """
     # Проверяем существование животного
-    animal = db.query(Animal).filter(Animal.id == favorite.animal_id).first()
-    if animal is None:
+    animal_exists = db.query(Animal.id).filter(Animal.id == favorite.animal_id).first()
+    if animal_exists is None:
         raise HTTPException(status_code=404, detail="Животное не найдено")
     
-    # Проверяем, не добавлено ли уже это животное в избранное
-    existing = db.query(FavoriteAnimal).filter(
+    try:
+        # INSERT ... ON CONFLICT DO NOTHING: повторное добавление ничего не меняет
+        add_favorites(db, current_user.id, [favorite.animal_id])
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Ошибка при добавлении в избранное: {str(e)}")
+    
+    return db.query(FavoriteAnimal).filter(
         FavoriteAnimal.user_id == current_user.id,
         FavoriteAnimal.animal_id == favorite.animal_id
     ).first()
+
+@router.get("/favorites/", response_model=List[AnimalDetailResponse])
+async def get_favorite_animals(
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Получение списка избранных животных пользователя
     
-    if existing:
-        return existing
+    Args:
+        db: Сессия базы данных
+        current_user: Текущий пользователь
+        
+    Returns:
+        List[AnimalDetailResponse]: Список избранных животных
+    """
+    # Одним запросом с JOIN выбираем животных, связанные данные подгружаем пакетно
+    animals = db.query(Animal).join(
+        FavoriteAnimal, FavoriteAnimal.animal_id == Animal.id
+    ).filter(
+        FavoriteAnimal.user_id == current_user.id
+    ).options(
+        selectinload(Animal.animal_type),
+        selectinload(Animal.habitat),
+        selectinload(Animal.photos)
+    ).order_by(FavoriteAnimal.id).all()
+    return animals
+
+@router.post("/favorites/status", response_model=Dict[int, bool])
+async def get_favorites_status(
+    request: FavoriteAnimalBulkRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Проверка наличия в избранном сразу для нескольких животных
     
-    # Создаем новую запись в избранном
-    new_favorite = FavoriteAnimal(user_id=current_user.id, animal_id=favorite.animal_id)
+    Args:
+        request: Список ID животных
+        db: Сессия базы данных
+        current_user: Текущий пользователь
+        
+    Returns:
+        Dict[int, bool]: Признак избранного для каждого переданного ID
+    """
+    favorite_ids = get_favorite_ids(db, current_user.id, request.animal_ids)
+    return {animal_id: animal_id in favorite_ids for animal_id in request.animal_ids}
+
+@router.post("/favorites/bulk", response_model=FavoriteAnimalBulkResult)
+async def bulk_add_to_favorites(
+    request: FavoriteAnimalBulkRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Массовое добавление животных в избранное.
+    Несуществующие и уже добавленные животные пропускаются.
     
+    Args:
+        request: Список ID животных
+        db: Сессия базы данных
+        current_user: Текущий пользователь
+        
+    Returns:
+        FavoriteAnimalBulkResult: Количество добавленных записей и итоговый статус
+    """
     try:
-        db.add(new_favorite)
+        added = add_favorites(db, current_user.id, request.animal_ids)
         db.commit()
-        db.refresh(new_favorite)
-        return new_favorite
     except SQLAlchemyError as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка при добавлении в избранное: {str(e)}")
+    
+    favorite_ids = get_favorite_ids(db, current_user.id, request.animal_ids)
+    return FavoriteAnimalBulkResult(affected=added, favorite_ids=sorted(favorite_ids))
 
-@router.get("/favorites/", response_model=List[AnimalDetailResponse])
-async def get_favorite_animals(
+@router.post("/favorites/bulk-remove", response_model=FavoriteAnimalBulkResult)
+async def bulk_remove_from_favorites(
+    request: FavoriteAnimalBulkRequest,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """
-    Получение списка избранных животных пользователя
+    Массовое удаление животных из избранного
     
     Args:
+        request: Список ID животных
         db: Сессия базы данных
         current_user: Текущий пользователь
         
     Returns:
-        List[AnimalDetailResponse]: Список избранных животных
+        FavoriteAnimalBulkResult: Количество удаленных записей и итоговый статус
     """
-    favorites = db.query(FavoriteAnimal).filter(FavoriteAnimal.user_id == current_user.id).all()
-    animal_ids = [fav.animal_id for fav in favorites]
+    try:
+        removed = remove_favorites(db, current_user.id, request.animal_ids)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Ошибка при удалении из избранного: {str(e)}")
     
-    animals = db.query(Animal).filter(Animal.id.in_(animal_ids)).all()
-    return animals
+    return FavoriteAnimalBulkResult(affected=removed, favorite_ids=[])
 
 @router.delete("/favorites/{animal_id}")
 async def remove_from_favorites(
@@ -545,7 +906,7 @@ async def remove_from_favorites(
 @router.get("/check-favorite/{animal_id}", response_model=bool)
 async def check_is_favorite(
     animal_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """
@@ -559,9 +920,4 @@ async def check_is_favorite(
     Returns:
         bool: True, если животное в избранном, иначе False
     """
-    favorite = db.query(FavoriteAnimal).filter(
-        FavoriteAnimal.user_id == current_user.id,
-        FavoriteAnimal.animal_id == animal_id
-    ).first()
-    
-    return favorite is not None
\ No newline at end of file
+    return bool(get_favorite_ids(db, current_user.id, [animal_id]))
\ No newline at end of file
@@ -1,9 +1,8 @@
-from datetime import timedelta, datetime
+from datetime import datetime
 import logging
 import os
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Security
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
@@ -18,16 +17,19 @@ from ..schemas import (
     PasswordReset, 
     EmailVerificationRequest,
     EmailVerificationCode,
-    TokenData
+    RefreshTokenRequest,
+    LogoutRequest
 )
 from ..services.auth_service import (
     authenticate_user, 
-    create_access_token, 
+    create_token_pair, 
+    decode_token, 
     get_password_hash, 
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    SECRET_KEY,
-    ALGORITHM
+    get_current_user,
+    Principal,
+    TOKEN_TYPE_REFRESH
 )
+from ..services.token_revocation import revoke_all_user_tokens, revoke_refresh_token, revoke_token
 from ..services.email_verification_service import (
     create_verification_code,
     verify_code
@@ -38,6 +40,14 @@ from ..services.user_registration_service import (
     remove_pending_user
 )
 from ..services.smtp_service import send_email_verification_code, send_password_reset_email
+from ..services.rate_limit_service import (
+    rate_limit,
+    LOGIN_LIMITS,
+    REGISTER_LIMITS,
+    EMAIL_VERIFICATION_LIMITS,
+    EMAIL_CONFIRM_LIMITS,
+    PASSWORD_RESET_LIMITS
+)
 
 # Настройка логирования
 logger = logging.getLogger("auth_router")
@@ -48,7 +58,11 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 router = APIRouter()
 
 
-@router.post("/register", status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/register",
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit("register", *REGISTER_LIMITS, identity_field="email"))]
+)
 def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     """
     Регистрация нового пользователя в системе.
@@ -139,8 +153,12 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
 
-@router.post("/login", response_model=Token)
-async def login_for_access_token(form_data: UserLogin, db: Session = Depends(get_db)):
+@router.post(
+    "/login",
+    response_model=Token,
+    dependencies=[Depends(rate_limit("login", *LOGIN_LIMITS, identity_field="username"))]
+)
+def login_for_access_token(form_data: UserLogin, db: Session = Depends(get_db)):
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -149,22 +167,87 @@ async def login_for_access_token(form_data: UserLogin, db: Session = Depends(get
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.login}, expires_delta=access_token_expires
+    return create_token_pair(user)
+
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(refresh_data: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """
+    Выдает новую пару токенов по токену обновления. Использованный токен
+    обновления отзывается; повторное предъявление отозванного токена
+    считается признаком кражи и отзывает все сессии пользователя.
+    
+    Args:
+        refresh_data (RefreshTokenRequest): Токен обновления
+        db (Session): Сессия базы данных
+        
+    Returns:
+        Token: Новые токены доступа и обновления
+        
+    Raises:
+        HTTPException: 401 - если токен недействителен, истек или отозван
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Недействительный токен обновления",
+        headers={"WWW-Authenticate": "Bearer"},
     )
+    payload = decode_token(refresh_data.refresh_token, TOKEN_TYPE_REFRESH)
+    if payload is None or payload.get("uid") is None or payload.get("jti") is None:
+        raise credentials_exception
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user_id": user.id,
-        "login": user.login,
-        "email": user.email,
-        "is_admin": user.is_admin
-    }
+    # Пользователь ищется по ID: токен остается действительным после смены логина
+    user = db.get(User, payload["uid"])
+    if user is None or payload.get("ver", 0) < (user.token_version or 0):
+        raise credentials_exception
+    
+    # Использованный токен обновления отзывается; если он уже был отозван, это повторное использование
+    if not revoke_refresh_token(db, payload["jti"], user.id, datetime.utcfromtimestamp(payload["exp"])):
+        logger.warning(f"Повторное использование токена обновления пользователя {user.id}, все сессии отозваны")
+        revoke_all_user_tokens(db, user)
+        raise credentials_exception
+    
+    return create_token_pair(user)
 
 
-@router.post("/verify-email/request")
+@router.post("/logout", status_code=status.HTTP_200_OK)
+def logout(
+    logout_data: LogoutRequest,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    """
+    Завершает текущую сессию: отзывает токен доступа и переданный токен обновления
+    
+    Args:
+        logout_data (LogoutRequest): Токен обновления сессии (необязателен)
+        token (str): Токен доступа
+        db (Session): Сессия базы данных
+        
+    Returns:
+        dict: Сообщение о выходе
+    """
+    payload = decode_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не удалось проверить учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    revoke_token(db, payload["jti"], payload["uid"], datetime.utcfromtimestamp(payload["exp"]))
+    if logout_data.refresh_token:
+        refresh_payload = decode_token(logout_data.refresh_token, TOKEN_TYPE_REFRESH)
+        if refresh_payload is not None and refresh_payload.get("uid") == payload["uid"]:
+            revoke_refresh_token(db, refresh_payload["jti"], payload["uid"], datetime.utcfromtimestamp(refresh_payload["exp"]))
+    
+    return {"message": "Выход выполнен"}
+
+
+@router.post(
+    "/verify-email/request",
+    dependencies=[Depends(rate_limit("verify_email", *EMAIL_VERIFICATION_LIMITS, identity_field="email"))]
+)
 async def request_email_verification(verification_data: EmailVerificationRequest):
     """
     Запрашивает отправку кода верификации email.
@@ -201,7 +284,11 @@ async def request_email_verification(verification_data: EmailVerificationRequest
         )
 
 
-@router.post("/verify-email/confirm", response_model=Token)
+@router.post(
+    "/verify-email/confirm",
+    response_model=Token,
+    dependencies=[Depends(rate_limit("confirm_email", *EMAIL_CONFIRM_LIMITS, identity_field="email"))]
+)
 async def confirm_email(verification_data: EmailVerificationCode, db: Session = Depends(get_db)):
     """
     Подтверждает email с помощью кода верификации и создает пользователя в базе данных.
@@ -252,23 +339,10 @@ async def confirm_email(verification_data: EmailVerificationCode, db: Session =
         # Удаляем временные данные
         remove_pending_user(verification_data.email)
         
-        # Генерируем токен доступа для автоматического входа
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": db_user.login}, expires_delta=access_token_expires
-        )
-        
         logger.info(f"Пользователь {db_user.login} успешно создан после подтверждения email")
         
-        # Возвращаем токен доступа для автоматического входа
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "user_id": db_user.id,
-            "login": db_user.login,
-            "email": db_user.email,
-            "is_admin": db_user.is_admin
-        }
+        # Возвращаем токены для автоматического входа
+        return create_token_pair(db_user)
     except Exception as e:
         db.rollback()
         logger.error(f"Ошибка при создании пользователя: {str(e)}")
@@ -278,7 +352,11 @@ async def confirm_email(verification_data: EmailVerificationCode, db: Session =
         )
 
 
-@router.post("/reset-password/request", status_code=status.HTTP_200_OK)
+@router.post(
+    "/reset-password/request",
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(rate_limit("password_reset", *PASSWORD_RESET_LIMITS, identity_field="email"))]
+)
 def request_password_reset(reset_request: PasswordResetRequest, db: Session = Depends(get_db), request: Request = None):
     """
     Обрабатывает запрос на восстановление пароля
@@ -409,6 +487,9 @@ def confirm_password_reset(reset_data: PasswordReset, db: Session = Depends(get_
         # Сохраняем изменения в базе данных
         db.commit()
         
+        # Сессии, открытые со старым паролем, завершаются
+        revoke_all_user_tokens(db, user)
+        
         logger.info(f"Пароль успешно сброшен для пользователя с ID {user.id}")
         return {"message": "Пароль успешно изменен"}
     
@@ -495,68 +576,23 @@ def validate_reset_token(token: str, db: Session = Depends(get_db)):
         }
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserResponse:
+@router.post("/logout-all", status_code=status.HTTP_200_OK)
+def logout_all_sessions(
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """
-    Получает текущего пользователя на основе JWT токена
+    Завершает все сессии текущего пользователя на всех устройствах
     
     Args:
-        token (str): JWT токен авторизации
+        current_user (Principal): Текущий пользователь
         db (Session): Сессия базы данных
         
     Returns:
-        UserResponse: Данные авторизованного пользователя
-        
-    Raises:
-        HTTPException: Если токен недействителен или пользователь не найден
-    """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Не удалось проверить учетные данные",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        # Декодируем JWT токен
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    
-    # Получаем пользователя из базы данных по логину
-    user = db.query(User).filter(User.login == token_data.username).first()
-    if user is None:
-        raise credentials_exception
-    
-    # Возвращаем данные пользователя
-    return UserResponse(
-        id=user.id,
-        login=user.login,
-        email=user.email,
-        is_admin=user.is_admin
-    )
-
-async def get_current_admin(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
-    """
-    Проверяет, что текущий пользователь имеет права администратора
-    
-    Args:
-        current_user (UserResponse): Текущий пользователь
-        
-    Returns:
-        UserResponse: Данные администратора
-        
-    Raises:
-        HTTPException: Если пользователь не является администратором
+        dict: Сообщение о выходе
     """
-    if not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Требуются права администратора"
-        )
-    return current_user
+    revoke_all_user_tokens(db, db.get(User, current_user.id))
+    return {"message": "Все сессии завершены"}
 
 
 # Определяем схему для обновления логина
@@ -573,7 +609,7 @@ class LoginUpdate(BaseModel):
 @router.put("/users/update-login", status_code=status.HTTP_200_OK)
 async def update_user_login(
     login_data: LoginUpdate,
-    current_user: UserResponse = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -581,7 +617,7 @@ async def update_user_login(
     
     Args:
         login_data (LoginUpdate): Новый логин пользователя
-        current_user (UserResponse): Текущий авторизованный пользователь
+        current_user (Principal): Текущий авторизованный пользователь
         db (Session): Сессия базы данных
     
     Returns:
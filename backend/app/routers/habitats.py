@@ -4,7 +4,9 @@ from typing import List
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..database import get_db
-from ..models import Habitat
+from ..replicas import get_read_db
+from ..models import Habitat, Animal
+from ..services.revision_service import touch_animals
 from ..schemas import HabitatCreate, HabitatResponse
 from ..services.auth_service import get_current_admin_user
 
@@ -36,7 +38,7 @@ async def create_habitat(
         )
     
     try:
-        new_habitat = Habitat(**habitat.dict())
+        new_habitat = Habitat(**habitat.model_dump())
         db.add(new_habitat)
         db.commit()
         db.refresh(new_habitat)
@@ -49,7 +51,7 @@ async def create_habitat(
 async def get_habitats(
     skip: int = 0, 
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение списка мест обитания
@@ -68,7 +70,7 @@ async def get_habitats(
 @router.get("/{habitat_id}", response_model=HabitatResponse)
 async def get_habitat(
     habitat_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение информации о конкретном месте обитания
@@ -118,10 +120,12 @@ async def update_habitat(
             )
     
     # Обновляем атрибуты места обитания
-    for key, value in habitat.dict().items():
+    for key, value in habitat.model_dump().items():
         setattr(db_habitat, key, value)
     
     try:
+        # Название входит в карточку животного, поэтому меняем версию связанных животных
+        touch_animals(db, Animal.habitat_id == habitat_id)
         db.commit()
         db.refresh(db_habitat)
         return db_habitat
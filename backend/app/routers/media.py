@@ -1,45 +1,165 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from typing import List
-import uuid
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
+from typing import List, Optional
+import hashlib
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
 import os
-import shutil
-from pathlib import Path
 
 from ..database import get_db
-from ..models import User
-from ..services.auth_service import get_current_user, get_current_admin_user
-from ..services.minio_service import upload_file_to_minio, get_file_from_minio
+from ..replicas import get_read_db
+from ..schemas import MediaObjectResponse, VideoTranscodeJobResponse
+from ..services.auth_service import Principal, get_current_user, get_current_admin_user
+from ..services.media_cache import media_cache
+from ..services.media_gc import collect_garbage
+from ..services.media_processing_service import (
+    STATUS_COMPLETED as PROCESSING_COMPLETED,
+    STATUS_FAILED as PROCESSING_FAILED,
+    schedule_processing
+)
+from ..services.scratch_space import ScratchQuotaExceeded, scratch_space
+from ..services.storage import LocalStorage, ObjectInfo, get_storage, iter_open_file
+from ..services.media_registry import LEGACY_CATEGORIES, LEGACY_EXTENSIONS, get_media_object, register_upload
+from ..services.video_transcoding_service import (
+    create_transcode_job,
+    get_latest_job,
+    hls_prefix,
+    STATUS_FAILED
+)
 
 router = APIRouter()
 
-# Путь для временного хранения файлов перед отправкой в S3 Storage
-TEMP_UPLOAD_DIR = Path("/tmp/zooracle_uploads")
-TEMP_UPLOAD_DIR.mkdir(exist_ok=True)
-
 # Максимальный размер файлов в байтах
 MAX_IMAGE_SIZE = 4 * 1024 * 1024  # 4 MB
 MAX_VIDEO_SIZE = 1024 * 1024 * 1024  # 1 GB
 
+def _save_and_hash(source, target_path: str):
+    """
+    Сохраняет загружаемый файл во временное пространство, одновременно вычисляя SHA-256 содержимого
+
+    Args:
+        source: Файловый объект загрузки
+        target_path: Путь, по которому сохраняется файл
+
+    Returns:
+        tuple: (размер файла в байтах, SHA-256 содержимого в шестнадцатеричном виде)
+
+    Raises:
+        ScratchQuotaExceeded: Если временное пространство заполнено
+    """
+    digest = hashlib.sha256()
+    size = scratch_space.write_stream(source, target_path, on_chunk=digest.update)
+    return size, digest.hexdigest()
+
+def _parse_range(range_header: Optional[str], size: int):
+    """
+    Разбирает заголовок Range с одним диапазоном байтов
+
+    Args:
+        range_header: Значение заголовка (например, 'bytes=0-1023' или 'bytes=-500')
+        size: Размер объекта
+
+    Returns:
+        tuple: (начало, длина) или None, если заголовок отсутствует или содержит несколько диапазонов
+
+    Raises:
+        HTTPException: 416, если диапазон не пересекается с объектом
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[6:].strip().partition("-")
+    try:
+        if start:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        else:
+            # Суффиксный диапазон: последние N байт
+            start = max(size - int(end), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Запрошенный диапазон недоступен",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end - start + 1
+
+async def _object_response(request: Request, info: ObjectInfo, headers: Optional[dict] = None, filename: Optional[str] = None):
+    """
+    Формирует ответ с содержимым объекта хранилища.
+    Поддерживает запросы диапазонов (Range) для перемотки видео. Объекты
+    локального хранилища отдаются прямо из файла, без промежуточной копии;
+    объекты из S3 - из локального кэша (см. media_cache), а слишком большие
+    для кэша - потоком из хранилища.
+
+    Args:
+        request: Запрос клиента
+        info: Сведения об объекте
+        headers: Дополнительные заголовки ответа
+        filename: Имя файла для заголовка Content-Disposition
+
+    Returns:
+        Response: Ответ с содержимым объекта или его диапазона
+    """
+    storage = get_storage()
+    headers = {"Accept-Ranges": "bytes", "ETag": f'"{info.etag}"', **(headers or {})}
+    byte_range = _parse_range(request.headers.get("range"), info.size)
+
+    local_path = storage.local_path(info.name)
+    if local_path is None:
+        local_path = await run_in_threadpool(media_cache.get_path, storage, info)
+
+    # Файл открывается до ответа: открытый файл можно дочитать, даже если
+    # его вытеснит из кэша другой воркер
+    source = None
+    if local_path is not None:
+        try:
+            source = await run_in_threadpool(open, local_path, "rb")
+        except FileNotFoundError:
+            # Файл уже вытеснен - отдаем объект потоком из хранилища
+            pass
+
+    if byte_range is not None:
+        start, length = byte_range
+        headers["Content-Range"] = f"bytes {start}-{start + length - 1}/{info.size}"
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(
+            iter_open_file(source, start, length) if source else storage.open_stream(info.name, start, length),
+            status_code=206,
+            media_type=info.content_type,
+            headers=headers
+        )
+
+    headers["Content-Length"] = str(info.size)
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(
+        iter_open_file(source) if source else storage.open_stream(info.name),
+        media_type=info.content_type,
+        headers=headers
+    )
+
 @router.post("/upload/")
 async def upload_media_file(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
 ):
     """
-    Загрузка медиа-файла на сервер
+    Загрузка медиа-файла на сервер.
+    Для видео дополнительно ставится задача перекодирования в HLS.
     
     Args:
         file: Файл для загрузки
+        db: Сессия базы данных
         current_user: Текущий пользователь 
         
     Returns:
         dict: Информация о загруженном файле с его ID
     """
     try:
-        # Создаем уникальный идентификатор для файла
-        file_id = str(uuid.uuid4())
-        
         # Получаем расширение файла
         file_extension = os.path.splitext(file.filename)[1].lower()
         
@@ -53,30 +173,25 @@ async def upload_media_file(
                 detail="Недопустимый тип файла. Разрешены только JPG, JPEG, PNG, WEBP, MP4, AVI"
             )
         
-        # Временный путь для сохранения файла
-        temp_file_path = TEMP_UPLOAD_DIR / f"{file_id}{file_extension}"
-        
-        # Сохраняем файл во временную директорию, используя потоковый метод
-        try:
-            with open(temp_file_path, "wb") as buffer:
-                # Копируем данные из файла небольшими частями
-                shutil.copyfileobj(file.file, buffer)
-                
-            # Получаем размер файла
-            file_size = os.path.getsize(temp_file_path)
+        # Сохраняем файл во временное пространство, используя потоковый метод.
+        # Временный файл удаляется при выходе из контекста при любом исходе
+        with scratch_space.file(suffix=file_extension, prefix="upload-") as temp_file_path:
+            # ID файла - SHA-256 содержимого, вычисляемый при сохранении
+            try:
+                file_size, file_id = await run_in_threadpool(_save_and_hash, file.file, temp_file_path)
+            except ScratchQuotaExceeded as e:
+                raise HTTPException(status_code=507, detail=str(e))
             
             # Определяем категорию файла
             is_image = file_extension in allowed_image_extensions
             
             # Проверка на размер файла
             if is_image and file_size > MAX_IMAGE_SIZE:
-                os.remove(temp_file_path)
                 raise HTTPException(
                     status_code=413,
                     detail=f"Размер изображения превышает допустимое значение в {MAX_IMAGE_SIZE/(1024*1024)} МБ"
                 )
             elif not is_image and file_size > MAX_VIDEO_SIZE:
-                os.remove(temp_file_path)
                 raise HTTPException(
                     status_code=413,
                     detail=f"Размер видео превышает допустимое значение в {MAX_VIDEO_SIZE/(1024*1024*1024)} ГБ"
@@ -85,26 +200,42 @@ async def upload_media_file(
             # Категория файла (изображение или видео)
             file_category = "images" if is_image else "videos"
             
-            # Загружаем файл в MinIO
-            object_name = f"{file_category}/{file_id}{file_extension}"
-            await upload_file_to_minio(
-                file_path=str(temp_file_path),
-                object_name=object_name
-            )
+            # Такое же содержимое уже загружено: повторно в хранилище не сохраняем
+            storage = get_storage()
+            existing = get_media_object(db, file_id)
+            deduplicated = existing is not None and await run_in_threadpool(storage.exists, existing.object_name)
+            if deduplicated:
+                object_name = existing.object_name
+                file_extension = os.path.splitext(object_name)[1]
+            else:
+                object_name = f"{file_category}/{file_id}{file_extension}"
+                await run_in_threadpool(storage.ensure_ready)
+                await run_in_threadpool(storage.put_file, temp_file_path, object_name)
+            register_upload(db, file_id, object_name, file_size, file.content_type)
             
-            # Удаляем временный файл
-            os.remove(temp_file_path)
+            # Проверка содержимого и извлечение метаданных выполняются в фоне, не задерживая ответ
+            media = get_media_object(db, file_id)
+            if not deduplicated or media.processing_status == PROCESSING_FAILED:
+                schedule_processing(db, file_id)
             
-            return {
+            result = {
                 "file_id": file_id,
                 "original_filename": file.filename,
                 "content_type": file.content_type,
                 "file_size": file_size,
-                "extension": file_extension
+                "extension": file_extension,
+                "deduplicated": deduplicated,
+                "processing_status": media.processing_status
             }
-        finally:
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+            
+            # Ставим видео в очередь на перекодирование в HLS, если оно еще не перекодировано
+            if not is_image:
+                job = get_latest_job(db, file_id) if deduplicated else None
+                if job is None or job.status == STATUS_FAILED:
+                    job = create_transcode_job(db, file_id, object_name)
+                result["transcode_job_id"] = job.id
+            
+            return result
                 
     except HTTPException:
         raise
@@ -112,52 +243,213 @@ async def upload_media_file(
         print(f"Ошибка при загрузке файла: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при загрузке файла: {str(e)}")
 
-@router.get("/{file_id}")
-async def get_media(
+@router.post("/gc")
+def collect_media_garbage(
+    dry_run: bool = True,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    """
+    Запуск сборки мусора в хранилище (только для администраторов).
+    По умолчанию выполняется пробный запуск, который только находит объекты без ссылок.
+    
+    Args:
+        dry_run: Только найти объекты без ссылок, ничего не удаляя
+        db: Сессия базы данных
+        current_user: Текущий пользователь (должен быть администратором)
+        
+    Returns:
+        dict: Отчет о сборке мусора
+    """
+    return collect_garbage(db, dry_run=dry_run)
+
+@router.post("/{file_id}/transcode", response_model=VideoTranscodeJobResponse)
+async def transcode_video(
     file_id: str,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     """
-    Получение медиа-файла по ID
+    Повторная постановка видео в очередь перекодирования в HLS (только для администраторов).
+    Используется для видео, загруженных до появления перекодирования, и для неудачных задач.
+    
+    Args:
+        file_id: ID видео
+        db: Сессия базы данных
+        current_user: Текущий пользователь (должен быть администратором)
+        
+    Returns:
+        VideoTranscodeJobResponse: Созданная задача перекодирования
+    """
+    for ext in [".mp4", ".avi"]:
+        object_name = f"videos/{file_id}{ext}"
+        if await run_in_threadpool(get_storage().exists, object_name):
+            return create_transcode_job(db, file_id, object_name)
+    
+    raise HTTPException(status_code=404, detail="Видео не найдено")
+
+@router.get("/{file_id}/info", response_model=MediaObjectResponse)
+def get_media_info(
+    file_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Получение сведений о медиафайле: размеров, длительности и статуса обработки
     
     Args:
         file_id: ID файла
+        db: Сессия базы данных
+        
+    Returns:
+        MediaObjectResponse: Сведения о файле
+    """
+    media = get_media_object(db, file_id)
+    if media is None:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    return media
+
+@router.get("/{file_id}/transcode", response_model=VideoTranscodeJobResponse)
+async def get_transcode_status(
+    file_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Получение состояния перекодирования видео в HLS
+    
+    Args:
+        file_id: ID видео
+        db: Сессия базы данных
+        
+    Returns:
+        VideoTranscodeJobResponse: Последняя задача перекодирования видео
+    """
+    job = get_latest_job(db, file_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача перекодирования не найдена")
+    return job
+
+@router.get("/objects/{object_name:path}")
+async def get_signed_object(
+    object_name: str,
+    request: Request,
+    expires: int,
+    signature: str
+):
+    """
+    Получение объекта локального хранилища по подписанной ссылке (см. LocalStorage.presign_get)
+    
+    Args:
+        object_name: Имя объекта
+        expires: Время окончания действия ссылки (Unix time)
+        signature: Подпись ссылки
         
     Returns:
-        FileResponse: Файл
+        Response: Содержимое объекта
     """
+    storage = get_storage()
     try:
-        # Пытаемся найти файл сначала среди изображений, потом среди видео
-        for category in ["images", "videos"]:
-            for ext in [".jpg", ".jpeg", ".png", ".webp", ".mp4", ".avi"]:
-                object_name = f"{category}/{file_id}{ext}"
-                
-                try:
-                    # Пробуем получить файл из MinIO
-                    temp_file_path = await get_file_from_minio(object_name)
-                    
-                    if temp_file_path:
-                        # Определяем тип содержимого
-                        content_types = {
-                            ".jpg": "image/jpeg",
-                            ".jpeg": "image/jpeg",
-                            ".png": "image/png",
-                            ".webp": "image/webp",
-                            ".mp4": "video/mp4",
-                            ".avi": "video/x-msvideo",
-                        }
-                        
-                        # Возвращаем файл с соответствующими заголовками
-                        return FileResponse(
-                            path=temp_file_path,
-                            media_type=content_types.get(ext, "application/octet-stream"),
-                            filename=f"{file_id}{ext}"
-                        )
-                except:
-                    # Если файл не найден с этим расширением, пробуем следующее
-                    continue
+        valid = isinstance(storage, LocalStorage) and storage.verify_signature(object_name, expires, signature)
+        info = await run_in_threadpool(storage.stat, object_name) if valid else None
+    except ValueError:
+        info = None
+    if info is None:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    return await _object_response(request, info)
+
+@router.get("/{file_id}/hls/{file_path:path}")
+async def get_hls_file(
+    file_id: str,
+    file_path: str,
+    request: Request,
+):
+    """
+    Получение HLS-плейлиста или сегмента видео.
+    Мастер-плейлист доступен по пути master.m3u8, плейлисты и сегменты
+    качеств адресуются относительно него.
+    
+    Args:
+        file_id: ID видео
+        file_path: Путь внутри каталога HLS (например, 'master.m3u8' или '720p/segment_00001.ts')
         
-        # Если файл не найден
+    Returns:
+        Response: Содержимое плейлиста или сегмента
+    """
+    if ".." in file_path.split("/") or os.path.splitext(file_path)[1] not in (".m3u8", ".ts"):
         raise HTTPException(status_code=404, detail="Файл не найден")
     
+    object_name = hls_prefix(file_id) + file_path
+    try:
+        info = await run_in_threadpool(get_storage().stat, object_name)
+    except Exception:
+        info = None
+    if info is None:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    
+    # Сегменты неизменяемы, плейлисты могут появиться позже (во время перекодирования)
+    cache_control = "public, max-age=31536000, immutable" if file_path.endswith(".ts") else "no-cache"
+    return await _object_response(request, info, headers={"Cache-Control": cache_control})
+
+def _registered_object(db: Session, file_id: str) -> Optional[tuple]:
+    """
+    Возвращает имя объекта и статус обработки учтенного файла и сразу
+    освобождает соединение, чтобы оно не было занято, пока файл передается клиенту
+    """
+    try:
+        media = get_media_object(db, file_id)
+        return (media.object_name, media.processing_status) if media is not None else None
+    finally:
+        db.close()
+
+
+@router.get("/{file_id}")
+async def get_media(
+    file_id: str,
+    request: Request,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Получение медиа-файла по ID
+    
+    Args:
+        file_id: ID файла
+        db: Сессия БД
+        
+    Returns:
+        Response: Содержимое файла (поддерживаются запросы диапазонов)
+    """
+    storage = get_storage()
+    try:
+        # Имя объекта учтенного файла известно из media_objects. Файлы, загруженные
+        # до появления учета, ищутся среди изображений, потом среди видео
+        registered = await run_in_threadpool(_registered_object, db, file_id)
+        if registered is not None:
+            candidates = [registered[0]]
+        else:
+            candidates = [
+                f"{category}/{file_id}{ext}"
+                for category in LEGACY_CATEGORIES
+                for ext in LEGACY_EXTENSIONS
+            ]
+        # Содержимое обработанного файла по ID больше не меняется, поэтому кэшируется
+        # навсегда. До окончания обработки фоновый воркер еще может перезаписать файл
+        # без метаданных (EXIF с координатами и т. п.), поэтому такой ответ не сохраняется в кэшах
+        if registered is None or registered[1] == PROCESSING_COMPLETED:
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "no-store"
+        for name in candidates:
+            info = await run_in_threadpool(storage.stat, name)
+            if info is not None:
+                return await _object_response(
+                    request,
+                    info,
+                    headers={"Cache-Control": cache_control},
+                    filename=os.path.basename(name)
+                )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при получении файла: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении файла: {str(e)}")
+    
+    # Если файл не найден
+    raise HTTPException(status_code=404, detail="Файл не найден")
@@ -3,8 +3,11 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from typing import List
 
-from .. import models, schemas, database
-from ..routers.auth import get_current_user
+from .. import models, schemas
+from ..database import get_db
+from ..replicas import get_read_db
+from ..services.auth_service import Principal, get_current_user
+from ..services.revision_service import touch_tests_with_question
 
 router = APIRouter(
     prefix="/questions",
@@ -12,25 +15,11 @@ router = APIRouter(
 )
 
 
-def get_db():
-    """
-    Получение соединения с базой данных
-    
-    Yields:
-        Session: Сессия базы данных для выполнения запросов
-    """
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("/types", response_model=List[schemas.QuestionType])
 def get_question_types(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение списка всех типов вопросов
@@ -50,7 +39,7 @@ def get_question_types(
 def create_question(
     question: schemas.QuestionCreate,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Создание нового вопроса
@@ -58,7 +47,7 @@ def create_question(
     Args:
         question (schemas.QuestionCreate): Данные для создания вопроса
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь
+        current_user (Principal): Текущий пользователь
         
     Returns:
         models.Question: Созданный вопрос с вариантами ответов
@@ -127,7 +116,7 @@ def create_question(
 @router.get("/{question_id}", response_model=schemas.Question)
 def get_question(
     question_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение вопроса по ID с вариантами ответов
@@ -179,7 +168,7 @@ def update_question(
     question_id: int,
     question_update: schemas.QuestionUpdate,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Обновление вопроса по ID
@@ -188,7 +177,7 @@ def update_question(
         question_id (int): ID вопроса для обновления
         question_update (schemas.QuestionUpdate): Данные для обновления
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь
+        current_user (Principal): Текущий пользователь
         
     Returns:
         schemas.Question: Обновленный вопрос с вариантами ответов
@@ -210,7 +199,7 @@ def update_question(
         )
     
     # Обновляем данные вопроса
-    update_data = question_update.dict(exclude_unset=True, exclude={"answers"})
+    update_data = question_update.model_dump(exclude_unset=True, exclude={"answers"})
     for key, value in update_data.items():
         setattr(db_question, key, value)
     
@@ -283,6 +272,10 @@ def update_question(
                 
         db.commit()
     
+    # Вопрос изменился - увеличиваем версию тестов, в которые он входит
+    touch_tests_with_question(db, question_id)
+    db.commit()
+    
     # Возвращаем обновленный вопрос с вариантами ответов
     return get_question(question_id=question_id, db=db)
 
@@ -291,7 +284,7 @@ def update_question(
 def delete_question(
     question_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Удаление вопроса по ID
@@ -299,7 +292,7 @@ def delete_question(
     Args:
         question_id (int): ID вопроса для удаления
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь
+        current_user (Principal): Текущий пользователь
         
     Raises:
         HTTPException: Если вопрос не найден или пользователь не авторизован
@@ -317,6 +310,9 @@ def delete_question(
             detail="Вопрос не найден"
         )
     
+    # Увеличиваем версию тестов, из которых удаляется вопрос
+    touch_tests_with_question(db, question_id)
+    
     # Удаляем связи тест-вопрос
     db.query(models.TestQuestion).filter(models.TestQuestion.question_id == question_id).delete()
     
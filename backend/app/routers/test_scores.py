@@ -1,44 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Body
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 
-from .. import models, schemas, database
-from ..routers.auth import get_current_user
+from .. import models, schemas
+from ..database import get_db
+from ..services.auth_service import Principal, get_current_user
+from ..services.test_score_export_service import iter_test_scores
+from ..services import leaderboard_service
 
 router = APIRouter(
     tags=["test scores"]
 )
 
 
-def get_db():
-    """
-    Получение соединения с базой данных
-    
-    Yields:
-        Session: Сессия базы данных для выполнения запросов
-    """
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post("/", response_model=schemas.TestScore)
 async def create_test_score(
     test_score: schemas.TestScoreCreate,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
-    Сохранение результатов прохождения теста
+    Сохранение результатов прохождения теста.
+    Результат сообщает клиент, поэтому он попадает только в историю пользователя,
+    но не в рейтинг: рейтинг строится по проверенным попыткам (POST /api/tests/{id}/attempts).
     
     Args:
         test_score (schemas.TestScoreCreate): Данные с результатами теста
             (ID теста, количество правильных ответов, общее количество вопросов)
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь
+        current_user (Principal): Текущий пользователь
         
     Returns:
         models.TestScore: Сохраненный результат теста
@@ -75,14 +67,14 @@ async def create_test_score(
 @router.get("/", response_model=List[schemas.TestScore])
 async def get_user_test_scores(
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Получение всех результатов тестов текущего пользователя
     
     Args:
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь
+        current_user (Principal): Текущий пользователь
         
     Returns:
         List[models.TestScore]: Список результатов тестов
@@ -90,11 +82,108 @@ async def get_user_test_scores(
     return db.query(models.TestScore).filter(models.TestScore.user_id == current_user.id).all()
 
 
+@router.get("/export")
+async def export_test_scores(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    test_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Потоковая выгрузка результатов тестов всех пользователей (только для администраторов)
+    
+    Args:
+        format (str): Формат выгрузки ('ndjson' или 'csv')
+        date_from (datetime, optional): Начало периода (включительно)
+        date_to (datetime, optional): Конец периода (не включительно)
+        test_id (int, optional): ID теста для фильтрации
+        db (Session): Сессия БД
+        current_user (Principal): Текущий пользователь
+        
+    Returns:
+        StreamingResponse: Результаты с логинами пользователей и названиями тестов
+        
+    Raises:
+        HTTPException: Если пользователь не администратор или период задан неверно
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Для выгрузки результатов необходимы права администратора"
+        )
+    
+    if date_from is not None and date_to is not None and date_from >= date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Начало периода должно быть раньше его конца"
+        )
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        iter_test_scores(db, format, date_from, date_to, test_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="test_scores.{format}"'}
+    )
+
+
+@router.get("/leaderboard/{test_id}", response_model=schemas.Leaderboard)
+def get_leaderboard(
+    test_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Получение рейтинга пользователей по тесту (лучший результат каждого пользователя)
+    
+    Args:
+        test_id (int): ID теста
+        limit (int): Количество мест в рейтинге (от 1 до 100). По умолчанию 10.
+        db (Session): Сессия БД
+        current_user (Principal): Текущий пользователь
+        
+    Returns:
+        schemas.Leaderboard: Лучшие результаты по тесту
+    """
+    return leaderboard_service.get_top(db, test_id, limit)
+
+
+@router.get("/leaderboard/{test_id}/me", response_model=schemas.LeaderboardPosition)
+def get_my_leaderboard_position(
+    test_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Получение места и процентиля лучшего результата текущего пользователя по тесту
+    
+    Args:
+        test_id (int): ID теста
+        db (Session): Сессия БД
+        current_user (Principal): Текущий пользователь
+        
+    Returns:
+        schemas.LeaderboardPosition: Позиция пользователя в рейтинге
+        
+    Raises:
+        HTTPException: Если пользователь еще не проходил тест
+    """
+    position = leaderboard_service.get_position(db, test_id, current_user.id)
+    if position is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Результат теста не найден"
+        )
+    return position
+
+
 @router.get("/{test_id}", response_model=schemas.TestScore)
 async def get_test_score(
     test_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Получение последнего результата конкретного теста пользователя
@@ -102,7 +191,7 @@ async def get_test_score(
     Args:
         test_id (int): ID теста
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь
+        current_user (Principal): Текущий пользователь
         
     Returns:
         models.TestScore: Результат теста
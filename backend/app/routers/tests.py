@@ -1,35 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Header, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from typing import List, Optional
 
-from .. import models, schemas, database
-from ..routers.auth import get_current_user, get_current_admin
+from .. import models, schemas
+from ..database import get_db
+from ..replicas import get_read_db
+from ..serialization import json_response, question_list_adapter
+from ..conditional import make_etag, is_not_modified, cache_headers, not_modified_response
+from ..services.revision_service import touch_animals, touch_tests
+from ..services import leaderboard_service
+from ..services.auth_service import Principal, get_current_user, get_current_admin_user
 
 router = APIRouter(
     tags=["tests"]
 )
 
 
-def get_db():
-    """
-    Получение соединения с базой данных
-    
-    Yields:
-        Session: Сессия базы данных для выполнения запросов
-    """
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post("/", response_model=schemas.Test)
 async def create_test(
     test: schemas.TestCreate,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     """
     Создание нового теста
@@ -37,7 +31,7 @@ async def create_test(
     Args:
         test (schemas.TestCreate): Данные для создания теста
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь (администратор)
+        current_user (Principal): Текущий пользователь (администратор)
         
     Returns:
         models.Test: Созданный тест
@@ -53,6 +47,7 @@ async def create_test(
         db_animal = db.query(models.Animal).filter(models.Animal.id == test.animal_id).first()
         if db_animal:
             db_animal.test_id = db_test.id
+            touch_animals(db, models.Animal.id == db_animal.id)
             db.commit()
             db.refresh(db_animal)
     
@@ -63,7 +58,7 @@ async def create_test(
 def get_tests(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение списка всех тестов
@@ -79,16 +74,45 @@ def get_tests(
     return db.query(models.Test).offset(skip).limit(limit).all()
 
 
+def _get_test_version(db: Session, test_id: int):
+    """
+    Получение версии теста (revision, updated_at) без загрузки самого теста
+    
+    Args:
+        db (Session): Сессия БД
+        test_id (int): ID теста
+        
+    Returns:
+        Row: Версия и время последнего изменения теста
+        
+    Raises:
+        HTTPException: Если тест не найден
+    """
+    version = db.query(models.Test.revision, models.Test.updated_at).filter(
+        models.Test.id == test_id
+    ).first()
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Тест не найден"
+        )
+    return version
+
+
 @router.get("/{test_id}", response_model=schemas.Test)
 def get_test(
     test_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db)
 ):
     """
-    Получение теста по ID
+    Получение теста по ID (с поддержкой условных запросов по ETag)
     
     Args:
         test_id (int): ID теста
+        request (Request): HTTP-запрос
+        response (Response): HTTP-ответ
         db (Session): Сессия БД
         
     Returns:
@@ -97,12 +121,19 @@ def get_test(
     Raises:
         HTTPException: Если тест не найден
     """
+    version = _get_test_version(db, test_id)
+    etag = make_etag("test", test_id, version.revision)
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified_response(etag, version.updated_at)
+    
     db_test = db.query(models.Test).filter(models.Test.id == test_id).first()
     if db_test is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Тест не найден"
         )
+    
+    response.headers.update(cache_headers(etag, version.updated_at))
     return db_test
 
 
@@ -111,7 +142,7 @@ async def update_test(
     test_id: int,
     test: schemas.TestUpdate,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     """
     Обновление теста по ID
@@ -120,7 +151,7 @@ async def update_test(
         test_id (int): ID теста для обновления
         test (schemas.TestUpdate): Данные для обновления
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь (администратор)
+        current_user (Principal): Текущий пользователь (администратор)
         
     Returns:
         models.Test: Обновленный тест
@@ -135,10 +166,11 @@ async def update_test(
             detail="Тест не найден"
         )
     
-    update_data = test.dict(exclude_unset=True)
+    update_data = test.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_test, key, value)
     
+    touch_tests(db, [test_id])
     db.commit()
     db.refresh(db_test)
     return db_test
@@ -148,7 +180,7 @@ async def update_test(
 async def delete_test(
     test_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     """
     Удаление теста по ID
@@ -156,7 +188,7 @@ async def delete_test(
     Args:
         test_id (int): ID теста для удаления
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь (администратор)
+        current_user (Principal): Текущий пользователь (администратор)
         
     Raises:
         HTTPException: Если тест не найден
@@ -169,12 +201,16 @@ async def delete_test(
         )
     
     # Обновляем ссылки на тест в животных перед удалением
+    touch_animals(db, models.Animal.test_id == test_id)
     db_animals = db.query(models.Animal).filter(models.Animal.test_id == test_id).all()
     for animal in db_animals:
         animal.test_id = None
     
     # Удаляем связи с вопросами
     db.query(models.TestQuestion).filter(models.TestQuestion.test_id == test_id).delete()
+
+    # Удаляем рейтинг теста: его записи ссылаются на тест
+    leaderboard_service.delete_test_leaderboard(db, test_id)
     
     # Удаляем тест
     db.delete(db_test)
@@ -186,13 +222,15 @@ async def delete_test(
 @router.get("/{test_id}/questions", response_model=List[schemas.Question])
 def get_test_questions(
     test_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: Session = Depends(get_read_db)
 ):
     """
-    Получение всех вопросов теста по ID теста
+    Получение всех вопросов теста по ID теста (с поддержкой условных запросов по ETag)
     
     Args:
         test_id (int): ID теста
+        request (Request): HTTP-запрос
         db (Session): Сессия БД
         
     Returns:
@@ -201,14 +239,27 @@ def get_test_questions(
     Raises:
         HTTPException: Если тест не найден
     """
-    # Проверяем, существует ли тест
-    test = db.query(models.Test).filter(models.Test.id == test_id).first()
-    if test is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Тест не найден"
-        )
+    version = _get_test_version(db, test_id)
+    etag = make_etag("test-questions", test_id, version.revision)
+    if is_not_modified(request, etag, version.updated_at):
+        return not_modified_response(etag, version.updated_at)
+    
+    response = json_response(question_list_adapter, _load_test_questions(db, test_id))
+    response.headers.update(cache_headers(etag, version.updated_at))
+    return response
+
+
+def _load_test_questions(db: Session, test_id: int) -> list:
+    """
+    Загрузка вопросов теста с вариантами ответов
     
+    Args:
+        db (Session): Сессия БД
+        test_id (int): ID теста
+        
+    Returns:
+        list: Вопросы теста в виде словарей с вариантами ответов
+    """
     # Получаем все ID вопросов, связанные с данным тестом
     test_question_relations = db.query(models.TestQuestion).filter(
         models.TestQuestion.test_id == test_id
@@ -259,7 +310,7 @@ async def create_or_update_test_questions(
     test_id: int,
     questions_data: schemas.TestQuestionsUpdate,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     """
     Создание или обновление вопросов теста
@@ -268,7 +319,7 @@ async def create_or_update_test_questions(
         test_id (int): ID теста
         questions_data (schemas.TestQuestionsUpdate): Данные вопросов для создания/обновления
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь (администратор)
+        current_user (Principal): Текущий пользователь (администратор)
         
     Returns:
         List[schemas.Question]: Список созданных/обновленных вопросов
@@ -468,8 +519,12 @@ async def create_or_update_test_questions(
             
             db.commit()
     
+    # Вопросы теста изменились - увеличиваем его версию
+    touch_tests(db, [test_id])
+    db.commit()
+    
     # Получаем обновленный список вопросов с вариантами ответов
-    return get_test_questions(test_id=test_id, db=db)
+    return json_response(question_list_adapter, _load_test_questions(db, test_id))
 
 
 @router.post("/{test_id}/check")
@@ -477,7 +532,7 @@ async def check_test_answers(
     test_id: int,
     answers_data: dict = Body(...),
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Проверка ответов пользователя на вопросы теста
@@ -486,7 +541,7 @@ async def check_test_answers(
         test_id (int): ID теста
         answers_data (dict): Данные с ответами пользователя
         db (Session): Сессия БД
-        current_user (schemas.UserResponse): Текущий пользователь
+        current_user (Principal): Текущий пользователь
         
     Returns:
         dict: Результаты проверки теста
@@ -495,19 +550,169 @@ async def check_test_answers(
         HTTPException: Если тест не найден
     """
     # Проверяем существование теста
-    test = db.query(models.Test).filter(models.Test.id == test_id).first()
-    if test is None:
+    test_exists = db.query(models.Test.id).filter(models.Test.id == test_id).first()
+    if test_exists is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Тест не найден"
         )
     
-    # Получаем список вопросов теста
-    test_question_relations = db.query(models.TestQuestion).filter(
+    return _grade_test_answers(db, test_id, answers_data.get("answers", []))
+
+
+@router.post("/{test_id}/attempts", response_model=schemas.TestAttemptResult)
+async def submit_test_attempt(
+    test_id: int,
+    attempt: schemas.TestAttemptCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """
+    Проверка ответов и сохранение результата теста одним запросом
+    
+    Результат вычисляется на сервере и записывается в той же транзакции, поэтому
+    его нельзя подделать. Повторный запрос с тем же заголовком Idempotency-Key
+    не создает новую запись, а возвращает сохраненный результат (replayed=true).
+    
+    Args:
+        test_id (int): ID теста
+        attempt (schemas.TestAttemptCreate): Ответы пользователя
+        idempotency_key (str, optional): Ключ идемпотентности из заголовка Idempotency-Key
+        db (Session): Сессия БД
+        current_user (Principal): Текущий пользователь
+        
+    Returns:
+        schemas.TestAttemptResult: Результаты проверки и сохраненный результат теста
+        
+    Raises:
+        HTTPException: Если тест не найден, у теста нет вопросов или ключ
+            идемпотентности уже использован для другого теста
+    """
+    test_exists = db.query(models.Test.id).filter(models.Test.id == test_id).first()
+    if test_exists is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Тест не найден"
+        )
+    
+    user_answers = [answer.model_dump() for answer in attempt.answers]
+    
+    if idempotency_key:
+        existing = _get_attempt_by_key(db, current_user.id, idempotency_key)
+        if existing is not None:
+            return _replay_attempt(db, existing, test_id, user_answers)
+    
+    result = _grade_test_answers(db, test_id, user_answers)
+    
+    db_test_score = models.TestScore(
+        user_id=current_user.id,
+        test_id=test_id,
+        score=f"{result['correct_answers']}/{result['total_questions']}",
+        date=datetime.utcnow(),
+        idempotency_key=idempotency_key or None
+    )
+    db.add(db_test_score)
+    leaderboard_service.record_score(
+        db, test_id, current_user.id,
+        result["correct_answers"], result["total_questions"], db_test_score.date
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел записать попытку раньше
+        db.rollback()
+        existing = _get_attempt_by_key(db, current_user.id, idempotency_key)
+        if existing is None:
+            raise
+        return _replay_attempt(db, existing, test_id, user_answers)
+    db.refresh(db_test_score)
+    
+    return {**result, "test_score": db_test_score, "replayed": False}
+
+
+def _get_attempt_by_key(db: Session, user_id: int, idempotency_key: str):
+    """
+    Находит попытку пользователя по ключу идемпотентности
+    
+    Args:
+        db (Session): Сессия БД
+        user_id (int): ID пользователя
+        idempotency_key (str): Ключ идемпотентности
+        
+    Returns:
+        models.TestScore: Сохраненный результат или None
+    """
+    return db.query(models.TestScore).filter(
+        models.TestScore.user_id == user_id,
+        models.TestScore.idempotency_key == idempotency_key
+    ).first()
+
+
+def _replay_attempt(db: Session, test_score, test_id: int, user_answers: list) -> dict:
+    """
+    Формирует ответ на повторный запрос попытки: счет берется из сохраненной
+    записи, результаты по вопросам - из проверки присланных ответов
+    
+    Args:
+        db (Session): Сессия БД
+        test_score (models.TestScore): Ранее сохраненный результат
+        test_id (int): ID теста из запроса
+        user_answers (list): Ответы пользователя
+        
+    Returns:
+        dict: Результат попытки
+        
+    Raises:
+        HTTPException: Если ключ идемпотентности использован для другого теста
+    """
+    if test_score.test_id != test_id:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ключ идемпотентности уже использован для другого теста"
+        )
+    
+    result = _grade_test_answers(db, test_id, user_answers)
+    correct_answers, _, total_questions = test_score.score.partition("/")
+    result["correct_answers"] = int(correct_answers)
+    result["total_questions"] = int(total_questions)
+    result["score_percentage"] = (
+        int(round(result["correct_answers"] / result["total_questions"] * 100))
+        if result["total_questions"] > 0 else 0
+    )
+    return {**result, "test_score": test_score, "replayed": True}
+
+
+def _grade_test_answers(db: Session, test_id: int, user_answers: list) -> dict:
+    """
+    Проверяет ответы пользователя на вопросы теста
+    
+    Вопросы теста и правильные варианты ответов загружаются двумя запросами
+    для всего теста, а не отдельно для каждого вопроса.
+    
+    Args:
+        db (Session): Сессия БД
+        test_id (int): ID теста
+        user_answers (list): Ответы пользователя (словари с question_id,
+            text_answer и selected_options)
+        
+    Returns:
+        dict: Результаты проверки теста
+        
+    Raises:
+        HTTPException: Если у теста нет вопросов
+    """
+    # Получаем вопросы теста вместе с их типами
+    test_questions = db.query(
+        models.TestQuestion.question_id,
+        models.Question.question_type_id
+    ).outerjoin(
+        models.Question, models.Question.id == models.TestQuestion.question_id
+    ).filter(
         models.TestQuestion.test_id == test_id
-    ).all()
+    ).order_by(models.TestQuestion.id).all()
     
-    question_ids = [tq.question_id for tq in test_question_relations]
+    question_ids = [row.question_id for row in test_questions]
     
     # Если вопросов нет, возвращаем ошибку
     if not question_ids:
@@ -516,40 +721,38 @@ async def check_test_answers(
             detail="У теста отсутствуют вопросы"
         )
     
-    # Получаем все вопросы теста с ответами
-    questions_with_answers = []
+    # Получаем правильные варианты ответов для всех вопросов теста
+    correct_options = {}
+    for question_id, answer_id, answer_name in db.query(
+        models.QuestionAnswer.question_id,
+        models.AnswerOption.id,
+        models.AnswerOption.name
+    ).join(
+        models.AnswerOption, models.AnswerOption.id == models.QuestionAnswer.answer_id
+    ).filter(
+        models.QuestionAnswer.question_id.in_(question_ids),
+        models.AnswerOption.is_correct == True
+    ):
+        correct_options.setdefault(question_id, []).append((answer_id, answer_name))
+    
+    # Ответ пользователя на вопрос (учитывается первый ответ на каждый вопрос)
+    answers_by_question = {}
+    for answer in user_answers:
+        answers_by_question.setdefault(answer.get("question_id"), answer)
+    
     correct_answers = 0
     question_results = []
     
-    # Получаем ответы пользователя
-    user_answers = answers_data.get("answers", [])
-    
     # Для каждого вопроса проверяем правильность ответов
-    for question_id in question_ids:
-        # Получаем вопрос
-        question = db.query(models.Question).filter(models.Question.id == question_id).first()
-        if not question:
+    for question_id, question_type_id in test_questions:
+        # Вопрос удален, но связь с тестом осталась
+        if question_type_id is None:
             continue
         
-        # Получаем связи вопрос-ответ
-        question_answer_relations = db.query(models.QuestionAnswer).filter(
-            models.QuestionAnswer.question_id == question_id
-        ).all()
-        
-        answer_ids = [qa.answer_id for qa in question_answer_relations]
-        
-        # Получаем варианты ответов
-        correct_answer_options = []
-        if answer_ids:
-            answers_query = db.query(models.AnswerOption).filter(
-                models.AnswerOption.id.in_(answer_ids)
-            ).all()
-            
-            # Фильтруем только правильные ответы
-            correct_answer_options = [answer for answer in answers_query if answer.is_correct]
+        correct_answer_options = correct_options.get(question_id, [])
         
         # Находим ответ пользователя на этот вопрос
-        user_answer = next((a for a in user_answers if a.get("question_id") == question_id), None)
+        user_answer = answers_by_question.get(question_id)
         
         # Если ответ пользователя не найден, помечаем как неправильный
         if not user_answer:
@@ -563,23 +766,20 @@ async def check_test_answers(
         is_correct = False
         
         # Вопрос с текстовым ответом
-        if question.question_type_id == 1:
+        if question_type_id == 1:
             # Для текстового ответа проверяем совпадение с правильным ответом (без учета регистра)
-            user_text = user_answer.get("text_answer", "").strip().lower()
+            user_text = (user_answer.get("text_answer") or "").strip().lower()
             
             # Проверяем на совпадение с любым из правильных ответов
-            for correct_option in correct_answer_options:
-                if correct_option.name.lower() == user_text:
-                    is_correct = True
-                    break
+            is_correct = any(name.lower() == user_text for _, name in correct_answer_options)
         
         # Вопрос с одним или несколькими вариантами ответов
-        elif question.question_type_id in [2, 3]:
-            user_selected = set(user_answer.get("selected_options", []))
-            correct_ids = set(answer.id for answer in correct_answer_options)
+        elif question_type_id in [2, 3]:
+            user_selected = set(user_answer.get("selected_options") or [])
+            correct_ids = set(answer_id for answer_id, _ in correct_answer_options)
             
             # Для радио-кнопок (один правильный ответ)
-            if question.question_type_id == 2:
+            if question_type_id == 2:
                 # Правильно, если пользователь выбрал ровно один вариант и он правильный
                 is_correct = len(user_selected) == 1 and user_selected == correct_ids
             
@@ -603,12 +803,10 @@ async def check_test_answers(
     score_percentage = int(round(correct_answers / total_questions * 100)) if total_questions > 0 else 0
     
     # Формируем результат проверки
-    result = {
+    return {
         "test_id": test_id,
         "total_questions": total_questions,
         "correct_answers": correct_answers,
         "score_percentage": score_percentage,
         "question_results": question_results
     }
-    
-    return result
\ No newline at end of file
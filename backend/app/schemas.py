@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, model_validator
 from typing import Optional, List, Union
 from datetime import datetime
 
@@ -15,6 +15,16 @@ class Token(BaseModel):
     login: str
     email: str
     is_admin: bool
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 
 # Схемы для сброса пароля
@@ -57,8 +67,7 @@ class UserResponse(UserBase):
     id: int
     is_admin: bool
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для типов животных
@@ -73,8 +82,7 @@ class AnimalTypeCreate(AnimalTypeBase):
 class AnimalTypeResponse(AnimalTypeBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для мест обитания
@@ -89,8 +97,7 @@ class HabitatCreate(HabitatBase):
 class HabitatResponse(HabitatBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для фото животных
@@ -106,8 +113,7 @@ class AnimalPhotoResponse(AnimalPhotoBase):
     id: int
     animal_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для тестов
@@ -122,8 +128,7 @@ class TestCreate(TestBase):
 class TestResponse(TestBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для типов вопросов
@@ -138,8 +143,7 @@ class QuestionTypeCreate(QuestionTypeBase):
 class QuestionTypeResponse(QuestionTypeBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для вопросов
@@ -155,8 +159,7 @@ class QuestionCreate(QuestionBase):
 class QuestionResponse(QuestionBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для вариантов ответов
@@ -172,8 +175,7 @@ class AnswerOptionCreate(AnswerOptionBase):
 class AnswerOptionResponse(AnswerOptionBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для связи вопросов и ответов
@@ -203,8 +205,7 @@ class AddAnswerToQuestionCreate(BaseModel):
 class QuestionAnswerResponse(QuestionAnswerBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для связи тестов и вопросов
@@ -234,8 +235,7 @@ class AddQuestionToTestCreate(BaseModel):
 class TestQuestionResponse(TestQuestionBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для результатов тестов
@@ -261,12 +261,18 @@ class TestScoreCreate(BaseModel):
     
     Attributes:
         test_id: ID теста
-        correct_answers: Количество правильных ответов
-        total_questions: Общее количество вопросов
+        correct_answers: Количество правильных ответов (не больше общего количества вопросов)
+        total_questions: Общее количество вопросов (больше нуля)
     """
     test_id: int
-    correct_answers: int
-    total_questions: int
+    correct_answers: int = Field(..., ge=0)
+    total_questions: int = Field(..., gt=0)
+
+    @model_validator(mode="after")
+    def check_correct_answers(self):
+        if self.correct_answers > self.total_questions:
+            raise ValueError("Количество правильных ответов не может превышать количество вопросов")
+        return self
 
 
 class TestScore(TestScoreBase):
@@ -278,8 +284,111 @@ class TestScore(TestScoreBase):
     """
     id: int
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TestAttemptAnswer(BaseModel):
+    """
+    Ответ пользователя на вопрос теста
+    
+    Attributes:
+        question_id: ID вопроса
+        text_answer: Текстовый ответ (для вопросов с вводом текста)
+        selected_options: ID выбранных вариантов ответа
+    """
+    question_id: int
+    text_answer: Optional[str] = None
+    selected_options: List[int] = []
+
+
+class TestAttemptCreate(BaseModel):
+    """
+    Схема для отправки попытки прохождения теста
+    
+    Attributes:
+        answers: Ответы пользователя
+    """
+    answers: List[TestAttemptAnswer] = []
+
+
+class TestQuestionResult(BaseModel):
+    """
+    Результат проверки ответа на вопрос
+    """
+    question_id: int
+    is_correct: bool
+
+
+class TestAttemptResult(BaseModel):
+    """
+    Результат попытки прохождения теста
+    
+    Attributes:
+        test_id: ID теста
+        total_questions: Общее количество вопросов
+        correct_answers: Количество правильных ответов
+        score_percentage: Процент правильных ответов
+        question_results: Результаты по каждому вопросу
+        test_score: Сохраненный результат теста
+        replayed: True, если попытка с этим ключом идемпотентности уже была записана ранее
+    """
+    test_id: int
+    total_questions: int
+    correct_answers: int
+    score_percentage: int
+    question_results: List[TestQuestionResult] = []
+    test_score: TestScore
+    replayed: bool = False
+
+
+class LeaderboardEntry(BaseModel):
+    """
+    Место пользователя в рейтинге теста
+    
+    Attributes:
+        rank: Место в рейтинге (1 - лучший результат)
+        user_id: ID пользователя
+        login: Логин пользователя
+        score_percentage: Лучший процент правильных ответов
+        correct_answers: Количество правильных ответов в лучшей попытке
+        total_questions: Количество вопросов в лучшей попытке
+        achieved_at: Дата лучшей попытки
+    """
+    rank: int
+    user_id: int
+    login: Optional[str] = None
+    score_percentage: int
+    correct_answers: int
+    total_questions: int
+    achieved_at: datetime
+
+
+class Leaderboard(BaseModel):
+    """
+    Рейтинг пользователей по тесту
+    
+    Attributes:
+        test_id: ID теста
+        total_participants: Количество пользователей, проходивших тест
+        entries: Лучшие результаты
+    """
+    test_id: int
+    total_participants: int
+    entries: List[LeaderboardEntry] = []
+
+
+class LeaderboardPosition(LeaderboardEntry):
+    """
+    Позиция пользователя в рейтинге теста
+    
+    Attributes:
+        test_id: ID теста
+        percentile: Процент участников с результатом ниже (с учетом половины равных)
+        total_participants: Количество пользователей, проходивших тест
+    """
+    test_id: int
+    percentile: float
+    total_participants: int
 
 
 # Схемы для животных
@@ -310,8 +419,32 @@ class AnimalCreate(BaseModel):
 class AnimalResponse(AnimalBase):
     id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AnimalSummaryResponse(BaseModel):
+    """
+    Краткие данные о животном для сетки каталога (без описания и медиа)
+    """
+    id: int
+    name: str
+    animal_type_id: Optional[int] = None
+    habitat_id: Optional[int] = None
+    preview_id: Optional[str] = None
+
+
+class AnimalWithFavoriteResponse(AnimalResponse):
+    """
+    Данные о животном с признаком наличия в избранном текущего пользователя
+    """
+    is_favorite: bool = False
+
+
+class AnimalSummaryWithFavoriteResponse(AnimalSummaryResponse):
+    """
+    Краткие данные о животном с признаком наличия в избранном текущего пользователя
+    """
+    is_favorite: bool = False
 
 
 class AnimalDetailResponse(AnimalResponse):
@@ -319,8 +452,136 @@ class AnimalDetailResponse(AnimalResponse):
     habitat: Optional[HabitatResponse] = None
     photos: List[AnimalPhotoResponse] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AnimalTestSummary(BaseModel):
+    """
+    Краткие данные о тесте животного
+    
+    Attributes:
+        id: ID теста
+        name: Название теста
+        question_count: Количество вопросов в тесте
+    """
+    id: int
+    name: str
+    question_count: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AnimalFullResponse(AnimalResponse):
+    """
+    Полные данные для страницы животного.
+    Связанные данные присутствуют в ответе только если запрошены в include.
+    
+    Attributes:
+        animal_type: Тип животного
+        habitat: Место обитания
+        photos: Фотографии животного
+        test: Краткие данные о тесте
+        is_favorite: Находится ли животное в избранном текущего пользователя
+    """
+    animal_type: Optional[AnimalTypeResponse] = None
+    habitat: Optional[HabitatResponse] = None
+    photos: Optional[List[AnimalPhotoResponse]] = None
+    test: Optional[AnimalTestSummary] = None
+    is_favorite: Optional[bool] = None
+
+
+# Схемы для массового импорта животных
+class AnimalImportRowError(BaseModel):
+    """
+    Ошибка в строке манифеста импорта
+    
+    Attributes:
+        row: Номер строки в манифесте
+        message: Описание ошибки
+    """
+    row: int
+    message: str
+
+
+class AnimalImportReport(BaseModel):
+    """
+    Отчет о массовом импорте животных
+    
+    Attributes:
+        created: Количество созданных животных
+        photos_created: Количество добавленных фотографий
+        media_uploaded: Количество загруженных в хранилище медиафайлов
+        videos_queued: Количество видео, поставленных на перекодирование
+        failed_rows: Количество пропущенных строк с ошибками
+        errors: Ошибки строк (не более 1000)
+        errors_truncated: Были ли ошибки, не вошедшие в список
+    """
+    created: int
+    photos_created: int
+    media_uploaded: int
+    videos_queued: int
+    failed_rows: int
+    errors: List[AnimalImportRowError] = []
+    errors_truncated: bool = False
+
+
+# Схемы для задач перекодирования видео
+class VideoTranscodeJobResponse(BaseModel):
+    """
+    Схема для отображения состояния перекодирования видео в HLS
+    
+    Attributes:
+        id: Уникальный идентификатор задачи
+        video_id: Идентификатор исходного видео
+        status: Статус задачи (pending, processing, completed, failed)
+        progress: Прогресс перекодирования в процентах
+        renditions: Готовые качества через запятую
+        error: Текст ошибки (если есть)
+        created_at: Дата создания задачи
+        updated_at: Дата последнего обновления задачи
+    """
+    id: int
+    video_id: str
+    status: str
+    progress: float
+    renditions: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class MediaObjectResponse(BaseModel):
+    """
+    Схема для отображения сведений о загруженном медиафайле
+    
+    Attributes:
+        file_id: Идентификатор файла (SHA-256 содержимого)
+        content_type: MIME-тип, заявленный при загрузке
+        detected_type: MIME-тип, определенный по содержимому
+        size: Размер файла в байтах
+        width: Ширина изображения или кадра видео в пикселях
+        height: Высота изображения или кадра видео в пикселях
+        duration: Длительность видео в секундах
+        codec: Кодек видеопотока
+        processing_status: Статус обработки (pending, processing, completed, rejected, failed)
+        processing_error: Причина отклонения или текст ошибки обработки
+        uploaded_at: Дата последней загрузки файла
+    """
+    file_id: str
+    content_type: Optional[str] = None
+    detected_type: Optional[str] = None
+    size: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    duration: Optional[float] = None
+    codec: Optional[str] = None
+    processing_status: str
+    processing_error: Optional[str] = None
+    uploaded_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для избранных животных
@@ -336,8 +597,29 @@ class FavoriteAnimalResponse(FavoriteAnimalBase):
     id: int
     user_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class FavoriteAnimalBulkRequest(BaseModel):
+    """
+    Список животных для массовых операций с избранным
+    
+    Attributes:
+        animal_ids: ID животных (не более 1000 за запрос)
+    """
+    animal_ids: List[int] = Field(..., max_length=1000)
+
+
+class FavoriteAnimalBulkResult(BaseModel):
+    """
+    Результат массового добавления или удаления избранного
+    
+    Attributes:
+        affected: Сколько записей избранного было добавлено или удалено
+        favorite_ids: ID животных из запроса, которые теперь находятся в избранном
+    """
+    affected: int
+    favorite_ids: List[int]
 
 
 # Схемы для работы с AnswerOption (вариантами ответов)
@@ -377,8 +659,7 @@ class AnswerOption(AnswerOptionBase):
     """
     id: int
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для работы с Questions (вопросами)
@@ -430,8 +711,7 @@ class Question(QuestionBase):
     id: int
     answers: List[AnswerOption] = []
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Схемы для работы с Tests (тестами)
@@ -474,8 +754,7 @@ class Test(TestBase):
     """
     id: int
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TestWithQuestions(Test):
@@ -513,8 +792,7 @@ class TestQuestionResponse(BaseModel):
     test_id: int
     question_id: int
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TestQuestionsUpdate(BaseModel):
@@ -547,5 +825,4 @@ class QuestionType(QuestionTypeBase):
     """
     id: int
     
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
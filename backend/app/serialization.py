@@ -0,0 +1,53 @@
+"""
+Быстрая сериализация ответов API.
+
+Для горячих списковых эндпоинтов данные проверяются заранее созданным
+TypeAdapter и сериализуются в JSON одним проходом pydantic-core сразу в байты,
+минуя jsonable_encoder и стандартный модуль json.
+"""
+from typing import Any, List
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+from . import schemas
+
+# Адаптеры создаются один раз при импорте: построение схемы - дорогая операция
+animal_list_adapter = TypeAdapter(List[schemas.AnimalResponse])
+animal_summary_list_adapter = TypeAdapter(List[schemas.AnimalSummaryResponse])
+animal_favorite_list_adapter = TypeAdapter(List[schemas.AnimalWithFavoriteResponse])
+animal_summary_favorite_list_adapter = TypeAdapter(List[schemas.AnimalSummaryWithFavoriteResponse])
+question_list_adapter = TypeAdapter(List[schemas.Question])
+
+
+def dump_json(adapter: TypeAdapter, data: Any) -> bytes:
+    """
+    Проверяет данные (ORM-объекты, строки результата или словари) и сериализует их в JSON
+
+    Args:
+        adapter (TypeAdapter): Адаптер типа ответа
+        data (Any): Данные для сериализации
+
+    Returns:
+        bytes: JSON-представление данных
+    """
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def json_response(adapter: TypeAdapter, data: Any, status_code: int = 200) -> Response:
+    """
+    Формирует HTTP-ответ с JSON, сериализованным через TypeAdapter
+
+    Args:
+        adapter (TypeAdapter): Адаптер типа ответа
+        data (Any): Данные для сериализации
+        status_code (int, optional): HTTP-статус ответа. По умолчанию 200.
+
+    Returns:
+        Response: Готовый ответ с типом application/json
+    """
+    return Response(
+        content=dump_json(adapter, data),
+        status_code=status_code,
+        media_type="application/json"
+    )
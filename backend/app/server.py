@@ -0,0 +1,177 @@
+"""
+Запуск бэкенда в production: gunicorn управляет несколькими процессами
+uvicorn, поэтому долгий вход (bcrypt) или блокирующий вызов хранилища
+останавливает только один воркер, а не весь сервис.
+
+Главный процесс один раз создает структуру БД и заполняет справочники,
+затем запускает воркеры. Каждый воркер импортирует приложение заново и
+создает свои пулы соединений, очереди и кэши в обработчиках startup
+(app.main); при завершении воркера обработчики shutdown останавливают фоновые
+потоки, возвращают прерванные задачи перекодирования и обработки медиафайлов
+в очередь и закрывают пулы. Упавший или зависший дольше WEB_TIMEOUT воркер
+перезапускается. Плановая замена воркеров после WEB_MAX_REQUESTS запросов по
+умолчанию выключена: фоновые задачи выполняются в процессах воркеров, и
+долгое перекодирование при каждой замене начиналось бы заново.
+
+Если установлены uvloop и httptools, они используются вместо стандартных
+цикла событий asyncio и HTTP-парсера h11.
+
+Запуск: python -m app.server
+
+Переменные окружения:
+    PORT                    Порт (по умолчанию 8080)
+    WEB_CONCURRENCY         Количество воркеров (по умолчанию по числу доступных ядер, не меньше 2)
+    WEB_BACKLOG             Очередь ожидающих соединений
+    WEB_KEEPALIVE           Время ожидания следующего запроса в keep-alive соединении, секунды
+    WEB_TIMEOUT             Через сколько секунд без ответа воркер считается зависшим
+    WEB_GRACEFUL_TIMEOUT    Время на завершение запросов при остановке воркера, секунды
+    WEB_MAX_REQUESTS        Запросов до плановой замены воркера (по умолчанию 0 - без замены)
+    WEB_LIMIT_CONCURRENCY   Одновременных соединений и запросов на воркер, сверх лимита - ответ 503
+    WEB_LOOP                Цикл событий: auto, uvloop или asyncio
+    WEB_HTTP                HTTP-парсер: auto, httptools или h11
+    WEB_ACCESS_LOG          Журнал запросов: '-' для stdout (по умолчанию выключен)
+"""
+import logging
+import math
+import os
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+logger = logging.getLogger("server")
+
+PORT = int(os.getenv("PORT", "8080"))
+WEB_BACKLOG = int(os.getenv("WEB_BACKLOG", "2048"))
+# Больше keepalive_timeout nginx (60 с), чтобы соединения закрывал прокси, а не бэкенд
+WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", "75"))
+WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", "120"))
+WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+# Фоновые задачи выполняются в процессах воркеров, поэтому плановая замена выключена
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+WEB_LIMIT_CONCURRENCY = int(os.getenv("WEB_LIMIT_CONCURRENCY", "1024"))
+WEB_LOOP = os.getenv("WEB_LOOP", "auto")
+WEB_HTTP = os.getenv("WEB_HTTP", "auto")
+WEB_ACCESS_LOG = os.getenv("WEB_ACCESS_LOG") or None
+
+
+def available_cpus() -> int:
+    """
+    Количество ядер, доступных процессу, с учетом привязки к ядрам и квоты cgroup (контейнера)
+
+    Returns:
+        int: Количество ядер (не меньше 1)
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            count = min(count, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(count, 1)
+
+
+def default_workers() -> int:
+    """
+    Количество воркеров по умолчанию: по одному на ядро, но не меньше двух,
+    чтобы заблокированный воркер не останавливал обработку запросов
+    """
+    return max(available_cpus(), 2)
+
+
+class ZooracleWorker(UvicornWorker):
+    """
+    Воркер uvicorn с быстрым циклом событий и HTTP-парсером (если установлены)
+    и ограничением одновременных запросов
+    """
+    CONFIG_KWARGS = {
+        "loop": WEB_LOOP,
+        "http": WEB_HTTP,
+        "lifespan": "on",
+        "limit_concurrency": WEB_LIMIT_CONCURRENCY or None,
+    }
+
+
+def on_starting(server):
+    """
+    Создает структуру БД и заполняет справочники один раз в главном процессе,
+    чтобы воркеры не выполняли DDL одновременно
+    """
+    from . import models  # noqa: F401 - регистрирует модели в Base.metadata
+    from .database import Base, engine, init_db
+
+    # Резервная SQLite в памяти своя у каждого процесса: ее воркеры инициализируют сами
+    if engine.dialect.name != "postgresql":
+        return
+    Base.metadata.create_all(bind=engine)
+    init_db()
+    # Соединения главного процесса не должны достаться воркерам
+    engine.dispose()
+    os.environ["DB_INIT_ON_IMPORT"] = "false"
+
+
+def post_worker_init(worker):
+    logger.info(f"Воркер {worker.pid} запущен")
+
+
+def worker_abort(worker):
+    logger.error(f"Воркер {worker.pid} не отвечал дольше {WEB_TIMEOUT} с и будет перезапущен")
+
+
+class ProductionServer(BaseApplication):
+    """
+    Приложение gunicorn с настройками из переменных окружения
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from .main import app
+        return app
+
+
+def build_options() -> dict:
+    """
+    Настройки gunicorn
+
+    Returns:
+        dict: Значения настроек по их именам
+    """
+    return {
+        "bind": f"0.0.0.0:{PORT}",
+        "workers": int(os.getenv("WEB_CONCURRENCY", "0")) or default_workers(),
+        "worker_class": "app.server.ZooracleWorker",
+        "backlog": WEB_BACKLOG,
+        "keepalive": WEB_KEEPALIVE,
+        "timeout": WEB_TIMEOUT,
+        "graceful_timeout": WEB_GRACEFUL_TIMEOUT,
+        "max_requests": WEB_MAX_REQUESTS,
+        # Разброс, чтобы воркеры не перезапускались одновременно
+        "max_requests_jitter": WEB_MAX_REQUESTS // 10,
+        # Приложение загружается в каждом воркере: пулы соединений и потоки не наследуются от главного процесса
+        "preload_app": False,
+        "accesslog": WEB_ACCESS_LOG,
+        "on_starting": on_starting,
+        "post_worker_init": post_worker_init,
+        "worker_abort": worker_abort,
+    }
+
+
+def main():
+    options = build_options()
+    logger.info(f"Запуск сервера на порту {PORT}, воркеров: {options['workers']}")
+    ProductionServer(options).run()
+
+
+if __name__ == "__main__":
+    main()
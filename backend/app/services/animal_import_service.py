@@ -0,0 +1,506 @@
+"""
+Массовый импорт и потоковый экспорт животных.
+
+Импорт читает манифест (NDJSON или CSV) построчно, не загружая его в память
+целиком. Строки проверяются и обрабатываются пакетами: медиафайлы пакета
+загружаются из ZIP-архива в хранилище параллельно (с ограничением числа
+потоков), затем животные и их фотографии добавляются в БД одной транзакцией
+на пакет. Медиафайлы сохраняются так же, как при обычной загрузке: ID файла -
+SHA-256 содержимого, уже загруженное содержимое повторно не сохраняется, а
+новые файлы учитываются в реестре и ставятся в очередь на обработку.
+
+Экспорт выбирает животных порциями (yield_per) и отдает их по мере чтения,
+поэтому объем памяти не зависит от размера каталога. Формат экспорта
+совпадает с форматом манифеста импорта.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from ..models import Animal, AnimalPhoto, AnimalType, Habitat
+from .media_processing_service import STATUS_FAILED as PROCESSING_FAILED, schedule_processing
+from .media_registry import get_media_object, register_upload
+from .minio_service import get_content_type
+from .scratch_space import scratch_space
+from .storage import get_storage
+from .video_transcoding_service import STATUS_FAILED, create_transcode_job, get_latest_job
+
+logger = logging.getLogger("animal_import")
+
+# Количество строк манифеста, обрабатываемых в одной транзакции
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+# Максимальное число одновременных загрузок медиафайлов в хранилище
+IMPORT_UPLOAD_CONCURRENCY = int(os.getenv("IMPORT_UPLOAD_CONCURRENCY", "8"))
+
+# Количество животных, выбираемых из БД за один раз при экспорте
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Сколько ошибок строк возвращается в отчете об импорте
+MAX_REPORTED_ERRORS = 1000
+
+# Колонки экспорта (и CSV-манифеста импорта)
+EXPORT_FIELDS = ["id", "name", "description", "animal_type", "habitat", "preview_id", "video_id", "photo_ids"]
+
+# Разделитель списков (фотографий) в CSV
+CSV_LIST_SEPARATOR = "|"
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi")
+
+
+def detect_manifest_format(file_name: str) -> Optional[str]:
+    """
+    Определяет формат манифеста по расширению файла
+
+    Args:
+        file_name (str): Имя файла манифеста
+
+    Returns:
+        Optional[str]: 'ndjson', 'csv' или None для неподдерживаемого формата
+    """
+    extension = os.path.splitext(file_name or "")[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return None
+
+
+def _iter_manifest(stream, manifest_format: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Построчно читает манифест
+
+    Args:
+        stream: Бинарный поток манифеста
+        manifest_format (str): 'ndjson' или 'csv'
+
+    Yields:
+        Tuple[int, Optional[dict], Optional[str]]: Номер строки, данные строки и ошибка разбора
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if manifest_format == "csv":
+        # Первая строка CSV - заголовок, поэтому данные начинаются со второй
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, row, None
+        return
+
+    for number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"Некорректный JSON: {e.msg}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Строка должна быть JSON-объектом"
+            continue
+        yield number, row, None
+
+
+def _as_list(value) -> List[str]:
+    """
+    Приводит значение поля со списком (JSON-массив или строка CSV через '|') к списку строк
+    """
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(CSV_LIST_SEPARATOR) if item.strip()]
+
+
+def _as_text(value) -> Optional[str]:
+    """
+    Приводит значение поля к строке без пробелов по краям (None для пустых значений)
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _resolve_reference(row: dict, field: str, lookup: Dict[str, int], title: str) -> Optional[int]:
+    """
+    Определяет ID справочного значения по ID (поле <field>_id) или названию (поле <field>)
+
+    Raises:
+        ValueError: Если значение указано, но не найдено в справочнике
+    """
+    value = _as_text(row.get(f"{field}_id")) or _as_text(row.get(field))
+    if value is None:
+        return None
+    resolved = lookup.get(value.lower())
+    if resolved is None:
+        raise ValueError(f"{title} '{value}' не найден")
+    return resolved
+
+
+def _load_lookup(db: Session, model) -> Dict[str, int]:
+    """
+    Загружает справочник (типы животных или места обитания) в словарь
+    {ID или название в нижнем регистре: ID}
+    """
+    lookup = {}
+    for item_id, name in db.execute(select(model.id, model.name)):
+        lookup[str(item_id)] = item_id
+        lookup[name.strip().lower()] = item_id
+    return lookup
+
+
+def _parse_row(row: dict, types: Dict[str, int], habitats: Dict[str, int], archive_names: set) -> dict:
+    """
+    Проверяет строку манифеста и приводит ее к данным для вставки
+
+    Args:
+        row (dict): Строка манифеста
+        types (Dict[str, int]): Справочник типов животных
+        habitats (Dict[str, int]): Справочник мест обитания
+        archive_names (set): Имена файлов в архиве медиа
+
+    Returns:
+        dict: values - колонки Animal, media - имена файлов архива
+        (preview, video, photos), photo_ids - ID уже загруженных фотографий
+
+    Raises:
+        ValueError: Если строка содержит ошибку
+    """
+    name = _as_text(row.get("name"))
+    description = _as_text(row.get("description"))
+    if name is None:
+        raise ValueError("Не указано название животного")
+    if description is None:
+        raise ValueError("Не указано описание животного")
+
+    media = {
+        "preview": _as_text(row.get("preview")),
+        "video": _as_text(row.get("video")),
+        "photos": _as_list(row.get("photos")),
+    }
+    for kind, file_names in (("preview", [media["preview"]]), ("video", [media["video"]]), ("photos", media["photos"])):
+        for file_name in filter(None, file_names):
+            if file_name not in archive_names:
+                raise ValueError(f"Файл '{file_name}' не найден в архиве медиа")
+            extension = os.path.splitext(file_name)[1].lower()
+            allowed = VIDEO_EXTENSIONS if kind == "video" else IMAGE_EXTENSIONS
+            if extension not in allowed:
+                raise ValueError(f"Недопустимый тип файла '{file_name}'")
+
+    return {
+        "values": {
+            "name": name,
+            "description": description,
+            "animal_type_id": _resolve_reference(row, "animal_type", types, "Тип животного"),
+            "habitat_id": _resolve_reference(row, "habitat", habitats, "Место обитания"),
+            "preview_id": _as_text(row.get("preview_id")),
+            "video_id": _as_text(row.get("video_id")),
+        },
+        "media": media,
+        "photo_ids": _as_list(row.get("photo_ids")),
+    }
+
+
+class _ArchiveMedia(NamedTuple):
+    """
+    Медиафайл из архива, сохраненный в хранилище
+    """
+    file_id: str
+    object_name: str
+    size: int
+
+
+class _ArchiveUploader:
+    """
+    Загружает файлы из ZIP-архива в хранилище пулом потоков.
+    Каждый поток открывает архив один раз и читает файлы независимо от других.
+    """
+
+    def __init__(self, archive_path: str, concurrency: int):
+        self.archive_path = archive_path
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="import-upload")
+        self._local = threading.local()
+        # Имя файла в архиве -> сохраненный медиафайл
+        self.uploaded: Dict[str, _ArchiveMedia] = {}
+
+    def _archive(self) -> zipfile.ZipFile:
+        archive = getattr(self._local, "archive", None)
+        if archive is None:
+            archive = zipfile.ZipFile(self.archive_path)
+            self._local.archive = archive
+        return archive
+
+    def _upload(self, file_name: str) -> _ArchiveMedia:
+        """
+        Распаковывает файл во временное пространство, одновременно вычисляя SHA-256,
+        и сохраняет его под именем из хэша, если такого объекта еще нет
+        """
+        archive = self._archive()
+        extension = os.path.splitext(file_name)[1].lower()
+        category = "videos" if extension in VIDEO_EXTENSIONS else "images"
+        storage = get_storage()
+        with scratch_space.file(suffix=extension, prefix="import-") as temp_path:
+            digest = hashlib.sha256()
+            with archive.open(file_name) as data:
+                size = scratch_space.write_stream(data, temp_path, on_chunk=digest.update)
+            file_id = digest.hexdigest()
+            object_name = f"{category}/{file_id}{extension}"
+            if not storage.exists(object_name):
+                storage.put_file(temp_path, object_name)
+        return _ArchiveMedia(file_id, object_name, size)
+
+    def _register(self, db: Session, media: _ArchiveMedia) -> _ArchiveMedia:
+        """
+        Учитывает файл в реестре медиа и ставит новое содержимое в очередь на обработку
+        """
+        existing = get_media_object(db, media.file_id)
+        if existing is not None and existing.object_name != media.object_name and get_storage().exists(existing.object_name):
+            # Такое же содержимое уже загружено под другим расширением
+            media = media._replace(object_name=existing.object_name)
+        register_upload(db, media.file_id, media.object_name, media.size, get_content_type(media.object_name))
+        if existing is None or existing.processing_status == PROCESSING_FAILED:
+            schedule_processing(db, media.file_id)
+        return media
+
+    def upload_all(self, db: Session, file_names: set) -> Dict[str, str]:
+        """
+        Загружает еще не загруженные файлы и учитывает их в реестре медиа
+
+        Args:
+            db (Session): Сессия базы данных
+            file_names (set): Имена файлов в архиве
+
+        Returns:
+            Dict[str, str]: Ошибки загрузки по именам файлов
+        """
+        pending = [name for name in file_names if name not in self.uploaded]
+        futures = {name: self.executor.submit(self._upload, name) for name in pending}
+        errors = {}
+        for name, future in futures.items():
+            try:
+                self.uploaded[name] = self._register(db, future.result())
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Ошибка загрузки файла '{name}' из архива: {str(e)}")
+                errors[name] = str(e)
+        return errors
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def _flush_batch(db: Session, batch: List[Tuple[int, dict]], uploader: Optional[_ArchiveUploader], report: dict):
+    """
+    Загружает медиафайлы пакета и добавляет животных и фотографии одной транзакцией
+    """
+    videos = []
+    if uploader is not None:
+        file_names = {
+            file_name
+            for _, item in batch
+            for file_name in [item["media"]["preview"], item["media"]["video"], *item["media"]["photos"]]
+            if file_name
+        }
+        uploaded_before = len(uploader.uploaded)
+        upload_errors = uploader.upload_all(db, file_names)
+        report["media_uploaded"] += len(uploader.uploaded) - uploaded_before
+
+        ready = []
+        for number, item in batch:
+            media = item["media"]
+            failed = [name for name in [media["preview"], media["video"], *media["photos"]] if name in upload_errors]
+            if failed:
+                _add_error(report, number, f"Не удалось загрузить файл '{failed[0]}': {upload_errors[failed[0]]}")
+                continue
+            if media["preview"]:
+                item["values"]["preview_id"] = uploader.uploaded[media["preview"]].file_id
+            if media["video"]:
+                video = uploader.uploaded[media["video"]]
+                item["values"]["video_id"] = video.file_id
+                videos.append((video.file_id, video.object_name))
+            item["photo_ids"] = item["photo_ids"] + [uploader.uploaded[name].file_id for name in media["photos"]]
+            ready.append((number, item))
+        batch = ready
+
+    if not batch:
+        return
+
+    try:
+        animal_ids = db.execute(
+            insert(Animal).returning(Animal.id, sort_by_parameter_order=True),
+            [item["values"] for _, item in batch]
+        ).scalars().all()
+
+        photo_rows = [
+            {"animal_id": animal_id, "photo_id": photo_id}
+            for animal_id, (_, item) in zip(animal_ids, batch)
+            for photo_id in item["photo_ids"]
+        ]
+        if photo_rows:
+            db.execute(insert(AnimalPhoto), photo_rows)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ошибка при сохранении пакета импорта: {str(e)}")
+        for number, _ in batch:
+            _add_error(report, number, f"Ошибка при сохранении в БД: {str(e)}")
+        return
+
+    report["created"] += len(animal_ids)
+    report["photos_created"] += len(photo_rows)
+
+    # Видео ставятся в очередь на перекодирование только после фиксации пакета,
+    # если это содержимое еще не перекодировано
+    for video_id, object_name in dict(videos).items():
+        job = get_latest_job(db, video_id)
+        if job is None or job.status == STATUS_FAILED:
+            create_transcode_job(db, video_id, object_name)
+            report["videos_queued"] += 1
+
+
+def _add_error(report: dict, row_number: int, message: str):
+    """
+    Добавляет ошибку строки в отчет (в отчет попадают только первые MAX_REPORTED_ERRORS ошибок)
+    """
+    report["failed_rows"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": row_number, "message": message})
+    else:
+        report["errors_truncated"] = True
+
+
+def import_animals(db: Session, manifest_stream, manifest_format: str, archive_path: Optional[str] = None) -> dict:
+    """
+    Импортирует животных из манифеста и архива медиа
+
+    Строки с ошибками пропускаются и попадают в отчет, остальные сохраняются
+    пакетами по IMPORT_BATCH_SIZE строк.
+
+    Args:
+        db (Session): Сессия базы данных
+        manifest_stream: Бинарный поток манифеста
+        manifest_format (str): 'ndjson' или 'csv'
+        archive_path (Optional[str]): Путь к ZIP-архиву с медиафайлами
+
+    Returns:
+        dict: Отчет об импорте (созданные записи, загруженные файлы, ошибки строк)
+
+    Raises:
+        ValueError: Если архив медиа не является ZIP-файлом
+    """
+    report = {
+        "created": 0,
+        "photos_created": 0,
+        "media_uploaded": 0,
+        "videos_queued": 0,
+        "failed_rows": 0,
+        "errors": [],
+        "errors_truncated": False,
+    }
+
+    types = _load_lookup(db, AnimalType)
+    habitats = _load_lookup(db, Habitat)
+
+    uploader = None
+    archive_names = set()
+    if archive_path is not None:
+        if not zipfile.is_zipfile(archive_path):
+            raise ValueError("Архив медиа должен быть ZIP-файлом")
+        with zipfile.ZipFile(archive_path) as archive:
+            archive_names = {info.filename for info in archive.infolist() if not info.is_dir()}
+        get_storage().ensure_ready()
+        uploader = _ArchiveUploader(archive_path, IMPORT_UPLOAD_CONCURRENCY)
+
+    try:
+        batch = []
+        for number, row, error in _iter_manifest(manifest_stream, manifest_format):
+            if error is None:
+                try:
+                    batch.append((number, _parse_row(row, types, habitats, archive_names)))
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                _add_error(report, number, error)
+
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                _flush_batch(db, batch, uploader, report)
+                batch = []
+
+        _flush_batch(db, batch, uploader, report)
+    finally:
+        if uploader is not None:
+            uploader.close()
+
+    logger.info(
+        f"Импорт завершен: создано {report['created']} животных, "
+        f"{report['photos_created']} фото, ошибок в строках: {report['failed_rows']}"
+    )
+    return report
+
+
+def export_animals(db: Session, export_format: str) -> Iterator[bytes]:
+    """
+    Потоково выгружает всех животных в формате манифеста импорта
+
+    Args:
+        db (Session): Сессия базы данных
+        export_format (str): 'ndjson' или 'csv'
+
+    Yields:
+        bytes: Очередная порция выгрузки (по одной на EXPORT_BATCH_SIZE животных)
+    """
+    statement = select(
+        Animal.id,
+        Animal.name,
+        Animal.description,
+        AnimalType.name.label("animal_type"),
+        Habitat.name.label("habitat"),
+        Animal.preview_id,
+        Animal.video_id
+    ).outerjoin(
+        AnimalType, AnimalType.id == Animal.animal_type_id
+    ).outerjoin(
+        Habitat, Habitat.id == Animal.habitat_id
+    ).order_by(Animal.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        yield buffer.getvalue().encode("utf-8")
+
+    for partition in db.execute(statement).partitions():
+        # Фотографии всей порции выбираются одним запросом
+        photos = defaultdict(list)
+        for animal_id, photo_id in db.execute(
+            select(AnimalPhoto.animal_id, AnimalPhoto.photo_id)
+            .where(AnimalPhoto.animal_id.in_([row.id for row in partition]))
+            .order_by(AnimalPhoto.id)
+        ):
+            photos[animal_id].append(photo_id)
+
+        buffer = io.StringIO()
+        if export_format == "csv":
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+            for row in partition:
+                record = dict(row._mapping)
+                record["photo_ids"] = CSV_LIST_SEPARATOR.join(photos[row.id])
+                writer.writerow(record)
+        else:
+            for row in partition:
+                record = dict(row._mapping)
+                record["photo_ids"] = photos[row.id]
+                buffer.write(json.dumps(record, ensure_ascii=False))
+                buffer.write("\n")
+        yield buffer.getvalue().encode("utf-8")
@@ -1,23 +1,32 @@
+import os
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models import User
-from ..schemas import TokenData
 
 # Секретный ключ для JWT
 SECRET_KEY = "your-secret-key-change-this-in-production"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 10080 # 7 дней
+# Токен доступа живет недолго; сессию продлевает токен обновления
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+# Типы токенов (поле type)
+TOKEN_TYPE_ACCESS = "access"
+TOKEN_TYPE_REFRESH = "refresh"
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+# Схема не возвращает 401 при отсутствии токена: анонимные запросы различает get_principal
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 
 def verify_password(plain_password, hashed_password):
@@ -76,34 +85,170 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Недействительные учетные данные",
-        headers={"WWW-Authenticate": "Bearer"},
+def _create_token(user: User, token_type: str, expires_delta: timedelta) -> dict:
+    """
+    Создает токен с идентификатором (jti), ID и версией токенов пользователя
+    """
+    jti = uuid.uuid4().hex
+    expires_at = datetime.utcnow() + expires_delta
+    token = create_access_token(
+        data={
+            "sub": user.login,
+            "uid": user.id,
+            "ver": user.token_version or 0,
+            "type": token_type,
+            "jti": jti
+        },
+        expires_delta=expires_delta
     )
+    return {"token": token, "jti": jti, "expires_at": expires_at}
+
+
+def create_token_pair(user: User) -> dict:
+    """
+    Выдает пользователю токен доступа и токен обновления
+    
+    Args:
+        user (User): Пользователь
+        
+    Returns:
+        dict: Поля ответа Token (токены, срок действия токена доступа и данные пользователя)
+    """
+    access = _create_token(user, TOKEN_TYPE_ACCESS, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    refresh = _create_token(user, TOKEN_TYPE_REFRESH, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    return {
+        "access_token": access["token"],
+        "refresh_token": refresh["token"],
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "token_type": "bearer",
+        "user_id": user.id,
+        "login": user.login,
+        "email": user.email,
+        "is_admin": user.is_admin
+    }
+
+
+def decode_token(token: str, token_type: str = TOKEN_TYPE_ACCESS) -> Optional[dict]:
+    """
+    Декодирует токен и проверяет его тип и отзыв
+    
+    Args:
+        token (str): JWT-токен
+        token_type (str, optional): Ожидаемый тип токена
+        
+    Returns:
+        Optional[dict]: Поля токена или None, если токен недействителен или отозван
+    """
+    # Импорт внутри функции исключает циклический импорт: модуль отзыва использует сроки действия токенов
+    from .token_revocation import is_token_revoked
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
     except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.login == token_data.username).first()
-    if user is None:
-        raise credentials_exception
-    return user
+        return None
+    if payload.get("type") != token_type or payload.get("sub") is None:
+        return None
+    if token_type == TOKEN_TYPE_ACCESS and is_token_revoked(payload):
+        return None
+    return payload
+
+
+class Principal(NamedTuple):
+    """
+    Авторизованный пользователь запроса (неизменяемый, без привязки к сессии БД)
+    
+    Attributes:
+        id (int): ID пользователя
+        login (str): Логин
+        email (str): Email
+        is_admin (bool): Является ли пользователь администратором
+    """
+    id: int
+    login: str
+    email: str
+    is_admin: bool
+
 
+def get_principal(
+    request: Request,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[Principal]:
+    """
+    Единая зависимость аутентификации: декодирует токен доступа и загружает
+    пользователя один раз за запрос. Результат сохраняется в request.state,
+    поэтому повторные обращения в рамках запроса (в том числе через разные
+    зависимости) не декодируют токен и не обращаются к БД заново
+    
+    Args:
+        request (Request): HTTP-запрос
+        token (Optional[str]): JWT-токен из заголовка Authorization
+        db (Session): Сессия базы данных
+        
+    Returns:
+        Optional[Principal]: Пользователь или None для анонимного запроса и недействительного токена
+    """
+    if hasattr(request.state, "principal"):
+        return request.state.principal
+    
+    principal = None
+    payload = decode_token(token) if token else None
+    if payload is not None:
+        in_transaction = db.in_transaction()
+        # Загружаем только нужные колонки по первичному ключу, без ORM-объекта
+        row = db.execute(
+            select(User.id, User.login, User.email, User.is_admin).where(User.id == payload["uid"])
+        ).first()
+        if not in_transaction:
+            # Завершаем начатую проверкой транзакцию, чтобы не удерживать соединение
+            # до конца запроса: обработчик может читать с реплики (get_read_db)
+            db.rollback()
+        if row is not None:
+            principal = Principal(*row)
+    request.state.principal = principal
+    return principal
+
+
+async def get_current_user(principal: Optional[Principal] = Depends(get_principal)) -> Principal:
+    """
+    Возвращает текущего пользователя
+    
+    Raises:
+        HTTPException: 401, если токен отсутствует или недействителен
+    """
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Недействительные учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+
+async def get_optional_current_user(principal: Optional[Principal] = Depends(get_principal)) -> Optional[Principal]:
+    """
+    Возвращает текущего пользователя, если запрос содержит действительный токен.
+    
+    Returns:
+        Optional[Principal]: Пользователь или None для анонимного запроса
+    """
+    return principal
+
+
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     return current_user
 
 
-async def get_current_admin_user(current_user: User = Depends(get_current_user)):
+async def get_current_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """
+    Возвращает текущего пользователя, если он администратор
+    
+    Raises:
+        HTTPException: 401 без действительного токена, 403 для пользователя без прав администратора
+    """
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Недостаточно прав доступа"
         )
-    return current_user
\ No newline at end of file
+    return current_user
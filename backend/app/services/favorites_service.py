@@ -0,0 +1,106 @@
+"""
+Работа с избранными животными пользователей.
+
+Добавление выполняется одним INSERT ... ON CONFLICT DO NOTHING по уникальному
+индексу (user_id, animal_id) вместо чтения с последующей записью, поэтому
+повторные и одновременные запросы не создают дубликатов.
+"""
+from typing import Iterable, List, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import Animal, FavoriteAnimal
+
+
+def _insert_ignore_duplicates(db: Session, rows: List[dict]) -> int:
+    """
+    Вставляет записи избранного, пропуская уже существующие
+
+    Args:
+        db (Session): Сессия базы данных
+        rows (List[dict]): Записи со значениями user_id и animal_id
+
+    Returns:
+        int: Количество добавленных записей
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        insert = postgresql_insert
+    else:
+        insert = sqlite_insert
+    statement = insert(FavoriteAnimal).values(rows).on_conflict_do_nothing(
+        index_elements=[FavoriteAnimal.user_id, FavoriteAnimal.animal_id]
+    )
+    return db.execute(statement).rowcount
+
+
+def get_favorite_ids(db: Session, user_id: int, animal_ids: Iterable[int]) -> Set[int]:
+    """
+    Возвращает ID животных из списка, которые находятся в избранном пользователя
+
+    Args:
+        db (Session): Сессия базы данных
+        user_id (int): ID пользователя
+        animal_ids (Iterable[int]): ID проверяемых животных
+
+    Returns:
+        Set[int]: ID избранных животных
+    """
+    animal_ids = set(animal_ids)
+    if not animal_ids:
+        return set()
+    return set(db.scalars(
+        select(FavoriteAnimal.animal_id).where(
+            FavoriteAnimal.user_id == user_id,
+            FavoriteAnimal.animal_id.in_(animal_ids)
+        )
+    ))
+
+
+def add_favorites(db: Session, user_id: int, animal_ids: Iterable[int]) -> int:
+    """
+    Добавляет существующих животных в избранное пользователя.
+    Несуществующие ID и уже добавленные животные пропускаются.
+
+    Args:
+        db (Session): Сессия базы данных
+        user_id (int): ID пользователя
+        animal_ids (Iterable[int]): ID животных
+
+    Returns:
+        int: Количество добавленных записей
+    """
+    animal_ids = set(animal_ids)
+    if not animal_ids:
+        return 0
+    existing_ids = db.scalars(select(Animal.id).where(Animal.id.in_(animal_ids))).all()
+    if not existing_ids:
+        return 0
+    return _insert_ignore_duplicates(
+        db, [{"user_id": user_id, "animal_id": animal_id} for animal_id in existing_ids]
+    )
+
+
+def remove_favorites(db: Session, user_id: int, animal_ids: Iterable[int]) -> int:
+    """
+    Удаляет животных из избранного пользователя одним запросом
+
+    Args:
+        db (Session): Сессия базы данных
+        user_id (int): ID пользователя
+        animal_ids (Iterable[int]): ID животных
+
+    Returns:
+        int: Количество удаленных записей
+    """
+    animal_ids = set(animal_ids)
+    if not animal_ids:
+        return 0
+    return db.execute(
+        delete(FavoriteAnimal).where(
+            FavoriteAnimal.user_id == user_id,
+            FavoriteAnimal.animal_id.in_(animal_ids)
+        ).execution_options(synchronize_session=False)
+    ).rowcount
@@ -0,0 +1,370 @@
+"""
+Рейтинг пользователей по тестам и процентили результатов.
+
+Лучший результат каждого пользователя по тесту хранится в сводной таблице
+test_leaderboard и обновляется при записи каждого нового результата в той же
+транзакции. Каждое изменение увеличивает версию рейтинга теста
+(test_leaderboard_state).
+
+Каждый воркер держит в памяти отсортированные списки результатов по тестам
+и отвечает на запросы топа и процентиля без обращения к БД. Не чаще чем раз
+в LEADERBOARD_SYNC_INTERVAL секунд воркер сверяет версию рейтинга с БД и
+догружает только изменившиеся записи, поэтому рейтинги разных воркеров
+расходятся не дольше этого интервала. Воркер, записавший результат, видит
+его сразу после фиксации транзакции.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import TestLeaderboardEntry, TestLeaderboardState, TestScore, User
+
+logger = logging.getLogger("leaderboard")
+
+# Как часто (в секундах) воркер сверяет свой рейтинг с БД
+LEADERBOARD_SYNC_INTERVAL = float(os.getenv("LEADERBOARD_SYNC_INTERVAL", "1.0"))
+
+# Размер порции при первичном заполнении сводной таблицы из test_score
+BACKFILL_BATCH_SIZE = 5000
+
+
+class _TestLeaderboard:
+    """
+    Рейтинг одного теста в памяти воркера
+
+    ranking - ключи (-процент, время попытки, ID пользователя) по возрастанию,
+    то есть от лучшего результата к худшему; percentages - проценты по возрастанию
+    для подсчета процентиля.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.synced_at = 0.0
+        self.entries: Dict[int, dict] = {}
+        self.ranking: List[tuple] = []
+        self.percentages: List[int] = []
+
+    @staticmethod
+    def _key(entry: dict) -> tuple:
+        return (-entry["score_percentage"], entry["achieved_at"], entry["user_id"])
+
+    def apply(self, entry: dict):
+        """
+        Добавляет или заменяет результат пользователя
+        """
+        previous = self.entries.get(entry["user_id"])
+        if previous is not None:
+            key = self._key(previous)
+            del self.ranking[bisect_left(self.ranking, key)]
+            del self.percentages[bisect_left(self.percentages, previous["score_percentage"])]
+        self.entries[entry["user_id"]] = entry
+        insort(self.ranking, self._key(entry))
+        insort(self.percentages, entry["score_percentage"])
+
+    def top(self, limit: int) -> List[dict]:
+        """
+        Возвращает лучшие результаты с местами в рейтинге
+        """
+        return [
+            {**self.entries[user_id], "rank": rank}
+            for rank, (_, _, user_id) in enumerate(self.ranking[:limit], start=1)
+        ]
+
+    def position(self, user_id: int) -> Optional[dict]:
+        """
+        Возвращает место и процентиль результата пользователя
+
+        Процентиль - доля участников с результатом ниже, плюс половина участников
+        с таким же результатом (в процентах).
+        """
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        total = len(self.percentages)
+        below = bisect_left(self.percentages, entry["score_percentage"])
+        same = bisect_right(self.percentages, entry["score_percentage"]) - below
+        return {
+            **entry,
+            "rank": bisect_left(self.ranking, self._key(entry)) + 1,
+            "percentile": round((below + same / 2) / total * 100, 1),
+            "total_participants": total,
+        }
+
+
+_boards: Dict[int, _TestLeaderboard] = {}
+_lock = threading.Lock()
+
+
+def _dialect_insert(db: Session):
+    """
+    Возвращает конструктор INSERT с поддержкой ON CONFLICT для диалекта текущей БД
+    """
+    return postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+def _percentage(correct_answers: int, total_questions: int) -> int:
+    return int(round(correct_answers / total_questions * 100)) if total_questions > 0 else 0
+
+
+def _mark_stale(test_id: int):
+    """
+    Заставляет воркер сверить рейтинг теста с БД при следующем запросе
+    """
+    with _lock:
+        board = _boards.get(test_id)
+        if board is not None:
+            board.synced_at = 0.0
+
+
+def record_score(
+    db: Session,
+    test_id: int,
+    user_id: int,
+    correct_answers: int,
+    total_questions: int,
+    achieved_at: datetime
+) -> bool:
+    """
+    Учитывает новый результат в рейтинге теста. Не фиксирует транзакцию:
+    изменения применяются вместе с записью результата при commit вызывающего кода.
+
+    Args:
+        db (Session): Сессия базы данных
+        test_id (int): ID теста
+        user_id (int): ID пользователя
+        correct_answers (int): Количество правильных ответов
+        total_questions (int): Количество вопросов
+        achieved_at (datetime): Дата и время попытки
+
+    Returns:
+        bool: True, если результат стал новым лучшим результатом пользователя
+    """
+    score_percentage = _percentage(correct_answers, total_questions)
+    insert = _dialect_insert(db)
+
+    # Обновляем запись только если новый результат лучше (при равенстве остается более ранний)
+    statement = insert(TestLeaderboardEntry).values(
+        test_id=test_id,
+        user_id=user_id,
+        score_percentage=score_percentage,
+        correct_answers=correct_answers,
+        total_questions=total_questions,
+        achieved_at=achieved_at,
+        version=0
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[TestLeaderboardEntry.test_id, TestLeaderboardEntry.user_id],
+        set_={
+            "score_percentage": statement.excluded.score_percentage,
+            "correct_answers": statement.excluded.correct_answers,
+            "total_questions": statement.excluded.total_questions,
+            "achieved_at": statement.excluded.achieved_at,
+        },
+        where=statement.excluded.score_percentage > TestLeaderboardEntry.score_percentage
+    ).returning(TestLeaderboardEntry.id)
+    entry_id = db.execute(statement).scalar()
+    if entry_id is None:
+        return False
+
+    # Увеличиваем версию рейтинга теста. Строка версии блокируется до конца
+    # транзакции, поэтому версии выдаются в порядке фиксации изменений
+    version = db.execute(
+        insert(TestLeaderboardState)
+        .values(test_id=test_id, version=1)
+        .on_conflict_do_update(
+            index_elements=[TestLeaderboardState.test_id],
+            set_={"version": TestLeaderboardState.version + 1}
+        )
+        .returning(TestLeaderboardState.version)
+    ).scalar_one()
+    db.execute(
+        update(TestLeaderboardEntry)
+        .where(TestLeaderboardEntry.id == entry_id)
+        .values(version=version)
+    )
+
+    # После фиксации транзакции этот воркер сразу перечитает рейтинг теста
+    event.listen(db, "after_commit", lambda session: _mark_stale(test_id), once=True)
+    return True
+
+
+def _drop_board(test_id: int):
+    with _lock:
+        _boards.pop(test_id, None)
+
+
+def delete_test_leaderboard(db: Session, test_id: int):
+    """
+    Удаляет рейтинг теста перед удалением самого теста. Не фиксирует транзакцию:
+    записи удаляются вместе с тестом при commit вызывающего кода.
+
+    Остальные воркеры перестраивают рейтинг при следующей сверке: версия
+    удаленного рейтинга считается равной 0.
+
+    Args:
+        db (Session): Сессия базы данных
+        test_id (int): ID теста
+    """
+    db.execute(delete(TestLeaderboardEntry).where(TestLeaderboardEntry.test_id == test_id))
+    db.execute(delete(TestLeaderboardState).where(TestLeaderboardState.test_id == test_id))
+    event.listen(db, "after_commit", lambda session: _drop_board(test_id), once=True)
+
+
+def _load_entries(db: Session, test_id: int, since_version: int = 0) -> List[dict]:
+    """
+    Загружает записи рейтинга теста, изменившиеся после указанной версии
+    """
+    rows = db.execute(
+        select(
+            TestLeaderboardEntry.user_id,
+            User.login,
+            TestLeaderboardEntry.score_percentage,
+            TestLeaderboardEntry.correct_answers,
+            TestLeaderboardEntry.total_questions,
+            TestLeaderboardEntry.achieved_at
+        ).outerjoin(
+            User, User.id == TestLeaderboardEntry.user_id
+        ).where(
+            TestLeaderboardEntry.test_id == test_id,
+            TestLeaderboardEntry.version > since_version
+        )
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+def _get_board(db: Session, test_id: int) -> _TestLeaderboard:
+    """
+    Возвращает рейтинг теста, при необходимости догружая изменения из БД
+    """
+    now = time.monotonic()
+    with _lock:
+        board = _boards.get(test_id)
+        if board is not None and now - board.synced_at < LEADERBOARD_SYNC_INTERVAL:
+            return board
+
+    version = db.execute(
+        select(TestLeaderboardState.version).where(TestLeaderboardState.test_id == test_id)
+    ).scalar() or 0
+
+    with _lock:
+        board = _boards.get(test_id)
+        if board is None or version < board.version:
+            # Рейтинга еще нет в памяти (или таблица была пересоздана): строим заново
+            board = _TestLeaderboard()
+            for entry in _load_entries(db, test_id):
+                board.apply(entry)
+            _boards[test_id] = board
+        elif version > board.version:
+            for entry in _load_entries(db, test_id, board.version):
+                board.apply(entry)
+        board.version = version
+        board.synced_at = now
+        return board
+
+
+def get_top(db: Session, test_id: int, limit: int) -> dict:
+    """
+    Возвращает лучшие результаты по тесту
+
+    Args:
+        db (Session): Сессия базы данных
+        test_id (int): ID теста
+        limit (int): Количество мест в рейтинге
+
+    Returns:
+        dict: Количество участников и записи рейтинга с местами
+    """
+    board = _get_board(db, test_id)
+    with _lock:
+        return {
+            "test_id": test_id,
+            "total_participants": len(board.entries),
+            "entries": board.top(limit),
+        }
+
+
+def get_position(db: Session, test_id: int, user_id: int) -> Optional[dict]:
+    """
+    Возвращает место и процентиль лучшего результата пользователя по тесту
+
+    Args:
+        db (Session): Сессия базы данных
+        test_id (int): ID теста
+        user_id (int): ID пользователя
+
+    Returns:
+        Optional[dict]: Позиция пользователя или None, если он не проходил тест
+    """
+    board = _get_board(db, test_id)
+    with _lock:
+        position = board.position(user_id)
+    if position is not None:
+        position["test_id"] = test_id
+    return position
+
+
+def backfill_from_scores(db: Session) -> int:
+    """
+    Заполняет пустую сводную таблицу рейтинга по уже сохраненным результатам тестов.
+    Выполняется один раз: если в сводной таблице есть записи, ничего не делает.
+
+    Args:
+        db (Session): Сессия базы данных
+
+    Returns:
+        int: Количество учтенных результатов
+    """
+    if db.execute(select(TestLeaderboardEntry.id).limit(1)).first() is not None:
+        return 0
+
+    best = {}
+    processed = 0
+    statement = select(
+        TestScore.test_id, TestScore.user_id, TestScore.score, TestScore.date
+    ).where(
+        TestScore.test_id.isnot(None), TestScore.user_id.isnot(None)
+    ).order_by(TestScore.date).execution_options(yield_per=BACKFILL_BATCH_SIZE)
+
+    for test_id, user_id, score, achieved_at in db.execute(statement):
+        correct, _, total = (score or "").partition("/")
+        try:
+            correct, total = int(correct), int(total)
+        except ValueError:
+            continue
+        # Некорректные результаты (например, "1000/1") не должны попасть в рейтинг
+        if total <= 0 or not 0 <= correct <= total:
+            continue
+        processed += 1
+        percentage = _percentage(correct, total)
+        current = best.get((test_id, user_id))
+        if current is None or percentage > current["score_percentage"]:
+            best[(test_id, user_id)] = {
+                "test_id": test_id,
+                "user_id": user_id,
+                "score_percentage": percentage,
+                "correct_answers": correct,
+                "total_questions": total,
+                "achieved_at": achieved_at,
+                "version": 1,
+            }
+
+    if not best:
+        return 0
+
+    rows = list(best.values())
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        db.execute(TestLeaderboardEntry.__table__.insert(), rows[start:start + BACKFILL_BATCH_SIZE])
+    for test_id in {row["test_id"] for row in rows}:
+        db.merge(TestLeaderboardState(test_id=test_id, version=1))
+    db.commit()
+    logger.info(f"Рейтинг заполнен по {processed} результатам тестов ({len(rows)} записей)")
+    return processed
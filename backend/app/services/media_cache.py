@@ -0,0 +1,231 @@
+"""
+Локальный дисковый кэш медиафайлов из удаленного хранилища (S3).
+
+Объекты кэшируются в каталоге MEDIA_CACHE_DIR под ключом из имени объекта и
+его ETag, поэтому измененный объект (например, дописанный HLS-плейлист)
+автоматически получает новую запись. При превышении MEDIA_CACHE_MAX_BYTES
+вытесняются давно не запрашивавшиеся файлы (LRU). Объекты крупнее
+MEDIA_CACHE_MAX_OBJECT_BYTES не кэшируются и отдаются из хранилища потоком.
+
+Одновременные промахи по одному объекту объединяются: файл скачивает один
+поток, остальные ждут его результата. Каталог кэша могут разделять несколько
+воркеров, поэтому состояние кэша хранится только на диске: время последнего
+обращения - во времени изменения файла, а лимит размера проверяется по
+фактическому содержимому каталога под файловой блокировкой. Вытесненный
+файл мог быть возвращен другому запросу, поэтому вызывающий код должен
+открыть файл сразу и быть готов к тому, что его уже нет.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .. import metrics
+from .storage import ObjectInfo, StorageBackend
+
+logger = logging.getLogger("media_cache")
+
+# Каталог кэша
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "/tmp/zooracle_media_cache")
+
+# Максимальный суммарный размер кэша в байтах (0 - кэш отключен)
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Максимальный размер одного кэшируемого объекта в байтах
+MEDIA_CACHE_MAX_OBJECT_BYTES = int(os.getenv("MEDIA_CACHE_MAX_OBJECT_BYTES", str(64 * 1024 * 1024)))
+
+# Сколько секунд ждать скачивания объекта другим потоком
+MEDIA_CACHE_FETCH_TIMEOUT = float(os.getenv("MEDIA_CACHE_FETCH_TIMEOUT", "120"))
+
+# Префикс временных файлов, которые еще скачиваются
+TEMP_PREFIX = ".download-"
+
+# Файл блокировки, под которой воркеры проверяют размер кэша и вытесняют файлы
+LOCK_FILE = ".lock"
+
+
+class MediaCache:
+    """
+    Дисковый LRU-кэш объектов хранилища
+
+    Args:
+        directory (str): Каталог кэша
+        max_bytes (int): Максимальный суммарный размер файлов кэша
+        max_object_bytes (int): Максимальный размер одного объекта
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_object_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._lookups = 0
+
+    @staticmethod
+    def _key(info: ObjectInfo) -> str:
+        digest = hashlib.sha256(f"{info.name}\0{info.etag}".encode("utf-8")).hexdigest()
+        # Расширение сохраняем для наглядности содержимого каталога
+        return digest + os.path.splitext(info.name)[1].lower()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        """
+        Отмечает обращение к файлу кэша (время изменения - время последнего обращения)
+
+        Returns:
+            bool: False, если файла нет (еще не скачан или вытеснен)
+        """
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def _shared_lock(self):
+        """
+        Блокировка каталога кэша, общая для всех воркеров
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _evict(self):
+        """
+        Удаляет давно не использовавшиеся файлы, пока суммарный размер каталога
+        превышает лимит. Удаляет также временные файлы прерванных скачиваний
+        """
+        stale_before = time.time() - MEDIA_CACHE_FETCH_TIMEOUT
+        with self._shared_lock():
+            found = []
+            total = 0
+            for current, _, files in os.walk(self.directory):
+                for file_name in files:
+                    if file_name == LOCK_FILE:
+                        continue
+                    path = os.path.join(current, file_name)
+                    try:
+                        stat = os.stat(path)
+                        if file_name.startswith(TEMP_PREFIX):
+                            # Идущее скачивание постоянно обновляет файл
+                            if stat.st_mtime < stale_before:
+                                os.unlink(path)
+                            continue
+                    except FileNotFoundError:
+                        continue
+                    found.append((stat.st_mtime, path, stat.st_size))
+                    total += stat.st_size
+
+            found.sort()
+            for _, path, size in found:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                metrics.increment("media_cache.evictions")
+        metrics.set_gauge("media_cache.bytes", total)
+
+    def _record_lookup(self, hit: bool, size: int):
+        """
+        Обновляет метрики доли попаданий. Вызывается под блокировкой
+        """
+        self._lookups += 1
+        if hit:
+            self._hits += 1
+            metrics.increment("media_cache.hits")
+            metrics.increment("media_cache.bytes_served", size)
+        else:
+            metrics.increment("media_cache.misses")
+        metrics.set_gauge("media_cache.hit_ratio", self._hits / self._lookups)
+
+    def is_cacheable(self, info: ObjectInfo) -> bool:
+        return 0 < info.size <= min(self.max_object_bytes, self.max_bytes)
+
+    def _download(self, storage: StorageBackend, info: ObjectInfo, path: str):
+        """
+        Скачивает объект во временный файл и атомарно переносит его в кэш
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+        os.close(fd)
+        try:
+            storage.download_to_file(info.name, temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def get_path(self, storage: StorageBackend, info: ObjectInfo) -> Optional[str]:
+        """
+        Возвращает путь к локальной копии объекта, при промахе скачивая его из хранилища
+
+        Args:
+            storage (StorageBackend): Хранилище, из которого скачивается объект
+            info (ObjectInfo): Сведения об объекте (размер и ETag)
+
+        Returns:
+            Optional[str]: Путь к файлу в кэше или None, если объект не кэшируется.
+                Файл может быть вытеснен другим воркером в любой момент после возврата
+        """
+        if not self.is_cacheable(info):
+            return None
+
+        key = self._key(info)
+        path = self._path(key)
+        with self._lock:
+            # Файл мог скачать и другой воркер
+            if self._touch(path):
+                self._record_lookup(True, info.size)
+                return path
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                self._inflight[key] = flight
+            self._record_lookup(False, info.size)
+
+        if not leader:
+            metrics.increment("media_cache.coalesced")
+            path = flight.result(timeout=MEDIA_CACHE_FETCH_TIMEOUT)
+            metrics.increment("media_cache.bytes_served", info.size)
+            return path
+
+        try:
+            self._download(storage, info, path)
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+        flight.set_result(path)
+        try:
+            self._evict()
+        except OSError as e:
+            logger.warning(f"Не удалось проверить размер кэша медиафайлов: {str(e)}")
+        metrics.increment("media_cache.bytes_served", info.size)
+        return path
+
+
+media_cache = MediaCache(MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES, MEDIA_CACHE_MAX_OBJECT_BYTES)
@@ -0,0 +1,248 @@
+"""
+Сборка мусора в хранилище медиафайлов.
+
+Находит объекты, на которые не ссылается ни одно животное: файлы, загруженные
+через /media/upload/, но так и не привязанные к животному, и файлы, которые не
+удалось удалить из хранилища после удаления записей из БД.
+
+Объекты перебираются страницами, множество используемых ID строится одним
+потоковым запросом по animals.preview_id, animals.video_id и
+animal_photos.photo_id. Удаляются только объекты старше
+MEDIA_REFERENCE_GRACE_SECONDS; перед удалением каждой порции ссылки на ее
+файлы проверяются повторно, чтобы не удалить файл, привязанный к животному
+уже после построения множества.
+
+Сборка запускается фоновым потоком раз в MEDIA_GC_INTERVAL_SECONDS секунд
+(0 - отключена) или вручную администратором. В PostgreSQL одновременно
+выполняется не больше одной сборки на все воркеры (advisory lock).
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Set
+
+from sqlalchemy import delete, select, text, union
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..database import SessionLocal
+from ..models import Animal, AnimalPhoto, MediaObject
+from .media_registry import LEGACY_CATEGORIES, LEGACY_EXTENSIONS, MEDIA_REFERENCE_GRACE_SECONDS, count_references
+from .storage import ObjectInfo, get_storage
+
+logger = logging.getLogger("media_gc")
+
+# Период запуска сборки в секундах (0 - фоновая сборка отключена)
+MEDIA_GC_INTERVAL_SECONDS = int(os.getenv("MEDIA_GC_INTERVAL_SECONDS", str(6 * 3600)))
+
+# Фоновая сборка только находит объекты без ссылок, ничего не удаляя
+MEDIA_GC_DRY_RUN = os.getenv("MEDIA_GC_DRY_RUN", "false").lower() == "true"
+
+# Количество объектов, удаляемых одним запросом
+MEDIA_GC_BATCH_SIZE = int(os.getenv("MEDIA_GC_BATCH_SIZE", "500"))
+
+# Ключ advisory lock PostgreSQL, исключающего одновременные сборки
+GC_LOCK_KEY = 0x6D656469  # 'medi'
+
+# Сколько имен объектов без ссылок возвращать в отчете
+REPORT_SAMPLE_SIZE = 100
+
+# Размер порции при чтении множества используемых ID
+LIVE_SET_BATCH_SIZE = 5000
+
+_stop_event = threading.Event()
+_worker: Optional[threading.Thread] = None
+
+
+def file_id_from_object_name(object_name: str) -> Optional[str]:
+    """
+    Определяет ID медиафайла по имени объекта
+
+    Args:
+        object_name (str): Имя объекта ('images/<id>.jpg', 'videos/<id>.mp4' или 'videos/<id>/<HLS-файл>')
+
+    Returns:
+        Optional[str]: ID файла или None для объектов, не относящихся к медиафайлам
+    """
+    category, _, rest = object_name.partition("/")
+    if category not in LEGACY_CATEGORIES or not rest:
+        return None
+    head, separator, _ = rest.partition("/")
+    if separator:
+        # Файлы HLS принадлежат видео с ID, совпадающим с именем каталога
+        return head if category == "videos" and head else None
+    file_id, extension = os.path.splitext(rest)
+    return file_id if file_id and extension.lower() in LEGACY_EXTENSIONS else None
+
+
+def _load_live_ids(db: Session) -> Set[str]:
+    """
+    Возвращает множество ID файлов, на которые ссылаются животные и фотографии
+    """
+    live = union(
+        select(Animal.preview_id.label("file_id")).where(Animal.preview_id.isnot(None)),
+        select(Animal.video_id.label("file_id")).where(Animal.video_id.isnot(None)),
+        select(AnimalPhoto.photo_id.label("file_id")),
+    ).subquery()
+    statement = select(live.c.file_id).execution_options(yield_per=LIVE_SET_BATCH_SIZE)
+    return {file_id for (file_id,) in db.execute(statement)}
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _find_orphans(db: Session, objects: Iterator[ObjectInfo], report: dict) -> Iterator[List[ObjectInfo]]:
+    """
+    Отбирает объекты без ссылок старше льготного периода и выдает их порциями
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=MEDIA_REFERENCE_GRACE_SECONDS)
+    live_ids = _load_live_ids(db)
+    # Повторно загруженные файлы защищены от удаления, даже если сам объект старый
+    recent_ids = set(db.scalars(
+        select(MediaObject.file_id).where(MediaObject.uploaded_at > cutoff.replace(tzinfo=None))
+    ))
+
+    batch = []
+    for info in objects:
+        report["scanned"] += 1
+        report["scanned_bytes"] += info.size
+        metrics.increment("media_gc.objects_scanned")
+        file_id = file_id_from_object_name(info.name)
+        if file_id is None or file_id in live_ids:
+            continue
+        last_modified = _as_utc(info.last_modified)
+        if file_id in recent_ids or last_modified is None or last_modified > cutoff:
+            report["skipped_recent"] += 1
+            continue
+        batch.append(info)
+        if len(batch) >= MEDIA_GC_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def collect_garbage(db: Session, dry_run: bool = False) -> dict:
+    """
+    Находит и удаляет объекты хранилища, на которые не ссылается ни одно животное
+
+    Args:
+        db (Session): Сессия базы данных
+        dry_run (bool, optional): Только найти объекты без ссылок, ничего не удаляя
+
+    Returns:
+        dict: Отчет о сборке (количество просмотренных, найденных и удаленных объектов,
+            длительность и скорость просмотра)
+    """
+    report = {
+        "dry_run": dry_run,
+        "scanned": 0,
+        "scanned_bytes": 0,
+        "skipped_recent": 0,
+        "orphans": 0,
+        "orphan_bytes": 0,
+        "deleted": 0,
+        "deleted_bytes": 0,
+        "failed": 0,
+        "sample": [],
+    }
+    started = time.perf_counter()
+    storage = get_storage()
+    bind = db.get_bind()
+    lock_connection = None
+    try:
+        if bind.dialect.name == "postgresql":
+            lock_connection = bind.connect()
+            if not lock_connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": GC_LOCK_KEY}).scalar():
+                logger.info("Сборка мусора в хранилище уже выполняется другим воркером")
+                report["skipped"] = True
+                return report
+
+        for batch in _find_orphans(db, storage.iter_objects(), report):
+            # Ссылки могли появиться после построения множества используемых ID
+            counts = count_references(db, {file_id_from_object_name(info.name) for info in batch})
+            orphans = [info for info in batch if counts[file_id_from_object_name(info.name)] == 0]
+            orphan_bytes = sum(info.size for info in orphans)
+            report["orphans"] += len(orphans)
+            report["orphan_bytes"] += orphan_bytes
+            metrics.increment("media_gc.orphans_found", len(orphans))
+            room = REPORT_SAMPLE_SIZE - len(report["sample"])
+            report["sample"].extend(info.name for info in orphans[:room])
+            if dry_run or not orphans:
+                continue
+
+            result = storage.delete_many(info.name for info in orphans)
+            failed = set(result["failed"])
+            deleted = [info for info in orphans if info.name not in failed]
+            deleted_bytes = sum(info.size for info in deleted)
+            report["deleted"] += len(deleted)
+            report["deleted_bytes"] += deleted_bytes
+            report["failed"] += len(failed)
+            metrics.increment("media_gc.objects_deleted", len(deleted))
+            metrics.increment("media_gc.bytes_deleted", deleted_bytes)
+            metrics.increment("media_gc.delete_failures", len(failed))
+
+            db.execute(delete(MediaObject).where(
+                MediaObject.file_id.in_({file_id_from_object_name(info.name) for info in deleted})
+            ))
+            db.commit()
+    finally:
+        if lock_connection is not None:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": GC_LOCK_KEY})
+            lock_connection.close()
+        elapsed = time.perf_counter() - started
+        report["duration_ms"] = round(elapsed * 1000, 1)
+        report["objects_per_second"] = round(report["scanned"] / elapsed, 1) if elapsed > 0 else 0.0
+        metrics.observe("media_gc.run_ms", elapsed * 1000)
+        metrics.set_gauge("media_gc.objects_per_second", report["objects_per_second"])
+
+    logger.info(
+        f"Сборка мусора в хранилище{' (пробный запуск)' if dry_run else ''}: "
+        f"просмотрено {report['scanned']}, без ссылок {report['orphans']}, удалено {report['deleted']} "
+        f"({report['deleted_bytes']} байт) за {report['duration_ms']} мс"
+    )
+    return report
+
+
+def _gc_loop():
+    """
+    Цикл фонового потока: запускает сборку раз в MEDIA_GC_INTERVAL_SECONDS секунд
+    """
+    while not _stop_event.wait(MEDIA_GC_INTERVAL_SECONDS):
+        db = SessionLocal()
+        try:
+            collect_garbage(db, dry_run=MEDIA_GC_DRY_RUN)
+        except Exception as e:
+            metrics.increment("media_gc.errors")
+            logger.error(f"Ошибка сборки мусора в хранилище: {str(e)}")
+        finally:
+            db.close()
+
+
+def start_gc():
+    """
+    Запускает фоновую сборку мусора (вызывается при старте приложения)
+    """
+    global _worker
+    if _worker is not None or MEDIA_GC_INTERVAL_SECONDS <= 0:
+        return
+    _stop_event.clear()
+    _worker = threading.Thread(target=_gc_loop, name="media-gc", daemon=True)
+    _worker.start()
+    logger.info(f"Сборка мусора в хранилище запускается каждые {MEDIA_GC_INTERVAL_SECONDS} с")
+
+
+def stop_gc():
+    """
+    Останавливает фоновую сборку мусора
+    """
+    global _worker
+    _stop_event.set()
+    if _worker is not None:
+        _worker.join(timeout=5)
+        _worker = None
@@ -0,0 +1,539 @@
+"""
+Обработка загруженных медиафайлов после ответа на загрузку.
+
+Загрузка только сохраняет файл и ставит его в очередь; фоновые потоки
+(MEDIA_PROCESSING_WORKERS) затем:
+
+* определяют тип по сигнатуре содержимого и отклоняют файлы, содержимое
+  которых не соответствует расширению (объект удаляется из хранилища);
+* читают размеры изображений из заголовков JPEG, PNG и WebP;
+* удаляют из изображений метаданные (EXIF, XMP, IPTC, текстовые блоки PNG)
+  без перекодирования. Ориентация JPEG сохраняется в минимальном блоке EXIF,
+  а размеры записываются с учетом поворота. Файл перезаписывается под тем же
+  ID, поэтому до завершения обработки он отдается без долгого кэширования
+  (см. routers/media.get_media).
+
+Длительность, кодек и размеры кадра видео записывает задача перекодирования,
+которая все равно скачивает и анализирует исходник через ffprobe.
+
+Очередь восстанавливается при старте по статусу обработки в media_objects,
+поэтому файлы, загруженные до появления обработки, тоже будут обработаны.
+"""
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..database import SessionLocal
+from ..models import MediaObject
+from .storage import get_storage
+
+logger = logging.getLogger("media_processing_service")
+
+# Количество фоновых потоков обработки
+MEDIA_PROCESSING_WORKERS = int(os.getenv("MEDIA_PROCESSING_WORKERS", "2"))
+
+# Обработка в статусе processing без изменений дольше этого времени считается прерванной
+STALE_PROCESSING_SECONDS = 600
+
+# Как часто (в секундах) работающий процесс возвращает в очередь ожидающие и прерванные файлы
+REQUEUE_INTERVAL_SECONDS = int(os.getenv("MEDIA_PROCESSING_REQUEUE_SECONDS", "60"))
+
+# Сколько байт от начала файла читается для определения типа
+SNIFF_BYTES = 64
+
+# Статусы обработки
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_REJECTED = "rejected"
+STATUS_FAILED = "failed"
+
+# MIME-тип, ожидаемый для каждого допустимого расширения
+EXPECTED_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".mp4": "video/mp4",
+    ".avi": "video/x-msvideo",
+}
+
+# Тег ориентации EXIF
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Блоки PNG, которые могут содержать метаданные
+PNG_METADATA_CHUNKS = {b"eXIf", b"tEXt", b"zTXt", b"iTXt", b"tIME"}
+
+# Очередь ID файлов и рабочие потоки
+_file_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+_workers: List[threading.Thread] = []
+
+# Файлы в очереди этого процесса (без повторов) и обрабатываемые им файлы
+_queued: Set[str] = set()
+_queue_lock = threading.Lock()
+_active_files: Set[str] = set()
+
+_stop_event = threading.Event()
+_requeuer: Optional[threading.Thread] = None
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """
+    Определяет MIME-тип по сигнатуре в начале файла
+
+    Args:
+        head (bytes): Первые байты файла (не меньше 12)
+
+    Returns:
+        Optional[str]: MIME-тип или None, если формат не поддерживается
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "video/x-msvideo"
+    if head[4:8] == b"ftyp":
+        return "video/mp4"
+    return None
+
+
+def _exif_orientation(payload: bytes) -> Optional[int]:
+    """
+    Читает ориентацию из блока EXIF (payload начинается с 'Exif\\0\\0')
+    """
+    tiff = payload[6:]
+    if tiff[:2] == b"II":
+        order = "<"
+    elif tiff[:2] == b"MM":
+        order = ">"
+    else:
+        return None
+    try:
+        (ifd_offset,) = struct.unpack_from(order + "I", tiff, 4)
+        (count,) = struct.unpack_from(order + "H", tiff, ifd_offset)
+        for index in range(count):
+            tag, _, _, value = struct.unpack_from(order + "HHI2s", tiff, ifd_offset + 2 + index * 12)
+            if tag == EXIF_ORIENTATION_TAG:
+                return struct.unpack(order + "H", value)[0]
+    except struct.error:
+        return None
+    return None
+
+
+def _orientation_segment(orientation: int) -> bytes:
+    """
+    Собирает сегмент APP1 с блоком EXIF, содержащим только ориентацию
+    """
+    tiff = b"MM\x00\x2a" + struct.pack(">I", 8) + struct.pack(">H", 1)
+    tiff += struct.pack(">HHIH2x", EXIF_ORIENTATION_TAG, 3, 1, orientation) + struct.pack(">I", 0)
+    payload = b"Exif\x00\x00" + tiff
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def _process_jpeg(data: bytes) -> Tuple[bytes, int, int]:
+    """
+    Удаляет метаданные JPEG и читает размеры из сегмента SOF
+    """
+    output = BytesIO()
+    output.write(data[:2])
+    position = 2
+    width = height = None
+    orientation = None
+    orientation_at = None
+    while position < len(data):
+        if data[position] != 0xFF:
+            raise ValueError("Поврежденная структура JPEG")
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Заполняющий байт перед маркером
+            position += 1
+            continue
+        if marker == 0xD9 or 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            output.write(data[position:position + 2])
+            position += 2
+            continue
+        (length,) = struct.unpack_from(">H", data, position + 2)
+        segment = data[position:position + 2 + length]
+        payload = segment[4:]
+        if len(segment) < length + 2:
+            raise ValueError("Поврежденная структура JPEG")
+        if marker == 0xDA:
+            # После начала скана идут сжатые данные изображения: копируем их без изменений
+            output.write(data[position:])
+            break
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack_from(">HH", payload, 1)
+        if marker == 0xE1 and payload.startswith(b"Exif\x00\x00"):
+            orientation = orientation or _exif_orientation(payload)
+            orientation_at = orientation_at if orientation_at is not None else output.tell()
+        elif not (
+            (marker == 0xE1 and payload.startswith(b"http://ns.adobe.com/"))
+            or (marker == 0xED and payload.startswith(b"Photoshop 3.0"))
+        ):
+            output.write(segment)
+        position += 2 + length
+
+    if width is None or height is None:
+        raise ValueError("В JPEG не найден заголовок кадра")
+
+    result = output.getvalue()
+    if orientation and orientation != 1:
+        # Без ориентации снимок со смартфона отображался бы повернутым
+        result = result[:orientation_at] + _orientation_segment(orientation) + result[orientation_at:]
+        if orientation >= 5:
+            width, height = height, width
+    return result, width, height
+
+
+def _process_png(data: bytes) -> Tuple[bytes, int, int]:
+    """
+    Удаляет блоки метаданных PNG и читает размеры из IHDR
+    """
+    output = BytesIO()
+    output.write(data[:8])
+    position = 8
+    width = height = None
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, position)
+        end = position + 12 + length
+        if end > len(data):
+            raise ValueError("Поврежденная структура PNG")
+        if chunk_type == b"IHDR":
+            width, height = struct.unpack_from(">II", data, position + 8)
+        if chunk_type not in PNG_METADATA_CHUNKS:
+            output.write(data[position:end])
+        position = end
+        if chunk_type == b"IEND":
+            break
+
+    if width is None or height is None:
+        raise ValueError("В PNG не найден заголовок IHDR")
+    return output.getvalue(), width, height
+
+
+def _process_webp(data: bytes) -> Tuple[bytes, int, int]:
+    """
+    Удаляет блоки EXIF и XMP из WebP и читает размеры изображения
+    """
+    chunks = []
+    position = 12
+    width = height = None
+    while position + 8 <= len(data):
+        chunk_type, length = struct.unpack_from("<4sI", data, position)
+        # Данные блока выравниваются до четной длины
+        end = position + 8 + length + (length & 1)
+        if end > len(data):
+            raise ValueError("Поврежденная структура WebP")
+        body = data[position + 8:position + 8 + length]
+        if chunk_type == b"VP8X":
+            width = int.from_bytes(body[4:7], "little") + 1
+            height = int.from_bytes(body[7:10], "little") + 1
+            # Сбрасываем флаги наличия EXIF (0x08) и XMP (0x04)
+            body = bytes([body[0] & ~0x0C & 0xFF]) + body[1:]
+        elif chunk_type == b"VP8 " and width is None:
+            if body[3:6] != b"\x9d\x01\x2a":
+                raise ValueError("Поврежденный кадр VP8")
+            width = struct.unpack_from("<H", body, 6)[0] & 0x3FFF
+            height = struct.unpack_from("<H", body, 8)[0] & 0x3FFF
+        elif chunk_type == b"VP8L" and width is None:
+            if body[:1] != b"\x2f":
+                raise ValueError("Поврежденный кадр VP8L")
+            (bits,) = struct.unpack_from("<I", body, 1)
+            width = (bits & 0x3FFF) + 1
+            height = ((bits >> 14) & 0x3FFF) + 1
+        if chunk_type not in (b"EXIF", b"XMP "):
+            chunks.append(struct.pack("<4sI", chunk_type, length) + body + b"\x00" * (length & 1))
+        position = end
+
+    if width is None or height is None:
+        raise ValueError("В WebP не найден заголовок изображения")
+    payload = b"WEBP" + b"".join(chunks)
+    return b"RIFF" + struct.pack("<I", len(payload)) + payload, width, height
+
+
+IMAGE_PROCESSORS = {
+    "image/jpeg": _process_jpeg,
+    "image/png": _process_png,
+    "image/webp": _process_webp,
+}
+
+
+def process_image(data: bytes, content_type: str) -> Tuple[bytes, int, int]:
+    """
+    Удаляет метаданные изображения и читает его размеры
+
+    Args:
+        data (bytes): Содержимое файла
+        content_type (str): MIME-тип, определенный по сигнатуре
+
+    Returns:
+        Tuple[bytes, int, int]: Очищенное содержимое, ширина и высота
+
+    Raises:
+        ValueError: Если структура файла повреждена
+    """
+    try:
+        return IMAGE_PROCESSORS[content_type](data)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"Поврежденное изображение: {str(e)}")
+
+
+def _enqueue(file_id: str) -> bool:
+    """
+    Ставит файл в очередь процесса, если его там еще нет
+
+    Returns:
+        bool: True, если файл добавлен
+    """
+    with _queue_lock:
+        if file_id in _queued:
+            return False
+        _queued.add(file_id)
+    _file_queue.put(file_id)
+    return True
+
+
+def schedule_processing(db: Session, file_id: str):
+    """
+    Сбрасывает статус обработки файла и ставит его в очередь
+
+    Args:
+        db (Session): Сессия базы данных
+        file_id (str): ID файла
+    """
+    db.execute(
+        update(MediaObject)
+        .where(MediaObject.file_id == file_id)
+        .values(processing_status=STATUS_PENDING, processing_error=None, processed_at=datetime.utcnow())
+    )
+    db.commit()
+    _enqueue(file_id)
+
+
+def record_video_metadata(db: Session, file_id: str, info: dict):
+    """
+    Сохраняет длительность, кодек и размеры кадра видео, полученные ffprobe
+
+    Args:
+        db (Session): Сессия базы данных
+        file_id (str): ID видео
+        info (dict): Результат probe_video
+    """
+    db.execute(
+        update(MediaObject)
+        .where(MediaObject.file_id == file_id)
+        .values(
+            width=info.get("width") or None,
+            height=info.get("height") or None,
+            duration=info.get("duration") or None,
+            codec=info.get("codec")
+        )
+    )
+    db.commit()
+
+
+def _claim(db: Session, file_id: str) -> bool:
+    """
+    Переводит файл в статус processing, если его еще не обрабатывает другой воркер
+    """
+    result = db.execute(
+        update(MediaObject)
+        .where(MediaObject.file_id == file_id, MediaObject.processing_status == STATUS_PENDING)
+        .values(processing_status=STATUS_PROCESSING, processed_at=datetime.utcnow())
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _finish(db: Session, media: MediaObject, status: str, error: Optional[str] = None):
+    media.processing_status = status
+    media.processing_error = error
+    media.processed_at = datetime.utcnow()
+    db.commit()
+    metrics.increment(f"media_processing.{status}")
+
+
+def process_media(file_id: str):
+    """
+    Проверяет содержимое файла, читает размеры изображения и удаляет из него метаданные
+
+    Args:
+        file_id (str): ID файла
+    """
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        if not _claim(db, file_id):
+            return
+        _active_files.add(file_id)
+        media = db.get(MediaObject, file_id)
+        storage = get_storage()
+
+        head = b"".join(storage.open_stream(media.object_name, 0, SNIFF_BYTES))
+        detected_type = sniff_content_type(head)
+        media.detected_type = detected_type
+        expected_type = EXPECTED_TYPES.get(os.path.splitext(media.object_name)[1].lower())
+        if detected_type is None or detected_type != expected_type:
+            # Файл отдается с типом по расширению, поэтому несоответствие недопустимо
+            storage.delete_many([media.object_name])
+            _finish(db, media, STATUS_REJECTED, f"Содержимое файла ({detected_type or 'неизвестный формат'}) не соответствует расширению")
+            logger.warning(f"Файл {file_id} отклонен: тип содержимого {detected_type}, ожидался {expected_type}")
+            return
+
+        if detected_type in IMAGE_PROCESSORS:
+            data = storage.read_bytes(media.object_name)
+            try:
+                cleaned, media.width, media.height = process_image(data, detected_type)
+            except ValueError as e:
+                storage.delete_many([media.object_name])
+                _finish(db, media, STATUS_REJECTED, str(e))
+                logger.warning(f"Файл {file_id} отклонен: {str(e)}")
+                return
+            if cleaned != data:
+                storage.put_stream(BytesIO(cleaned), len(cleaned), media.object_name, media.content_type)
+                media.size = len(cleaned)
+                metrics.increment("media_processing.metadata_bytes_removed", len(data) - len(cleaned))
+
+        _finish(db, media, STATUS_COMPLETED)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке файла {file_id}: {str(e)}")
+        db.rollback()
+        db.execute(
+            update(MediaObject)
+            .where(MediaObject.file_id == file_id)
+            .values(processing_status=STATUS_FAILED, processing_error=str(e), processed_at=datetime.utcnow())
+        )
+        db.commit()
+        metrics.increment(f"media_processing.{STATUS_FAILED}")
+    finally:
+        _active_files.discard(file_id)
+        db.close()
+        metrics.observe("media_processing.run_ms", (time.perf_counter() - started) * 1000)
+
+
+def _worker_loop():
+    """
+    Цикл фонового потока: берет файлы из очереди до получения None
+    """
+    while True:
+        file_id = _file_queue.get()
+        try:
+            if file_id is None:
+                return
+            with _queue_lock:
+                _queued.discard(file_id)
+            # При остановке файлы из очереди не обрабатываются: они остаются в pending
+            if not _stop_event.is_set():
+                process_media(file_id)
+        finally:
+            _file_queue.task_done()
+
+
+def requeue_pending():
+    """
+    Возвращает в очередь файлы, ожидающие обработки, в том числе загруженные
+    до ее появления. Обработка, прерванная остановкой или падением другого
+    процесса, сбрасывается в pending.
+    """
+    db = SessionLocal()
+    try:
+        stale_before = datetime.utcnow() - timedelta(seconds=STALE_PROCESSING_SECONDS)
+        db.execute(
+            update(MediaObject)
+            .where(
+                MediaObject.processing_status == STATUS_PROCESSING,
+                or_(MediaObject.processed_at.is_(None), MediaObject.processed_at < stale_before)
+            )
+            .values(processing_status=STATUS_PENDING)
+        )
+        db.commit()
+        pending_ids = [
+            file_id for (file_id,) in db.query(MediaObject.file_id).filter(
+                MediaObject.processing_status == STATUS_PENDING
+            )
+        ]
+        queued = sum(_enqueue(file_id) for file_id in pending_ids)
+        if queued:
+            logger.info(f"Возвращено в очередь обработки файлов: {queued}")
+    finally:
+        db.close()
+
+
+def _requeue_loop():
+    """
+    Цикл фонового потока: раз в REQUEUE_INTERVAL_SECONDS секунд подбирает
+    файлы, которые не обрабатывает ни один процесс
+    """
+    while not _stop_event.wait(REQUEUE_INTERVAL_SECONDS):
+        try:
+            requeue_pending()
+        except Exception as e:
+            logger.error(f"Не удалось восстановить очередь обработки медиафайлов: {str(e)}")
+
+
+def start_workers():
+    """
+    Запускает фоновые потоки обработки (вызывается при старте приложения)
+    """
+    global _requeuer
+    if _workers:
+        return
+    _stop_event.clear()
+    try:
+        requeue_pending()
+    except Exception as e:
+        logger.error(f"Не удалось восстановить очередь обработки медиафайлов: {str(e)}")
+
+    for i in range(max(MEDIA_PROCESSING_WORKERS, 1)):
+        worker = threading.Thread(target=_worker_loop, name=f"media-processor-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+    _requeuer = threading.Thread(target=_requeue_loop, name="media-processing-requeue", daemon=True)
+    _requeuer.start()
+    logger.info(f"Запущено потоков обработки медиафайлов: {len(_workers)}")
+
+
+def stop_workers():
+    """
+    Останавливает фоновые потоки после завершения текущей обработки. Файлы,
+    обработка которых не успела завершиться, возвращаются в pending, чтобы их
+    обработал другой процесс
+    """
+    global _requeuer
+    _stop_event.set()
+    if _requeuer is not None:
+        _requeuer.join(timeout=5)
+        _requeuer = None
+    for _ in _workers:
+        _file_queue.put(None)
+    for worker in _workers:
+        worker.join(timeout=5)
+    _workers.clear()
+
+    if _active_files:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(MediaObject)
+                .where(MediaObject.file_id.in_(list(_active_files)), MediaObject.processing_status == STATUS_PROCESSING)
+                .values(processing_status=STATUS_PENDING)
+            )
+            db.commit()
+            logger.info(f"Возвращено в очередь обработки файлов при остановке: {len(_active_files)}")
+        except Exception as e:
+            logger.error(f"Не удалось вернуть файлы в очередь обработки: {str(e)}")
+        finally:
+            db.close()
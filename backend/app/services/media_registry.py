@@ -0,0 +1,163 @@
+"""
+Учет медиафайлов, сохраненных под адресом по содержимому, и ссылок на них.
+
+ID загружаемого файла - SHA-256 его содержимого, поэтому одинаковые файлы,
+загруженные для разных животных, хранятся в одном экземпляре. Количество
+ссылок на файл вычисляется запросом по колонкам Animal.preview_id,
+Animal.video_id и AnimalPhoto.photo_id (по ним построены индексы), а не
+хранится счетчиком: ссылки создаются из нескольких мест (создание и
+редактирование животного, фотографии, импорт), и счетчик неизбежно
+расходился бы с данными.
+
+Файл удаляется из хранилища только когда на него не осталось ссылок. Чтобы
+не удалить файл, который только что загрузили повторно, но еще не привязали
+к животному, файлы, загруженные за последние MEDIA_REFERENCE_GRACE_SECONDS
+секунд, не удаляются.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func, select, union_all
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import Animal, AnimalPhoto, MediaObject
+from .storage import get_storage
+from .video_transcoding_service import hls_prefix
+
+logger = logging.getLogger("media_registry")
+
+# Сколько секунд после загрузки файл без ссылок не удаляется
+MEDIA_REFERENCE_GRACE_SECONDS = int(os.getenv("MEDIA_REFERENCE_GRACE_SECONDS", "3600"))
+
+# Категории и расширения файлов, загруженных до появления учета (ID - uuid4)
+LEGACY_CATEGORIES = ["images", "videos"]
+LEGACY_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp", ".mp4", ".avi"]
+
+
+def get_media_object(db: Session, file_id: str) -> Optional[MediaObject]:
+    """
+    Возвращает учтенный медиафайл по ID
+
+    Args:
+        db (Session): Сессия базы данных
+        file_id (str): ID файла (SHA-256 содержимого)
+
+    Returns:
+        Optional[MediaObject]: Медиафайл или None, если файл не учтен
+    """
+    return db.get(MediaObject, file_id)
+
+
+def register_upload(db: Session, file_id: str, object_name: str, size: int, content_type: Optional[str]):
+    """
+    Учитывает загрузку файла. При повторной загрузке того же содержимого
+    обновляет время загрузки, продлевая защиту файла от удаления
+
+    Args:
+        db (Session): Сессия базы данных
+        file_id (str): ID файла (SHA-256 содержимого)
+        object_name (str): Имя объекта в хранилище
+        size (int): Размер файла в байтах
+        content_type (Optional[str]): MIME-тип файла
+    """
+    insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    statement = insert(MediaObject).values(
+        file_id=file_id,
+        object_name=object_name,
+        size=size,
+        content_type=content_type,
+        uploaded_at=datetime.utcnow()
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[MediaObject.file_id],
+        set_={"uploaded_at": statement.excluded.uploaded_at}
+    ))
+    db.commit()
+
+
+def count_references(db: Session, file_ids: Iterable[str]) -> Dict[str, int]:
+    """
+    Подсчитывает ссылки животных и фотографий на файлы одним запросом
+
+    Args:
+        db (Session): Сессия базы данных
+        file_ids (Iterable[str]): ID файлов
+
+    Returns:
+        Dict[str, int]: Количество ссылок для каждого ID (0 для файлов без ссылок)
+    """
+    file_ids = {file_id for file_id in file_ids if file_id}
+    counts = dict.fromkeys(file_ids, 0)
+    if not file_ids:
+        return counts
+
+    references = union_all(
+        select(Animal.preview_id.label("file_id")).where(Animal.preview_id.in_(file_ids)),
+        select(Animal.video_id.label("file_id")).where(Animal.video_id.in_(file_ids)),
+        select(AnimalPhoto.photo_id.label("file_id")).where(AnimalPhoto.photo_id.in_(file_ids)),
+    ).subquery()
+    for file_id, count in db.execute(
+        select(references.c.file_id, func.count()).group_by(references.c.file_id)
+    ):
+        counts[file_id] = count
+    return counts
+
+
+def release_media(db: Session, file_ids: Iterable[str], video_ids: Iterable[str] = ()) -> dict:
+    """
+    Удаляет из хранилища файлы, на которые больше не ссылается ни одно животное.
+    Вызывается после фиксации удаления ссылок.
+
+    Args:
+        db (Session): Сессия базы данных
+        file_ids (Iterable[str]): ID файлов, ссылки на которые были удалены
+        video_ids (Iterable[str], optional): Те из них, что являются видео
+            (вместе с ними удаляются HLS-файлы)
+
+    Returns:
+        dict: Удаленные (released) и оставленные (kept) ID и результат удаления из хранилища
+    """
+    video_ids = set(video_ids)
+    counts = count_references(db, file_ids)
+    candidates = [file_id for file_id, count in counts.items() if count == 0]
+    kept = [file_id for file_id, count in counts.items() if count > 0]
+
+    registered = {}
+    if candidates:
+        registered = {
+            media.file_id: media
+            for media in db.scalars(select(MediaObject).where(MediaObject.file_id.in_(candidates)))
+        }
+
+    storage = get_storage()
+    grace_cutoff = datetime.utcnow() - timedelta(seconds=MEDIA_REFERENCE_GRACE_SECONDS)
+    released = []
+    object_names = []
+    for file_id in candidates:
+        media = registered.get(file_id)
+        if media is not None:
+            if media.uploaded_at > grace_cutoff:
+                kept.append(file_id)
+                continue
+            object_names.append(media.object_name)
+            db.delete(media)
+        else:
+            # Файл загружен до появления учета: перебираем все возможные пути
+            object_names.extend(
+                f"{category}/{file_id}{ext}"
+                for category in LEGACY_CATEGORIES
+                for ext in LEGACY_EXTENSIONS
+            )
+        if file_id in video_ids:
+            object_names.extend(storage.list_names(hls_prefix(file_id)))
+        released.append(file_id)
+
+    result = storage.delete_many(object_names) if object_names else {"deleted": 0, "failed": []}
+    db.commit()
+    if released:
+        logger.info(f"Удалены медиафайлы без ссылок: {released}")
+    return {"released": released, "kept": kept, **result}
@@ -1,24 +1,36 @@
 import io
 import os
-import tempfile
 import shutil
 from pathlib import Path
-from minio import Minio
 from minio.error import S3Error
 
+from .storage_client import StorageClient, is_bucket_exists, is_not_found
+
 # Получаем данные подключения к S3 из переменных окружения
 S3_INTERNAL_ENDPOINT = os.getenv("S3_INTERNAL_ENDPOINT")
 S3_EXTERNAL_ENDPOINT = os.getenv("S3_EXTERNAL_ENDPOINT")
 S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY")
 S3_SECRET_KEY = os.getenv("S3_SECRET_KEY")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
-S3_USE_SSL = os.getenv("S3_USE_SSL").lower()
+S3_USE_SSL = os.getenv("S3_USE_SSL", "true").lower() == "true"
 
 # Константы для хранилища
 BUCKET_NAME = S3_BUCKET_NAME
 
-# Инициализация клиента S3
-minio_client = Minio(
+# Таблица соответствия расширений и MIME-типов
+CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".mp4": "video/mp4",
+    ".avi": "video/x-msvideo",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+
+# Клиент S3 с пулом соединений и повторами временных ошибок (общий для всех потоков)
+minio_client = StorageClient(
     S3_INTERNAL_ENDPOINT,
     access_key=S3_ACCESS_KEY,
     secret_key=S3_SECRET_KEY,
@@ -41,7 +53,7 @@ def ensure_bucket_exists(bucket_name: str):
             minio_client.make_bucket(bucket_name)
             print(f"Создан новый бакет: {bucket_name}")
     except S3Error as e:
-        if "BucketAlreadyOwnedByYou" in str(e) or "BucketAlreadyExists" in str(e):
+        if is_bucket_exists(e):
             print(f"Бакет {bucket_name} уже существует и доступен")
             return
         raise Exception(f"Ошибка при создании/проверке бакета: {e}")
@@ -104,8 +116,7 @@ def get_file(bucket_name: str, file_name: str):
         Exception: При ошибке получения файла
     """
     try:
-        response = minio_client.get_object(bucket_name, file_name)
-        return response.data
+        return minio_client.get_object_data(bucket_name, file_name)
     except S3Error as e:
         raise Exception(f"Ошибка при получении файла из S3: {e}")
 
@@ -133,7 +144,7 @@ def delete_file(bucket_name: str, file_name: str):
         try:
             minio_client.stat_object(bucket_name, file_name)
         except S3Error as e:
-            if "code: NoSuchKey" in str(e) or "Object does not exist" in str(e):
+            if is_not_found(e):
                 print(f"Файл {file_name} не найден в бакете {bucket_name}")
                 return False
             raise
@@ -208,7 +219,7 @@ async def delete_files_by_ids(file_ids: list, bucket_name: str = BUCKET_NAME) ->
                 exists = True
                 print(f"Объект '{object_name}' найден в бакете {bucket_name}")
             except S3Error as se:
-                if "code: NoSuchKey" in str(se) or "Object does not exist" in str(se):
+                if is_not_found(se):
                     exists = False
                     print(f"Объект '{object_name}' не найден в бакете {bucket_name}")
                 else:
@@ -264,32 +275,8 @@ async def upload_file_to_minio(file_path: str, object_name: str, bucket_name: st
         # Проверяем существование бакета или создаем его
         ensure_bucket_exists(bucket_name)
         
-        # Получаем размер файла и тип контента
-        file_size = os.path.getsize(file_path)
-        
-        # Определяем тип контента на основе расширения файла
-        content_type = "application/octet-stream"
-        ext = os.path.splitext(file_path)[1].lower()
-        
-        # Таблица соответствия расширений и MIME-типов
-        content_types = {
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".png": "image/png",
-            ".webp": "image/webp",
-            ".mp4": "video/mp4",
-            ".avi": "video/x-msvideo",
-        }
-        
-        content_type = content_types.get(ext, content_type)
-        
-        # Загружаем файл в S3
-        minio_client.fput_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            file_path=file_path,
-            content_type=content_type,
-        )
+        # Загружаем файл в S3 (тип контента определяется по расширению)
+        put_local_file(file_path, object_name, bucket_name)
         
         return True
     except S3Error as e:
@@ -297,43 +284,102 @@ async def upload_file_to_minio(file_path: str, object_name: str, bucket_name: st
     except Exception as e:
         raise Exception(f"Ошибка при загрузке файла: {str(e)}")
 
-async def get_file_from_minio(object_name: str, bucket_name: str = BUCKET_NAME) -> str:
+def get_content_type(file_name: str) -> str:
     """
-    Получает файл из S3-хранилища и сохраняет во временный файл
+    Определяет MIME-тип файла по его расширению
+    
+    Args:
+        file_name (str): Имя файла или объекта
+        
+    Returns:
+        str: MIME-тип (application/octet-stream для неизвестных расширений)
+    """
+    ext = os.path.splitext(file_name)[1].lower()
+    return CONTENT_TYPES.get(ext, "application/octet-stream")
+
+def put_local_file(file_path: str, object_name: str, bucket_name: str = BUCKET_NAME):
+    """
+    Синхронно загружает локальный файл в S3-хранилище.
+    Используется фоновыми задачами, работающими вне event loop.
+    
+    Args:
+        file_path (str): Путь к локальному файлу
+        object_name (str): Имя объекта в хранилище
+        bucket_name (str, optional): Имя бакета. По умолчанию используется BUCKET_NAME.
+    """
+    minio_client.fput_object(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        file_path=file_path,
+        content_type=get_content_type(file_path),
+    )
+
+def put_stream(data, length: int, object_name: str, bucket_name: str = BUCKET_NAME):
+    """
+    Синхронно загружает в S3-хранилище данные из потока известной длины,
+    не читая их целиком в память
+    
+    Args:
+        data: Файловый объект, открытый на чтение
+        length (int): Размер данных в байтах
+        object_name (str): Имя объекта в хранилище
+        bucket_name (str, optional): Имя бакета. По умолчанию используется BUCKET_NAME.
+    """
+    minio_client.put_object(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        data=data,
+        length=length,
+        content_type=get_content_type(object_name),
+    )
+
+def download_to_file(object_name: str, file_path: str, bucket_name: str = BUCKET_NAME):
+    """
+    Синхронно скачивает объект из S3-хранилища в указанный локальный файл
+    
+    Args:
+        object_name (str): Имя объекта в хранилище
+        file_path (str): Путь, по которому будет сохранен файл
+        bucket_name (str, optional): Имя бакета. По умолчанию используется BUCKET_NAME.
+    """
+    minio_client.fget_object(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        file_path=file_path
+    )
+
+def object_exists(object_name: str, bucket_name: str = BUCKET_NAME) -> bool:
+    """
+    Проверяет существование объекта в S3-хранилище без его скачивания
     
     Args:
         object_name (str): Имя объекта в хранилище
         bucket_name (str, optional): Имя бакета. По умолчанию используется BUCKET_NAME.
         
     Returns:
-        str: Путь к временному файлу
-        
-    Raises:
-        Exception: При ошибке получения файла
+        bool: True, если объект существует
     """
     try:
-        # Создаем временный файл
-        file_extension = os.path.splitext(object_name)[1]
-        temp_file = tempfile.NamedTemporaryFile(suffix=file_extension, delete=False)
-        temp_file_path = temp_file.name
-        temp_file.close()
-        
-        # Скачиваем файл из S3
-        minio_client.fget_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            file_path=temp_file_path
-        )
+        minio_client.stat_object(bucket_name, object_name)
+        return True
+    except S3Error as e:
+        if is_not_found(e):
+            return False
+        raise
+
+def list_object_names(prefix: str, bucket_name: str = BUCKET_NAME) -> list:
+    """
+    Возвращает имена всех объектов с указанным префиксом
+    
+    Args:
+        prefix (str): Префикс объектов (например, 'videos/<id>/')
+        bucket_name (str, optional): Имя бакета. По умолчанию используется BUCKET_NAME.
         
-        return temp_file_path
+    Returns:
+        list: Список имен объектов
+    """
+    try:
+        return minio_client.list_object_names(bucket_name, prefix)
     except S3Error as e:
-        # Если файл не найден, мы возвращаем None вместо исключения
-        if "code: NoSuchKey" in str(e):
-            return None
-        # Для других ошибок вызываем исключение
-        raise Exception(f"Ошибка при получении файла из S3: {e}")
-    except Exception as e:
-        # Удаляем временный файл в случае ошибки
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-        raise Exception(f"Ошибка при получении файла: {str(e)}")
\ No newline at end of file
+        print(f"Ошибка при получении списка объектов с префиксом {prefix}: {str(e)}")
+        return []
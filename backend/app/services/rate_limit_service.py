@@ -0,0 +1,297 @@
+"""
+Ограничение частоты запросов к эндпоинтам авторизации и верификации.
+
+Используется алгоритм корзины токенов: корзина вмещает capacity токенов и
+пополняется равномерно за period секунд, каждый запрос списывает один токен.
+Корзины ведутся отдельно по IP-адресу клиента и по email/логину из тела
+запроса, поэтому перебор паролей одного аккаунта с разных адресов и рассылка
+писем на разные адреса с одного IP ограничиваются независимо.
+
+Ограничение подключается к маршруту зависимостью rate_limit(...), которая
+выполняется до обработчика и отвечает 429 до хэширования паролей и отправки
+писем.
+
+Хранилище корзин (RATE_LIMIT_BACKEND):
+    memory   - в памяти процесса (лимиты действуют на каждый воркер отдельно);
+    database - таблица rate_limit_buckets, общая для всех воркеров;
+    auto     - database для PostgreSQL, иначе memory (по умолчанию).
+"""
+import hashlib
+import ipaddress
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import case, delete, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from starlette.concurrency import run_in_threadpool
+
+from .. import metrics
+from ..database import engine
+from ..models import RateLimitBucket
+
+logger = logging.getLogger("rate_limit_service")
+
+# Включено ли ограничение частоты запросов
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# Хранилище корзин: auto, memory или database
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "auto").lower()
+
+# Адреса прокси, которым разрешено передавать IP клиента в заголовке X-Real-IP
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv(
+    "RATE_LIMIT_TRUSTED_PROXIES",
+    "127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,::1/128"
+)
+
+# Максимальное количество корзин в памяти процесса
+MEMORY_MAX_BUCKETS = 100_000
+
+# Корзины, не использовавшиеся дольше этого времени, удаляются из таблицы
+DATABASE_BUCKET_TTL_SECONDS = 24 * 3600
+
+# Раз во сколько списаний удаляются устаревшие корзины из таблицы
+DATABASE_PRUNE_EVERY = 1000
+
+
+class RateLimit(NamedTuple):
+    """
+    Параметры корзины токенов
+
+    Attributes:
+        capacity (int): Максимальное количество запросов подряд
+        period (float): За сколько секунд корзина пополняется полностью
+    """
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+# Лимиты маршрутов: (по IP, по email/логину)
+LOGIN_LIMITS = (RateLimit(20, 60), RateLimit(10, 300))
+REGISTER_LIMITS = (RateLimit(10, 3600), RateLimit(3, 3600))
+EMAIL_VERIFICATION_LIMITS = (RateLimit(10, 3600), RateLimit(3, 900))
+EMAIL_CONFIRM_LIMITS = (RateLimit(30, 3600), RateLimit(10, 900))
+PASSWORD_RESET_LIMITS = (RateLimit(10, 3600), RateLimit(3, 900))
+
+
+class MemoryRateLimitBackend:
+    """
+    Корзины токенов в памяти процесса
+    """
+
+    blocking = False
+
+    def __init__(self, max_buckets: int = MEMORY_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: RateLimit, now: Optional[float] = None) -> float:
+        """
+        Списывает токен из корзины
+
+        Args:
+            key (str): Ключ корзины
+            limit (RateLimit): Параметры корзины
+            now (float, optional): Текущее время (секунды Unix)
+
+        Returns:
+            float: 0, если токен списан, иначе через сколько секунд появится следующий
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (float(limit.capacity), now))
+            tokens = min(float(limit.capacity), tokens + (now - updated_at) * limit.rate)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / limit.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class DatabaseRateLimitBackend:
+    """
+    Корзины токенов в таблице rate_limit_buckets, общие для всех воркеров.
+    Пополнение и списание выполняются одним атомарным INSERT ... ON CONFLICT
+    """
+
+    blocking = True
+
+    def __init__(self, bind):
+        self.bind = bind
+        self._insert = postgresql_insert if bind.dialect.name == "postgresql" else sqlite_insert
+        self._hits = 0
+
+    def hit(self, key: str, limit: RateLimit, now: Optional[float] = None) -> float:
+        """
+        Списывает токен из корзины
+
+        Args:
+            key (str): Ключ корзины
+            limit (RateLimit): Параметры корзины
+            now (float, optional): Текущее время (секунды Unix)
+
+        Returns:
+            float: 0, если токен списан, иначе через сколько секунд появится следующий
+        """
+        now = time.time() if now is None else now
+        table = RateLimitBucket.__table__
+        refilled = table.c.tokens + (now - table.c.updated_at) * limit.rate
+        available = case((refilled > limit.capacity, float(limit.capacity)), else_=refilled)
+
+        statement = self._insert(table).values(key=key, tokens=limit.capacity - 1, updated_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"tokens": available - 1, "updated_at": now},
+            where=available >= 1
+        ).returning(table.c.tokens)
+
+        with self.bind.begin() as connection:
+            if connection.execute(statement).first() is not None:
+                retry_after = 0.0
+            else:
+                tokens, updated_at = connection.execute(
+                    select(table.c.tokens, table.c.updated_at).where(table.c.key == key)
+                ).one()
+                tokens = min(float(limit.capacity), tokens + (now - updated_at) * limit.rate)
+                retry_after = max((1 - tokens) / limit.rate, 0.0)
+
+            self._hits += 1
+            if self._hits % DATABASE_PRUNE_EVERY == 0:
+                connection.execute(delete(table).where(table.c.updated_at < now - DATABASE_BUCKET_TTL_SECONDS))
+        return retry_after
+
+
+def _create_backend():
+    backend = RATE_LIMIT_BACKEND
+    if backend == "auto":
+        backend = "database" if engine.dialect.name == "postgresql" else "memory"
+    if backend == "database":
+        return DatabaseRateLimitBackend(engine)
+    return MemoryRateLimitBackend()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Возвращает хранилище корзин, выбранное RATE_LIMIT_BACKEND
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+def _parse_networks(value: str):
+    networks = []
+    for item in value.split(","):
+        item = item.strip()
+        if item:
+            networks.append(ipaddress.ip_network(item, strict=False))
+    return networks
+
+
+_trusted_proxies = _parse_networks(RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    """
+    Определяет IP-адрес клиента. Заголовок X-Real-IP учитывается, только если
+    запрос пришел от доверенного прокси (nginx фронтенда)
+
+    Args:
+        request (Request): HTTP-запрос
+
+    Returns:
+        str: IP-адрес клиента
+    """
+    peer = request.client.host if request.client else "unknown"
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip:
+        try:
+            address = ipaddress.ip_address(peer)
+        except ValueError:
+            return peer
+        if any(address in network for network in _trusted_proxies):
+            return real_ip.strip()
+    return peer
+
+
+def _identity_key(value: str) -> str:
+    # Email и логины не хранятся в таблице корзин в открытом виде
+    return hashlib.sha256(value.strip().lower().encode("utf-8")).hexdigest()[:32]
+
+
+def rate_limit(scope: str, ip_limit: RateLimit, identity_limit: Optional[RateLimit] = None, identity_field: Optional[str] = None):
+    """
+    Создает зависимость, ограничивающую частоту запросов к маршруту
+
+    Args:
+        scope (str): Имя области ограничения (например, 'login')
+        ip_limit (RateLimit): Лимит по IP-адресу клиента
+        identity_limit (RateLimit, optional): Лимит по значению поля тела запроса
+        identity_field (str, optional): Поле JSON-тела с email или логином
+
+    Returns:
+        Callable: Зависимость FastAPI
+
+    Raises:
+        HTTPException: 429, если лимит исчерпан (с заголовком Retry-After)
+    """
+    async def dependency(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+
+        buckets = [(f"{scope}:ip:{client_ip(request)}", ip_limit)]
+        if identity_field and identity_limit is not None:
+            try:
+                # Тело уже прочитано FastAPI и закэшировано в запросе
+                body = await request.json()
+            except ValueError:
+                body = None
+            identity = body.get(identity_field) if isinstance(body, dict) else None
+            if isinstance(identity, str) and identity.strip():
+                buckets.append((f"{scope}:id:{_identity_key(identity)}", identity_limit))
+
+        backend = get_backend()
+        for key, limit in buckets:
+            try:
+                if backend.blocking:
+                    retry_after = await run_in_threadpool(backend.hit, key, limit)
+                else:
+                    retry_after = backend.hit(key, limit)
+            except Exception as e:
+                # Сбой хранилища корзин не должен блокировать вход
+                metrics.increment("rate_limit.errors")
+                logger.error(f"Ошибка ограничителя частоты запросов ({scope}): {str(e)}")
+                return
+            if retry_after > 0:
+                metrics.increment(f"rate_limit.{scope}.rejected")
+                logger.warning(f"Превышен лимит запросов ({key.split(':')[1]}) для {scope}")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Слишком много запросов. Пожалуйста, попробуйте позже.",
+                    headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+                )
+        metrics.increment(f"rate_limit.{scope}.allowed")
+
+    return dependency
@@ -0,0 +1,64 @@
+"""
+Учет версий (ревизий) животных и тестов для условных GET-запросов.
+
+Функции не фиксируют транзакцию: изменения версии применяются вместе
+с основными изменениями при commit вызывающего кода.
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..models import Animal, Test, TestQuestion
+
+
+def touch_animals(db: Session, *criteria) -> None:
+    """
+    Увеличивает версию животных, удовлетворяющих условиям
+
+    Args:
+        db (Session): Сессия базы данных
+        *criteria: Условия отбора животных (например, Animal.id == 1)
+    """
+    db.execute(
+        update(Animal)
+        .where(*criteria)
+        .values(revision=Animal.revision + 1, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def touch_tests(db: Session, test_ids: Iterable[int]) -> None:
+    """
+    Увеличивает версию тестов с указанными ID
+
+    Args:
+        db (Session): Сессия базы данных
+        test_ids (Iterable[int]): ID тестов
+    """
+    test_ids = list(set(test_ids))
+    if not test_ids:
+        return
+    db.execute(
+        update(Test)
+        .where(Test.id.in_(test_ids))
+        .values(revision=Test.revision + 1, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def touch_tests_with_question(db: Session, question_id: int) -> None:
+    """
+    Увеличивает версию всех тестов, в которые входит вопрос
+
+    Args:
+        db (Session): Сессия базы данных
+        question_id (int): ID вопроса
+    """
+    test_ids = [
+        test_id for (test_id,) in db.query(TestQuestion.test_id).filter(
+            TestQuestion.question_id == question_id
+        )
+    ]
+    touch_tests(db, test_ids)
@@ -0,0 +1,354 @@
+"""
+Временное дисковое пространство для загрузок, импорта и перекодирования.
+
+Каждый процесс работает в своем подкаталоге SCRATCH_DIR/<pid>, поэтому
+файлы воркера, завершившегося посреди загрузки, легко найти и удалить.
+Временные файлы и каталоги выдаются контекстными менеджерами и удаляются
+при выходе из них. Уборщик (при старте и раз в SCRATCH_SWEEP_INTERVAL_SECONDS
+секунд) удаляет подкаталоги завершившихся процессов и записи, которые не
+используются и не изменялись дольше SCRATCH_MAX_AGE_SECONDS.
+
+Запись через write_stream учитывается в квоте SCRATCH_QUOTA_BYTES: при ее
+превышении запись прерывается исключением ScratchQuotaExceeded. Учтенный
+объем запоминается для выданного файла или каталога, в котором идет запись,
+и при удалении освобождается ровно он. Файлы, записанные в обход
+write_stream (например, результат ffmpeg), учитываются при уборке: занятое
+место пересчитывается по диску.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from .. import metrics
+
+logger = logging.getLogger("scratch_space")
+
+# Корневой каталог временных файлов
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "zooracle_scratch"))
+
+# Максимальный объем временных файлов всех процессов в байтах
+SCRATCH_QUOTA_BYTES = int(os.getenv("SCRATCH_QUOTA_BYTES", str(8 * 1024 * 1024 * 1024)))
+
+# Через сколько секунд без изменений неиспользуемая запись считается брошенной
+SCRATCH_MAX_AGE_SECONDS = int(os.getenv("SCRATCH_MAX_AGE_SECONDS", str(6 * 3600)))
+
+# Период уборки в секундах
+SCRATCH_SWEEP_INTERVAL_SECONDS = int(os.getenv("SCRATCH_SWEEP_INTERVAL_SECONDS", "300"))
+
+# Размер блока при записи потока на диск
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+
+class ScratchQuotaExceeded(Exception):
+    """
+    Превышена квота временного дискового пространства
+    """
+
+
+def _disk_usage(path: str) -> int:
+    """
+    Размер файла или суммарный размер файлов каталога в байтах
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for current, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.path.getsize(os.path.join(current, file_name))
+            except OSError:
+                pass
+    return total
+
+
+def _last_modified(path: str) -> float:
+    """
+    Время последнего изменения файла или самого свежего файла в каталоге
+    """
+    latest = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for current, _, files in os.walk(path):
+            for file_name in files:
+                try:
+                    latest = max(latest, os.path.getmtime(os.path.join(current, file_name)))
+                except OSError:
+                    pass
+    return latest
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.unlink(path)
+
+
+class ScratchSpace:
+    """
+    Временное дисковое пространство с квотой и уборкой
+
+    Args:
+        root (str): Корневой каталог
+        quota_bytes (int): Максимальный объем временных файлов в байтах
+        max_age_seconds (int): Возраст, после которого неиспользуемая запись удаляется уборщиком
+    """
+
+    def __init__(self, root: str, quota_bytes: int, max_age_seconds: int):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.max_age_seconds = max_age_seconds
+        self._usage = 0
+        # Выданные файлы и каталоги -> учтенный в квоте объем
+        self._active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def process_dir(self) -> str:
+        """
+        Подкаталог текущего процесса
+        """
+        path = os.path.join(self.root, str(os.getpid()))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _owner(self, path: Optional[str]) -> Optional[str]:
+        """
+        Выданный файл или каталог, к которому относится путь. Вызывается под блокировкой
+        """
+        while path:
+            if path in self._active:
+                return path
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return None
+
+    def charge(self, size: int, path: Optional[str] = None):
+        """
+        Учитывает запись size байт во временные файлы
+
+        Args:
+            size (int): Количество байт
+            path (Optional[str]): Путь, в который идет запись; учтенный объем
+                освобождается при удалении выданного файла или каталога с этим путем
+
+        Raises:
+            ScratchQuotaExceeded: Если запись превысит квоту
+        """
+        with self._lock:
+            if self._usage + size > self.quota_bytes:
+                metrics.increment("scratch.quota_rejections")
+                raise ScratchQuotaExceeded(
+                    f"Недостаточно временного дискового пространства (квота {self.quota_bytes} байт)"
+                )
+            self._usage += size
+            owner = self._owner(path)
+            if owner is not None:
+                self._active[owner] += size
+            metrics.set_gauge("scratch.bytes", self._usage)
+
+    def _register(self, path: str):
+        with self._lock:
+            self._active.setdefault(path, 0)
+
+    def release(self, path: str):
+        """
+        Удаляет временный файл или каталог и освобождает учтенное для него место в квоте
+        """
+        try:
+            _remove(path)
+        except OSError as e:
+            logger.warning(f"Не удалось удалить временный путь {path}: {str(e)}")
+        with self._lock:
+            charged = self._active.pop(path, 0)
+            self._usage = max(self._usage - charged, 0)
+            metrics.set_gauge("scratch.bytes", self._usage)
+
+    @contextmanager
+    def file(self, suffix: str = "", prefix: str = "") -> Iterator[str]:
+        """
+        Выдает путь к новому временному файлу и удаляет файл при выходе из контекста
+
+        Args:
+            suffix (str, optional): Окончание имени (например, расширение файла)
+            prefix (str, optional): Начало имени
+
+        Yields:
+            str: Путь к файлу (сам файл не создается)
+        """
+        path = os.path.join(self.process_dir, f"{prefix}{uuid.uuid4().hex}{suffix}")
+        self._register(path)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def mkdtemp(self, prefix: str = "") -> str:
+        """
+        Создает временный каталог. Каталог должен быть удален вызовом release
+
+        Returns:
+            str: Путь к каталогу
+        """
+        path = tempfile.mkdtemp(prefix=prefix, dir=self.process_dir)
+        self._register(path)
+        return path
+
+    @contextmanager
+    def directory(self, prefix: str = "") -> Iterator[str]:
+        """
+        Создает временный каталог и удаляет его со всем содержимым при выходе из контекста
+
+        Yields:
+            str: Путь к каталогу
+        """
+        path = self.mkdtemp(prefix)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def write_stream(self, source, path: str, on_chunk: Optional[Callable[[bytes], None]] = None) -> int:
+        """
+        Записывает поток в файл частями, учитывая каждую часть в квоте
+
+        Args:
+            source: Файловый объект, открытый на чтение
+            path (str): Путь к файлу
+            on_chunk (Callable, optional): Вызывается для каждой записанной части (например, для хэширования)
+
+        Returns:
+            int: Количество записанных байт
+
+        Raises:
+            ScratchQuotaExceeded: Если запись превысит квоту
+        """
+        size = 0
+        with open(path, "wb") as target:
+            while True:
+                chunk = source.read(WRITE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.charge(len(chunk), path)
+                target.write(chunk)
+                size += len(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+        return size
+
+    def sweep(self) -> dict:
+        """
+        Удаляет подкаталоги завершившихся процессов и давно не изменявшиеся
+        неиспользуемые записи, затем пересчитывает занятое место
+
+        Returns:
+            dict: Количество и объем удаленных записей, занятое после уборки место
+        """
+        removed = 0
+        removed_bytes = 0
+        stale_before = time.time() - self.max_age_seconds
+        own_dir = str(os.getpid())
+        os.makedirs(self.root, exist_ok=True)
+
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if not os.path.isdir(path) or not name.isdigit():
+                    # Посторонние файлы в корне удаляем только по возрасту
+                    candidates = [path] if _last_modified(path) < stale_before else []
+                elif name != own_dir and not _process_alive(int(name)):
+                    candidates = [path]
+                else:
+                    with self._lock:
+                        active = set(self._active) if name == own_dir else set()
+                    candidates = [
+                        entry_path
+                        for entry_path in (os.path.join(path, entry) for entry in os.listdir(path))
+                        if entry_path not in active and _last_modified(entry_path) < stale_before
+                    ]
+                for candidate in candidates:
+                    size = _disk_usage(candidate)
+                    _remove(candidate)
+                    removed += 1
+                    removed_bytes += size
+            except OSError as e:
+                logger.warning(f"Ошибка при уборке временного каталога {path}: {str(e)}")
+
+        # Место, занятое выданными записями в обход write_stream, тоже учитываем за ними,
+        # чтобы при их удалении оно освободилось
+        with self._lock:
+            active = list(self._active)
+        sizes = {path: _disk_usage(path) for path in active if os.path.exists(path)}
+        usage = _disk_usage(self.root)
+        with self._lock:
+            self._usage = usage
+            for path, size in sizes.items():
+                if path in self._active:
+                    self._active[path] = max(self._active[path], size)
+        metrics.increment("scratch.swept_entries", removed)
+        metrics.increment("scratch.swept_bytes", removed_bytes)
+        metrics.set_gauge("scratch.bytes", usage)
+        if removed:
+            logger.info(f"Удалено брошенных временных файлов и каталогов: {removed} ({removed_bytes} байт)")
+        return {"removed": removed, "removed_bytes": removed_bytes, "usage_bytes": usage}
+
+
+scratch_space = ScratchSpace(SCRATCH_DIR, SCRATCH_QUOTA_BYTES, SCRATCH_MAX_AGE_SECONDS)
+
+_stop_event = threading.Event()
+_janitor: Optional[threading.Thread] = None
+
+
+def _janitor_loop():
+    """
+    Цикл фонового потока уборки
+    """
+    while not _stop_event.wait(SCRATCH_SWEEP_INTERVAL_SECONDS):
+        try:
+            scratch_space.sweep()
+        except Exception as e:
+            logger.error(f"Ошибка уборки временных файлов: {str(e)}")
+
+
+def start_janitor():
+    """
+    Выполняет уборку и запускает ее периодическое повторение (вызывается при старте приложения)
+    """
+    global _janitor
+    if _janitor is not None:
+        return
+    try:
+        scratch_space.sweep()
+    except Exception as e:
+        logger.error(f"Ошибка уборки временных файлов: {str(e)}")
+    _stop_event.clear()
+    _janitor = threading.Thread(target=_janitor_loop, name="scratch-janitor", daemon=True)
+    _janitor.start()
+
+
+def stop_janitor():
+    """
+    Останавливает периодическую уборку
+    """
+    global _janitor
+    _stop_event.set()
+    if _janitor is not None:
+        _janitor.join(timeout=5)
+        _janitor = None
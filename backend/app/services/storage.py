@@ -0,0 +1,471 @@
+"""
+Хранилище медиафайлов с единым интерфейсом для S3 (MinIO) и локального диска.
+
+Реализация выбирается переменной окружения STORAGE_BACKEND:
+- s3 (по умолчанию) - объекты хранятся в бакете MinIO (см. minio_service);
+- local - объекты хранятся в каталоге LOCAL_STORAGE_ROOT. Используется для
+  развертывания на одном сервере и для нагрузочных тестов без S3.
+
+Имена объектов одинаковы для обеих реализаций (например, 'images/<id>.jpg').
+Все методы синхронные и рассчитаны на вызов из пула потоков.
+"""
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple, Optional
+
+from minio import Minio
+
+from . import minio_service
+from .minio_service import get_content_type
+from .storage_client import is_not_found
+
+# Реализация хранилища: 's3' или 'local'
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3").lower()
+
+# Каталог объектов локального хранилища
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", "data/storage")
+
+# Адрес, по которому приложение отдает объекты локального хранилища по подписанным ссылкам
+LOCAL_STORAGE_PUBLIC_URL = os.getenv("LOCAL_STORAGE_PUBLIC_URL", "/api/media/objects")
+
+# Размер блока при потоковом чтении объектов
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+def iter_file(path: str, offset: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Читает файл или его диапазон частями по STREAM_CHUNK_SIZE байт
+
+    Args:
+        path (str): Путь к файлу
+        offset (int, optional): Смещение начала диапазона в байтах
+        length (Optional[int]): Длина диапазона; None - до конца файла
+
+    Yields:
+        bytes: Очередная часть содержимого
+    """
+    yield from iter_open_file(open(path, "rb"), offset, length)
+
+
+def iter_open_file(source: BinaryIO, offset: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Читает уже открытый файл или его диапазон частями по STREAM_CHUNK_SIZE байт
+    и закрывает его. Открытый файл можно дочитать, даже если его удалили из каталога
+
+    Args:
+        source (BinaryIO): Файл, открытый на чтение в двоичном режиме
+        offset (int, optional): Смещение начала диапазона в байтах
+        length (Optional[int]): Длина диапазона; None - до конца файла
+
+    Yields:
+        bytes: Очередная часть содержимого
+    """
+    with source:
+        source.seek(offset)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = source.read(STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class ObjectInfo(NamedTuple):
+    """
+    Сведения об объекте хранилища
+    """
+    name: str
+    size: int
+    content_type: str
+    etag: str
+    last_modified: Optional[datetime]
+
+
+class StorageBackend:
+    """
+    Интерфейс хранилища объектов
+    """
+
+    name = ""
+
+    def ensure_ready(self):
+        """
+        Подготавливает хранилище к записи (создает бакет или каталог)
+        """
+        raise NotImplementedError
+
+    def put_file(self, file_path: str, object_name: str, content_type: Optional[str] = None):
+        """
+        Сохраняет локальный файл как объект
+        """
+        raise NotImplementedError
+
+    def put_stream(self, data, length: int, object_name: str, content_type: Optional[str] = None):
+        """
+        Сохраняет данные из потока известной длины, не читая их целиком в память
+        """
+        raise NotImplementedError
+
+    def open_stream(self, object_name: str, offset: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Читает объект или его диапазон частями
+
+        Args:
+            object_name (str): Имя объекта
+            offset (int, optional): Смещение начала диапазона в байтах
+            length (Optional[int]): Длина диапазона; None - до конца объекта
+
+        Yields:
+            bytes: Очередная часть содержимого
+        """
+        raise NotImplementedError
+
+    def read_bytes(self, object_name: str) -> bytes:
+        """
+        Возвращает содержимое объекта целиком (для небольших объектов)
+        """
+        return b"".join(self.open_stream(object_name))
+
+    def download_to_file(self, object_name: str, file_path: str):
+        """
+        Сохраняет объект в локальный файл
+        """
+        raise NotImplementedError
+
+    def stat(self, object_name: str) -> Optional[ObjectInfo]:
+        """
+        Возвращает сведения об объекте или None, если объекта нет
+        """
+        raise NotImplementedError
+
+    def exists(self, object_name: str) -> bool:
+        return self.stat(object_name) is not None
+
+    def list_names(self, prefix: str) -> List[str]:
+        """
+        Возвращает имена всех объектов с префиксом
+        """
+        raise NotImplementedError
+
+    def iter_objects(self, prefix: str = "") -> Iterator[ObjectInfo]:
+        """
+        Перебирает все объекты с префиксом, не загружая весь список в память
+        """
+        raise NotImplementedError
+
+    def delete_many(self, object_names: Iterable[str]) -> dict:
+        """
+        Удаляет объекты. Отсутствующие объекты ошибкой не считаются
+
+        Returns:
+            dict: Количество обработанных имен (deleted) и имена, удалить которые не удалось (failed)
+        """
+        raise NotImplementedError
+
+    def presign_get(self, object_name: str, expires: timedelta = timedelta(hours=1)) -> str:
+        """
+        Возвращает ссылку на скачивание объекта, действующую ограниченное время
+        """
+        raise NotImplementedError
+
+    def local_path(self, object_name: str) -> Optional[str]:
+        """
+        Путь к файлу объекта на диске, если хранилище локальное. Такой файл
+        можно отдавать клиенту напрямую, без промежуточного копирования
+        """
+        return None
+
+
+class MinioStorage(StorageBackend):
+    """
+    Хранилище в бакете MinIO
+    """
+
+    name = "s3"
+
+    def __init__(self):
+        self._client = minio_service.minio_client
+        self.bucket_name = minio_service.BUCKET_NAME
+        self._presign_client = None
+        self._lock = threading.Lock()
+
+    def ensure_ready(self):
+        minio_service.ensure_bucket_exists(self.bucket_name)
+
+    def put_file(self, file_path: str, object_name: str, content_type: Optional[str] = None):
+        self._client.fput_object(
+            bucket_name=self.bucket_name,
+            object_name=object_name,
+            file_path=file_path,
+            content_type=content_type or get_content_type(object_name),
+        )
+
+    def put_stream(self, data, length: int, object_name: str, content_type: Optional[str] = None):
+        self._client.put_object(
+            bucket_name=self.bucket_name,
+            object_name=object_name,
+            data=data,
+            length=length,
+            content_type=content_type or get_content_type(object_name),
+        )
+
+    def open_stream(self, object_name: str, offset: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+        response = self._client.get_object_stream(self.bucket_name, object_name, offset, length or 0)
+        try:
+            yield from response.stream(STREAM_CHUNK_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def read_bytes(self, object_name: str) -> bytes:
+        return self._client.get_object_data(self.bucket_name, object_name)
+
+    def download_to_file(self, object_name: str, file_path: str):
+        self._client.fget_object(
+            bucket_name=self.bucket_name,
+            object_name=object_name,
+            file_path=file_path
+        )
+
+    def stat(self, object_name: str) -> Optional[ObjectInfo]:
+        try:
+            stat = self._client.stat_object(self.bucket_name, object_name)
+        except Exception as e:
+            if is_not_found(e):
+                return None
+            raise
+        return ObjectInfo(
+            name=object_name,
+            size=stat.size,
+            content_type=stat.content_type or get_content_type(object_name),
+            etag=stat.etag,
+            last_modified=stat.last_modified,
+        )
+
+    def list_names(self, prefix: str) -> List[str]:
+        return self._client.list_object_names(self.bucket_name, prefix)
+
+    def iter_objects(self, prefix: str = "") -> Iterator[ObjectInfo]:
+        for obj in self._client.iter_objects(self.bucket_name, prefix):
+            yield ObjectInfo(
+                name=obj.object_name,
+                size=obj.size,
+                content_type=get_content_type(obj.object_name),
+                etag=obj.etag,
+                last_modified=obj.last_modified,
+            )
+
+    def delete_many(self, object_names: Iterable[str]) -> dict:
+        object_names = list(dict.fromkeys(name for name in object_names if name))
+        if not object_names:
+            return {"deleted": 0, "failed": []}
+        errors = self._client.remove_objects(self.bucket_name, object_names)
+        failed = [error.name for error in errors]
+        return {"deleted": len(object_names) - len(failed), "failed": failed}
+
+    def _presigner(self):
+        """
+        Клиент для подписи ссылок на внешний адрес хранилища. Регион указан
+        явно, поэтому подпись вычисляется без обращения к серверу
+        """
+        if self._presign_client is None:
+            with self._lock:
+                if self._presign_client is None:
+                    self._presign_client = Minio(
+                        minio_service.S3_EXTERNAL_ENDPOINT,
+                        access_key=minio_service.S3_ACCESS_KEY,
+                        secret_key=minio_service.S3_SECRET_KEY,
+                        secure=True,
+                        region=os.getenv("S3_REGION", "us-east-1"),
+                    )
+        return self._presign_client
+
+    def presign_get(self, object_name: str, expires: timedelta = timedelta(hours=1)) -> str:
+        return self._presigner().presigned_get_object(self.bucket_name, object_name, expires=expires)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Хранилище в каталоге локальной файловой системы
+
+    Args:
+        root (str): Корневой каталог объектов
+        signing_key (str): Ключ подписи ссылок на скачивание
+        public_url (str): Адрес, по которому приложение отдает объекты по подписанным ссылкам
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, signing_key: str, public_url: str = LOCAL_STORAGE_PUBLIC_URL):
+        self.root = os.path.abspath(root)
+        self.signing_key = signing_key.encode("utf-8")
+        self.public_url = public_url.rstrip("/")
+
+    def _path(self, object_name: str) -> str:
+        """
+        Путь к файлу объекта. Имена, выходящие за пределы корневого каталога, отклоняются
+        """
+        parts = object_name.split("/")
+        if not object_name or object_name.startswith("/") or any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Недопустимое имя объекта: {object_name}")
+        return os.path.join(self.root, *parts)
+
+    def _write_atomically(self, object_name: str, write):
+        """
+        Записывает объект во временный файл рядом с целевым и переименовывает его,
+        чтобы читатели никогда не видели частично записанный объект
+        """
+        path = self._path(object_name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                write(target)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def ensure_ready(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def put_file(self, file_path: str, object_name: str, content_type: Optional[str] = None):
+        def write(target):
+            with open(file_path, "rb") as source:
+                # copyfileobj между файлами на Linux копирует данные через sendfile в ядре
+                shutil.copyfileobj(source, target, STREAM_CHUNK_SIZE)
+
+        self._write_atomically(object_name, write)
+
+    def put_stream(self, data, length: int, object_name: str, content_type: Optional[str] = None):
+        def write(target):
+            remaining = length
+            while remaining > 0:
+                chunk = data.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError(f"Поток данных для {object_name} короче заявленной длины {length}")
+                target.write(chunk)
+                remaining -= len(chunk)
+
+        self._write_atomically(object_name, write)
+
+    def open_stream(self, object_name: str, offset: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+        return iter_file(self._path(object_name), offset, length)
+
+    def read_bytes(self, object_name: str) -> bytes:
+        with open(self._path(object_name), "rb") as source:
+            return source.read()
+
+    def download_to_file(self, object_name: str, file_path: str):
+        shutil.copyfile(self._path(object_name), file_path)
+
+    def stat(self, object_name: str) -> Optional[ObjectInfo]:
+        try:
+            stat = os.stat(self._path(object_name))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return ObjectInfo(
+            name=object_name,
+            size=stat.st_size,
+            content_type=get_content_type(object_name),
+            etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            last_modified=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        )
+
+    def _iter_names(self, prefix: str) -> Iterator[str]:
+        # Обходим только каталог, в котором могут находиться объекты с этим префиксом
+        directory = os.path.join(self.root, *prefix.split("/")[:-1])
+        for current, _, files in os.walk(directory):
+            relative = os.path.relpath(current, self.root).replace(os.sep, "/")
+            for file_name in files:
+                if file_name.startswith(".upload-"):
+                    continue
+                name = file_name if relative == "." else f"{relative}/{file_name}"
+                if name.startswith(prefix):
+                    yield name
+
+    def list_names(self, prefix: str) -> List[str]:
+        return sorted(self._iter_names(prefix))
+
+    def iter_objects(self, prefix: str = "") -> Iterator[ObjectInfo]:
+        for name in self._iter_names(prefix):
+            info = self.stat(name)
+            if info is not None:
+                yield info
+
+    def delete_many(self, object_names: Iterable[str]) -> dict:
+        deleted = 0
+        failed = []
+        for object_name in dict.fromkeys(name for name in object_names if name):
+            try:
+                os.unlink(self._path(object_name))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError):
+                failed.append(object_name)
+                continue
+            deleted += 1
+        return {"deleted": deleted, "failed": failed}
+
+    def _signature(self, object_name: str, expires_at: int) -> str:
+        message = f"{object_name}:{expires_at}".encode("utf-8")
+        return hmac.new(self.signing_key, message, hashlib.sha256).hexdigest()
+
+    def presign_get(self, object_name: str, expires: timedelta = timedelta(hours=1)) -> str:
+        expires_at = int(time.time() + expires.total_seconds())
+        query = urllib.parse.urlencode({
+            "expires": expires_at,
+            "signature": self._signature(object_name, expires_at),
+        })
+        return f"{self.public_url}/{urllib.parse.quote(object_name)}?{query}"
+
+    def verify_signature(self, object_name: str, expires_at: int, signature: str) -> bool:
+        """
+        Проверяет подписанную ссылку, выданную presign_get
+        """
+        if expires_at < time.time():
+            return False
+        return hmac.compare_digest(self._signature(object_name, expires_at), signature)
+
+    def local_path(self, object_name: str) -> Optional[str]:
+        return self._path(object_name)
+
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """
+    Возвращает хранилище, выбранное переменной окружения STORAGE_BACKEND
+
+    Returns:
+        StorageBackend: Общий для всего процесса экземпляр хранилища
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "local":
+                    from .auth_service import SECRET_KEY
+
+                    _storage = LocalStorage(
+                        LOCAL_STORAGE_ROOT,
+                        os.getenv("LOCAL_STORAGE_SIGNING_KEY", SECRET_KEY),
+                    )
+                elif STORAGE_BACKEND == "s3":
+                    _storage = MinioStorage()
+                else:
+                    raise ValueError(f"Неизвестный тип хранилища STORAGE_BACKEND={STORAGE_BACKEND}")
+    return _storage
@@ -0,0 +1,329 @@
+"""
+Клиент S3-хранилища с пулом соединений, таймаутами и повторами запросов.
+
+Все обращения к MinIO проходят через StorageClient: временные ошибки (обрывы
+соединения, таймауты, ответы 5xx и SlowDown) повторяются с экспоненциальной
+задержкой со случайным разбросом, а задержка и ошибки каждой операции
+попадают в метрики storage.*.
+
+Клиент не хранит изменяемого состояния, кроме самого клиента MinIO, а пул
+соединений urllib3 потокобезопасен, поэтому один экземпляр можно вызывать из
+пула потоков (run_in_threadpool, ThreadPoolExecutor). Клиент MinIO создается
+при первом обращении в каждом процессе, чтобы воркеры, запущенные через fork,
+не делили соединения родителя.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+import certifi
+import urllib3
+from minio import Minio
+from minio.error import InvalidResponseError, S3Error, ServerError
+
+from .. import metrics
+
+logger = logging.getLogger("storage")
+
+# Максимальное число соединений с хранилищем в пуле процесса
+S3_POOL_SIZE = int(os.getenv("S3_POOL_SIZE", "32"))
+
+# Таймауты установления соединения и чтения ответа в секундах
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "5"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "60"))
+
+# Количество повторов временных ошибок и границы задержки между ними (в секундах)
+S3_MAX_RETRIES = int(os.getenv("S3_MAX_RETRIES", "3"))
+S3_RETRY_BACKOFF_BASE = float(os.getenv("S3_RETRY_BACKOFF_BASE", "0.2"))
+S3_RETRY_BACKOFF_MAX = float(os.getenv("S3_RETRY_BACKOFF_MAX", "5"))
+
+# Коды ошибок S3
+NOT_FOUND_CODES = frozenset({"NoSuchKey", "NoSuchBucket", "ResourceNotFound"})
+BUCKET_EXISTS_CODES = frozenset({"BucketAlreadyOwnedByYou", "BucketAlreadyExists"})
+TRANSIENT_CODES = frozenset({
+    "InternalError",
+    "RequestTimeout",
+    "ServiceUnavailable",
+    "SlowDown",
+    "XMinioServerNotInitialized",
+})
+
+# HTTP-статусы, при которых запрос имеет смысл повторить
+TRANSIENT_STATUSES = frozenset({500, 502, 503, 504})
+
+
+def error_code(error: Exception) -> Optional[str]:
+    """
+    Возвращает код ошибки S3 (например, 'NoSuchKey') или None для других исключений
+    """
+    return error.code if isinstance(error, S3Error) else None
+
+
+def is_not_found(error: Exception) -> bool:
+    """
+    Проверяет, означает ли ошибка отсутствие объекта или бакета
+    """
+    return error_code(error) in NOT_FOUND_CODES
+
+
+def is_bucket_exists(error: Exception) -> bool:
+    """
+    Проверяет, означает ли ошибка создания бакета, что он уже существует
+    """
+    return error_code(error) in BUCKET_EXISTS_CODES
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Проверяет, является ли ошибка временной, то есть можно ли повторить запрос
+
+    Args:
+        error (Exception): Исключение, возникшее при обращении к хранилищу
+
+    Returns:
+        bool: True для сетевых ошибок, таймаутов, ответов 5xx и SlowDown
+    """
+    if isinstance(error, S3Error):
+        return error.code in TRANSIENT_CODES
+    if isinstance(error, ServerError):
+        return error.status_code in TRANSIENT_STATUSES
+    if isinstance(error, InvalidResponseError):
+        return True
+    return isinstance(error, (urllib3.exceptions.HTTPError, ConnectionError, TimeoutError))
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Задержка перед повтором номер attempt (с нуля): экспоненциальный рост
+    с полным случайным разбросом, чтобы повторы разных потоков не совпадали
+    """
+    return random.uniform(0, min(S3_RETRY_BACKOFF_MAX, S3_RETRY_BACKOFF_BASE * 2 ** attempt))
+
+
+class StorageClient:
+    """
+    Потокобезопасная обертка над клиентом MinIO
+
+    Args:
+        endpoint (str): Адрес хранилища (host:port)
+        access_key (str): Ключ доступа
+        secret_key (str): Секретный ключ
+        secure (bool): Использовать HTTPS
+        pool_size (int): Максимальное число соединений в пуле
+        connect_timeout (float): Таймаут установления соединения в секундах
+        read_timeout (float): Таймаут чтения ответа в секундах
+        max_retries (int): Количество повторов временных ошибок
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        secure: bool,
+        pool_size: int = S3_POOL_SIZE,
+        connect_timeout: float = S3_CONNECT_TIMEOUT,
+        read_timeout: float = S3_READ_TIMEOUT,
+        max_retries: int = S3_MAX_RETRIES
+    ):
+        self.endpoint = endpoint
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.secure = secure
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self._client: Optional[Minio] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _build_client(self) -> Minio:
+        """
+        Создает клиент MinIO с собственным пулом соединений. Повторы на уровне
+        urllib3 отключены: ими управляет StorageClient
+        """
+        http_client = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=self.pool_size,
+            # Не создаем соединения сверх пула, а ждем освобождения существующих
+            block=True,
+            timeout=urllib3.util.Timeout(connect=self.connect_timeout, read=self.read_timeout),
+            retries=False,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+        )
+        return Minio(
+            self.endpoint,
+            access_key=self.access_key,
+            secret_key=self.secret_key,
+            secure=self.secure,
+            http_client=http_client,
+        )
+
+    @property
+    def client(self) -> Minio:
+        """
+        Клиент MinIO текущего процесса
+        """
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    self._client = self._build_client()
+                    self._pid = pid
+        return self._client
+
+    def call(self, operation: str, func: Callable, *args, rewind=None, **kwargs):
+        """
+        Выполняет операцию хранилища с повторами временных ошибок и метриками
+
+        Args:
+            operation (str): Имя операции для метрик (например, 'put_object')
+            func (Callable): Вызываемый метод клиента MinIO
+            rewind (Callable, optional): Возвращает поток данных в начальное
+                положение перед повтором. Если поток нельзя перемотать, повторов нет.
+
+        Returns:
+            Результат вызова func
+
+        Raises:
+            Exception: Исходное исключение, если ошибка не временная или повторы исчерпаны
+        """
+        attempt = 0
+        started = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_transient(e) or rewind is False:
+                        # Отсутствие объекта - штатный результат, а не ошибка хранилища
+                        if not is_not_found(e):
+                            metrics.increment(f"storage.{operation}.errors")
+                        raise
+                    delay = backoff_delay(attempt)
+                    attempt += 1
+                    metrics.increment(f"storage.{operation}.retries")
+                    logger.warning(
+                        f"Временная ошибка хранилища в {operation} "
+                        f"(попытка {attempt} из {self.max_retries}), повтор через {delay:.2f} с: {e}"
+                    )
+                    if rewind is not None:
+                        rewind()
+                    time.sleep(delay)
+        finally:
+            metrics.observe(f"storage.{operation}_ms", (time.perf_counter() - started) * 1000)
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return self.call("bucket_exists", self.client.bucket_exists, bucket_name)
+
+    def make_bucket(self, bucket_name: str):
+        return self.call("make_bucket", self.client.make_bucket, bucket_name)
+
+    def stat_object(self, bucket_name: str, object_name: str):
+        return self.call("stat_object", self.client.stat_object, bucket_name, object_name)
+
+    def remove_object(self, bucket_name: str, object_name: str):
+        return self.call("remove_object", self.client.remove_object, bucket_name, object_name)
+
+    def get_object_data(self, bucket_name: str, object_name: str) -> bytes:
+        """
+        Читает объект целиком и возвращает соединение в пул
+        """
+        def read():
+            response = self.client.get_object(bucket_name, object_name)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+        return self.call("get_object", read)
+
+    def get_object_stream(self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0):
+        """
+        Открывает объект (или его диапазон) на чтение. Повторяется только открытие:
+        вызывающий код читает ответ сам и обязан вызвать close() и release_conn()
+        """
+        return self.call(
+            "get_object", self.client.get_object,
+            bucket_name, object_name, offset=offset, length=length
+        )
+
+    def remove_objects(self, bucket_name: str, object_names: list) -> list:
+        """
+        Удаляет объекты пакетными запросами (до 1000 имен в каждом)
+
+        Returns:
+            list: Ошибки удаления отдельных объектов
+        """
+        from minio.deleteobjects import DeleteObject
+
+        return self.call(
+            "remove_objects",
+            lambda: list(self.client.remove_objects(
+                bucket_name, [DeleteObject(name) for name in object_names]
+            )),
+        )
+
+    def put_object(self, bucket_name: str, object_name: str, data, length: int, content_type: str):
+        """
+        Загружает данные из потока. Повтор возможен только для потоков,
+        поддерживающих перемотку (seek)
+        """
+        rewind = False
+        seekable = getattr(data, "seekable", None)
+        if seekable is not None and seekable():
+            position = data.tell()
+            rewind = lambda: data.seek(position)
+        return self.call(
+            "put_object", self.client.put_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            data=data,
+            length=length,
+            content_type=content_type,
+            rewind=rewind,
+        )
+
+    def fput_object(self, bucket_name: str, object_name: str, file_path: str, content_type: str):
+        return self.call(
+            "fput_object", self.client.fput_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            file_path=file_path,
+            content_type=content_type,
+        )
+
+    def fget_object(self, bucket_name: str, object_name: str, file_path: str):
+        return self.call(
+            "fget_object", self.client.fget_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            file_path=file_path,
+        )
+
+    def iter_objects(self, bucket_name: str, prefix: str = ""):
+        """
+        Перебирает объекты с префиксом. Список запрашивается у хранилища
+        страницами по мере перебора, поэтому объем памяти не зависит от числа
+        объектов. Ошибки при получении страниц не повторяются
+        """
+        return self.client.list_objects(bucket_name, prefix=prefix, recursive=True)
+
+    def list_object_names(self, bucket_name: str, prefix: str, recursive: bool = True) -> list:
+        """
+        Возвращает имена объектов с префиксом. Список читается целиком внутри
+        повтора, так как итератор MinIO нельзя продолжить после ошибки
+        """
+        return self.call(
+            "list_objects",
+            lambda: [
+                obj.object_name
+                for obj in self.client.list_objects(bucket_name, prefix=prefix, recursive=recursive)
+            ],
+        )
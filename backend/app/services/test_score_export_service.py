@@ -0,0 +1,107 @@
+"""
+Потоковая выгрузка результатов тестов для отчетов.
+
+Результаты выбираются через серверный курсор порциями по EXPORT_BATCH_SIZE
+строк (yield_per) вместе с логином пользователя и названием теста, поэтому
+объем памяти не зависит от количества выгружаемых записей.
+"""
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import Test, TestScore, User
+
+# Количество результатов, выбираемых из БД за один раз
+EXPORT_BATCH_SIZE = int(os.getenv("TEST_SCORE_EXPORT_BATCH_SIZE", "5000"))
+
+# Колонки выгрузки
+EXPORT_FIELDS = [
+    "id", "user_id", "user_login", "test_id", "test_name",
+    "score", "correct_answers", "total_questions", "date"
+]
+
+
+def _split_score(score: str):
+    """
+    Разбирает результат в формате "X/Y" на количество верных ответов и вопросов
+
+    Returns:
+        tuple: (верных ответов, всего вопросов) или (None, None) для некорректного значения
+    """
+    correct, _, total = (score or "").partition("/")
+    try:
+        return int(correct), int(total)
+    except ValueError:
+        return None, None
+
+
+def iter_test_scores(
+    db: Session,
+    export_format: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    test_id: Optional[int] = None
+) -> Iterator[bytes]:
+    """
+    Потоково выгружает результаты тестов в NDJSON или CSV
+
+    Args:
+        db (Session): Сессия базы данных
+        export_format (str): 'ndjson' или 'csv'
+        date_from (Optional[datetime]): Начало периода (включительно)
+        date_to (Optional[datetime]): Конец периода (не включительно)
+        test_id (Optional[int]): ID теста для фильтрации
+
+    Yields:
+        bytes: Очередная порция выгрузки (по одной на EXPORT_BATCH_SIZE результатов)
+    """
+    statement = select(
+        TestScore.id,
+        TestScore.user_id,
+        User.login.label("user_login"),
+        TestScore.test_id,
+        Test.name.label("test_name"),
+        TestScore.score,
+        TestScore.date
+    ).outerjoin(
+        User, User.id == TestScore.user_id
+    ).outerjoin(
+        Test, Test.id == TestScore.test_id
+    )
+
+    # Условия соответствуют индексам ix_test_score_date и ix_test_score_test_id_date
+    if test_id is not None:
+        statement = statement.where(TestScore.test_id == test_id)
+    if date_from is not None:
+        statement = statement.where(TestScore.date >= date_from)
+    if date_to is not None:
+        statement = statement.where(TestScore.date < date_to)
+
+    statement = statement.order_by(TestScore.date, TestScore.id).execution_options(
+        yield_per=EXPORT_BATCH_SIZE
+    )
+
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS).writeheader()
+        yield buffer.getvalue().encode("utf-8")
+
+    for partition in db.execute(statement).partitions():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS) if export_format == "csv" else None
+        for row in partition:
+            record = dict(row._mapping)
+            record["correct_answers"], record["total_questions"] = _split_score(row.score)
+            record["date"] = row.date.isoformat() if row.date else None
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                buffer.write(json.dumps(record, ensure_ascii=False))
+                buffer.write("\n")
+        yield buffer.getvalue().encode("utf-8")
@@ -0,0 +1,348 @@
+"""
+Отзыв токенов доступа и обновления без обращения к БД на каждый запрос.
+
+Состояние отзыва хранится в памяти каждого воркера и проверяется за O(1):
+
+* версии токенов пользователей (users.token_version). Токен с версией
+  меньше текущей недействителен, поэтому увеличение версии отзывает все
+  сессии пользователя (сброс пароля, выход со всех устройств);
+* список явно отозванных (выход из сессии) токенов доступа в виде фильтра
+  Блума по их идентификаторам (jti). Фильтр не дает ложноотрицательных
+  ответов; ложноположительный ответ приводит лишь к обновлению токена
+  доступа. Чтобы записи устаревали, фильтр состоит из двух поколений,
+  сменяющихся раз в REVOCATION_WINDOW секунд (срок действия токена доступа).
+
+Токены обновления в фильтр не попадают: их проверяет только маршрут
+обновления, одним запросом к revoked_tokens по первичному ключу. Иначе
+каждая ротация токена обновления заполняла бы фильтр, по которому
+проверяется каждый запрос, и росла бы доля ложных отказов.
+
+Изменения сохраняются в users и revoked_tokens и рассылаются остальным
+воркерам через PostgreSQL NOTIFY на канал token_revocation; при старте и
+после переподключения слушателя состояние загружается из БД заново.
+"""
+import hashlib
+import logging
+import math
+import select
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select as sql_select, text, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..database import engine, SessionLocal
+from ..models import RevokedToken, User
+from .auth_service import ACCESS_TOKEN_EXPIRE_MINUTES
+
+logger = logging.getLogger("token_revocation")
+
+# Канал PostgreSQL для рассылки изменений между воркерами
+NOTIFY_CHANNEL = "token_revocation"
+
+# Ожидаемое количество отозванных токенов доступа за окно и допустимая доля ложных срабатываний
+DENYLIST_CAPACITY = 100_000
+DENYLIST_ERROR_RATE = 0.001
+
+# Время жизни поколения фильтра в секундах: отозванный токен доступа не нужен
+# в фильтре дольше срока своего действия
+REVOCATION_WINDOW = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+# Пауза перед переподключением слушателя в секундах
+LISTENER_RETRY_SECONDS = 5
+
+
+class BloomFilter:
+    """
+    Фильтр Блума для строковых ключей
+
+    Args:
+        capacity (int): Ожидаемое количество элементов
+        error_rate (float): Допустимая доля ложноположительных ответов
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Двойное хэширование: k позиций из двух 64-битных хэшей
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationState:
+    """
+    Версии токенов пользователей и фильтр отозванных токенов доступа в памяти воркера
+    """
+
+    def __init__(self, capacity: int = DENYLIST_CAPACITY, error_rate: float = DENYLIST_ERROR_RATE,
+                 window: float = REVOCATION_WINDOW):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset({})
+
+    def reset(self, versions: Dict[int, int]):
+        """
+        Заменяет состояние загруженным из БД
+        """
+        with self._lock:
+            self._versions = dict(versions)
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self._previous = BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = time.monotonic()
+
+    def set_version(self, user_id: int, version: int):
+        with self._lock:
+            if version > self._versions.get(user_id, 0):
+                self._versions[user_id] = version
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def add_jti(self, jti: str):
+        with self._lock:
+            if time.monotonic() - self._rotated_at > self.window:
+                self._previous = self._current
+                self._current = BloomFilter(self.capacity, self.error_rate)
+                self._rotated_at = time.monotonic()
+            self._current.add(jti)
+
+    def may_be_revoked(self, jti: str) -> bool:
+        """
+        Проверяет jti по фильтру (возможны ложноположительные ответы)
+        """
+        return jti in self._current or jti in self._previous
+
+    def is_revoked(self, payload: dict) -> bool:
+        """
+        Проверяет, отозван ли токен с указанными полями
+
+        Args:
+            payload (dict): Декодированные поля токена (uid, ver, jti)
+
+        Returns:
+            bool: True, если токен отозван
+        """
+        user_id = payload.get("uid")
+        if user_id is None or payload.get("ver", 0) < self.version(user_id):
+            return True
+        jti = payload.get("jti")
+        return jti is None or self.may_be_revoked(jti)
+
+
+revocation_state = RevocationState()
+
+_stop_event = threading.Event()
+_listener: Optional[threading.Thread] = None
+
+
+def is_token_revoked(payload: dict) -> bool:
+    """
+    Проверяет за O(1) без обращения к БД, отозван ли токен
+
+    Args:
+        payload (dict): Декодированные поля токена
+
+    Returns:
+        bool: True, если токен отозван или выдан до отзыва всех сессий пользователя
+    """
+    revoked = revocation_state.is_revoked(payload)
+    if revoked:
+        metrics.increment("auth.revoked_token_rejections")
+    return revoked
+
+
+def _notify(db: Session, payload: str):
+    """
+    Рассылает изменение остальным воркерам (доставляется при фиксации транзакции)
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+
+
+def _apply(payload: str):
+    """
+    Применяет изменение, полученное от другого воркера
+    """
+    kind, _, value = payload.partition(":")
+    if kind == "v":
+        user_id, _, version = value.partition(":")
+        revocation_state.set_version(int(user_id), int(version))
+    elif kind == "j":
+        revocation_state.add_jti(value)
+
+
+def _insert_revoked(db: Session, jti: str, user_id: int, expires_at: datetime):
+    insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    return db.execute(
+        insert(RevokedToken)
+        .values(jti=jti, user_id=user_id, expires_at=expires_at, revoked_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+        .returning(RevokedToken.jti)
+    ).scalar()
+
+
+def revoke_token(db: Session, jti: str, user_id: int, expires_at: datetime):
+    """
+    Отзывает токен доступа: он перестает приниматься всеми воркерами
+
+    Args:
+        db (Session): Сессия базы данных
+        jti (str): Идентификатор токена
+        user_id (int): ID пользователя
+        expires_at (datetime): Срок действия токена
+    """
+    _insert_revoked(db, jti, user_id, expires_at)
+    _notify(db, f"j:{jti}")
+    db.commit()
+    revocation_state.add_jti(jti)
+    metrics.increment("auth.tokens_revoked")
+
+
+def revoke_refresh_token(db: Session, jti: str, user_id: int, expires_at: datetime) -> bool:
+    """
+    Отзывает токен обновления (при его использовании или выходе из сессии).
+    Запись в revoked_tokens одновременно проверяет повторное использование:
+    из двух одновременных обновлений одним токеном успешно только одно
+
+    Args:
+        db (Session): Сессия базы данных
+        jti (str): Идентификатор токена
+        user_id (int): ID пользователя
+        expires_at (datetime): Срок действия токена
+
+    Returns:
+        bool: False, если токен уже был отозван
+    """
+    revoked = _insert_revoked(db, jti, user_id, expires_at) is not None
+    db.commit()
+    return revoked
+
+
+def revoke_all_user_tokens(db: Session, user: User):
+    """
+    Отзывает все выданные пользователю токены, увеличивая версию токенов
+
+    Args:
+        db (Session): Сессия базы данных
+        user (User): Пользователь
+    """
+    version = db.execute(
+        update(User)
+        .where(User.id == user.id)
+        .values(token_version=User.token_version + 1)
+        .returning(User.token_version)
+    ).scalar_one()
+    _notify(db, f"v:{user.id}:{version}")
+    db.commit()
+    revocation_state.set_version(user.id, version)
+    metrics.increment("auth.sessions_revoked")
+    logger.info(f"Отозваны все сессии пользователя {user.id}")
+
+
+def load_state():
+    """
+    Загружает версии токенов и неистекшие отозванные токены доступа из БД,
+    удаляя записи об истекших токенах
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+        db.commit()
+        versions = {
+            user_id: version
+            for user_id, version in db.execute(
+                sql_select(User.id, User.token_version).where(User.token_version > 0)
+            )
+        }
+        revocation_state.reset(versions)
+        # В фильтр нужны только токены доступа: в отличие от токенов обновления,
+        # они истекают не позже чем через ACCESS_TOKEN_EXPIRE_MINUTES
+        access_expires_before = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        for (jti,) in db.execute(
+            sql_select(RevokedToken.jti)
+            .where(RevokedToken.expires_at <= access_expires_before)
+            .execution_options(yield_per=5000)
+        ):
+            revocation_state.add_jti(jti)
+    finally:
+        db.close()
+
+
+def _listen_loop():
+    """
+    Цикл фонового потока: получает изменения от других воркеров через LISTEN
+    """
+    while not _stop_event.is_set():
+        connection = None
+        try:
+            connection = engine.raw_connection()
+            # Соединение для LISTEN не возвращается в пул
+            connection.detach()
+            driver_connection = connection.driver_connection
+            driver_connection.autocommit = True
+            with driver_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Изменения, сделанные до LISTEN, могли быть пропущены
+            load_state()
+            while not _stop_event.is_set():
+                if select.select([driver_connection], [], [], LISTENER_RETRY_SECONDS) == ([], [], []):
+                    continue
+                driver_connection.poll()
+                while driver_connection.notifies:
+                    _apply(driver_connection.notifies.pop(0).payload)
+        except Exception as e:
+            logger.error(f"Ошибка слушателя отзыва токенов: {str(e)}")
+            _stop_event.wait(LISTENER_RETRY_SECONDS)
+        finally:
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+
+def start():
+    """
+    Загружает состояние отзыва и запускает слушатель изменений (вызывается при старте приложения)
+    """
+    global _listener
+    try:
+        load_state()
+    except Exception as e:
+        logger.error(f"Не удалось загрузить состояние отзыва токенов: {str(e)}")
+    if _listener is not None or engine.dialect.name != "postgresql":
+        return
+    _stop_event.clear()
+    _listener = threading.Thread(target=_listen_loop, name="token-revocation-listener", daemon=True)
+    _listener.start()
+
+
+def stop():
+    """
+    Останавливает слушатель изменений
+    """
+    global _listener
+    _stop_event.set()
+    if _listener is not None:
+        _listener.join(timeout=LISTENER_RETRY_SECONDS + 1)
+        _listener = None
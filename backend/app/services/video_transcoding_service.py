@@ -0,0 +1,602 @@
+import os
+import json
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import VideoTranscodeJob
+from .media_processing_service import record_video_metadata
+from .scratch_space import scratch_space
+from .storage import get_storage
+
+# Настройка логирования
+logger = logging.getLogger("video_transcoding_service")
+
+# Пути к исполняемым файлам ffmpeg/ffprobe
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+
+# Количество фоновых потоков перекодирования
+TRANSCODE_WORKERS = int(os.getenv("VIDEO_TRANSCODE_WORKERS", "1"))
+
+# Длительность одного HLS-сегмента в секундах
+HLS_SEGMENT_SECONDS = 6
+
+# Лестница качеств: (имя, высота кадра, битрейт видео, битрейт аудио)
+RENDITIONS = [
+    ("360p", 360, "800k", "96k"),
+    ("720p", 720, "2800k", "128k"),
+    ("1080p", 1080, "5000k", "192k"),
+]
+
+# Имя мастер-плейлиста внутри префикса videos/{id}/
+MASTER_PLAYLIST = "master.m3u8"
+
+# Задача в статусе processing без обновлений дольше этого времени считается прерванной
+STALE_JOB_SECONDS = 600
+
+# Как часто (в секундах) выполняемая задача обновляет updated_at, в том числе
+# во время скачивания исходника и загрузки сегментов
+HEARTBEAT_SECONDS = STALE_JOB_SECONDS // 10
+
+# Как часто (в секундах) работающий процесс возвращает в очередь ожидающие и прерванные задачи
+REQUEUE_INTERVAL_SECONDS = int(os.getenv("VIDEO_TRANSCODE_REQUEUE_SECONDS", "60"))
+
+# Статусы задачи
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+# Очередь идентификаторов задач и рабочие потоки
+_job_queue: "queue.Queue[Optional[int]]" = queue.Queue()
+_workers: List[threading.Thread] = []
+
+# Задачи в очереди этого процесса (без повторов) и выполняемые им задачи с метками выполнения
+_queued: Set[int] = set()
+_queue_lock = threading.Lock()
+_active_jobs: Dict[int, str] = {}
+
+# Остановка процесса: выполняемые задачи прерываются и возвращаются в pending
+_stop_event = threading.Event()
+_requeuer: Optional[threading.Thread] = None
+
+
+class JobInterrupted(Exception):
+    """
+    Задача прервана остановкой процесса и будет выполнена заново
+    """
+
+
+class JobLost(Exception):
+    """
+    Задача больше не принадлежит этому запуску (признана прерванной и захвачена заново)
+    """
+
+
+def _enqueue(job_id: int) -> bool:
+    """
+    Ставит задачу в очередь процесса, если ее там еще нет
+
+    Returns:
+        bool: True, если задача добавлена
+    """
+    with _queue_lock:
+        if job_id in _queued:
+            return False
+        _queued.add(job_id)
+    _job_queue.put(job_id)
+    return True
+
+
+def hls_prefix(video_id: str) -> str:
+    """
+    Возвращает префикс хранилища, под которым лежат HLS-файлы видео
+
+    Args:
+        video_id (str): Идентификатор видео
+
+    Returns:
+        str: Префикс вида 'videos/<id>/'
+    """
+    return f"videos/{video_id}/"
+
+
+def create_transcode_job(db: Session, video_id: str, source_object: str) -> VideoTranscodeJob:
+    """
+    Создает задачу перекодирования и ставит ее в очередь
+
+    Args:
+        db (Session): Сессия базы данных
+        video_id (str): Идентификатор видео
+        source_object (str): Имя исходного объекта в хранилище
+
+    Returns:
+        VideoTranscodeJob: Созданная задача
+    """
+    job = VideoTranscodeJob(
+        video_id=video_id,
+        source_object=source_object,
+        status=STATUS_PENDING,
+        progress=0.0
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    _enqueue(job.id)
+    logger.info(f"Задача перекодирования {job.id} для видео {video_id} поставлена в очередь")
+    return job
+
+
+def get_latest_job(db: Session, video_id: str) -> Optional[VideoTranscodeJob]:
+    """
+    Возвращает последнюю задачу перекодирования для видео
+
+    Args:
+        db (Session): Сессия базы данных
+        video_id (str): Идентификатор видео
+
+    Returns:
+        Optional[VideoTranscodeJob]: Задача или None, если видео не перекодировалось
+    """
+    return db.query(VideoTranscodeJob).filter(
+        VideoTranscodeJob.video_id == video_id
+    ).order_by(VideoTranscodeJob.id.desc()).first()
+
+
+def probe_video(file_path: str) -> dict:
+    """
+    Получает длительность, кодек и размеры кадра видео с помощью ffprobe
+
+    Args:
+        file_path (str): Путь к локальному видеофайлу
+
+    Returns:
+        dict: Словарь с ключами duration (сек), width, height, codec
+
+    Raises:
+        RuntimeError: Если ffprobe завершился с ошибкой или видеопоток не найден
+    """
+    result = subprocess.run(
+        [
+            FFPROBE_BINARY, "-v", "error",
+            "-select_streams", "v:0",
+            "-show_entries", "stream=width,height,codec_name:format=duration",
+            "-of", "json",
+            file_path
+        ],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe завершился с ошибкой: {result.stderr.strip()}")
+
+    data = json.loads(result.stdout or "{}")
+    streams = data.get("streams") or []
+    if not streams:
+        raise RuntimeError("Видеопоток не найден")
+
+    return {
+        "duration": float(data.get("format", {}).get("duration") or 0.0),
+        "width": int(streams[0].get("width") or 0),
+        "height": int(streams[0].get("height") or 0),
+        "codec": streams[0].get("codec_name"),
+    }
+
+
+def select_renditions(source_height: int) -> list:
+    """
+    Выбирает качества, не превышающие высоту исходного кадра.
+    Самое низкое качество включается всегда.
+
+    Args:
+        source_height (int): Высота кадра исходного видео
+
+    Returns:
+        list: Подмножество RENDITIONS
+    """
+    selected = [r for r in RENDITIONS if r[1] <= source_height]
+    return selected or RENDITIONS[:1]
+
+
+def _scaled_width(source_width: int, source_height: int, target_height: int) -> int:
+    """
+    Вычисляет четную ширину кадра при масштабировании с сохранением пропорций
+    """
+    if not source_width or not source_height:
+        return 0
+    return int(round(source_width * target_height / source_height / 2)) * 2
+
+
+def _bitrate_to_bps(bitrate: str) -> int:
+    """
+    Переводит битрейт вида '800k' в биты в секунду
+    """
+    return int(bitrate.rstrip("k")) * 1000
+
+
+def write_master_playlist(output_dir: str, renditions: list, source_width: int, source_height: int) -> str:
+    """
+    Формирует мастер-плейлист HLS со ссылками на плейлисты качеств
+
+    Args:
+        output_dir (str): Каталог с результатами перекодирования
+        renditions (list): Список перекодированных качеств
+        source_width (int): Ширина кадра исходного видео
+        source_height (int): Высота кадра исходного видео
+
+    Returns:
+        str: Путь к мастер-плейлисту
+    """
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for name, height, video_bitrate, audio_bitrate in renditions:
+        bandwidth = _bitrate_to_bps(video_bitrate) + _bitrate_to_bps(audio_bitrate)
+        stream_info = f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}"
+        width = _scaled_width(source_width, source_height, height)
+        if width:
+            stream_info += f",RESOLUTION={width}x{height}"
+        lines.append(stream_info)
+        lines.append(f"{name}/index.m3u8")
+
+    master_path = os.path.join(output_dir, MASTER_PLAYLIST)
+    with open(master_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return master_path
+
+
+def _run_ffmpeg_rendition(source_path: str, output_dir: str, rendition: tuple, duration: float, on_progress):
+    """
+    Перекодирует видео в одно качество с нарезкой на HLS-сегменты
+
+    Args:
+        source_path (str): Путь к исходному видео
+        output_dir (str): Каталог для плейлиста и сегментов этого качества
+        rendition (tuple): Описание качества из RENDITIONS
+        duration (float): Длительность исходного видео в секундах
+        on_progress (callable): Вызывается с долей выполнения (0..1)
+
+    Raises:
+        RuntimeError: Если ffmpeg завершился с ошибкой
+    """
+    name, height, video_bitrate, audio_bitrate = rendition
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Ключевые кадры ставятся по времени, а не через каждые N кадров, чтобы
+    # границы сегментов совпадали с HLS_SEGMENT_SECONDS при любой частоте кадров
+    keyframes = f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})"
+    command = [
+        FFMPEG_BINARY, "-y", "-nostdin", "-loglevel", "error",
+        "-i", source_path,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", f"scale=-2:{height}",
+        "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+        "-b:v", video_bitrate, "-maxrate", video_bitrate,
+        "-bufsize", f"{_bitrate_to_bps(video_bitrate) * 2 // 1000}k",
+        "-force_key_frames", keyframes, "-sc_threshold", "0",
+        "-c:a", "aac", "-b:a", audio_bitrate, "-ac", "2",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(output_dir, "segment_%05d.ts"),
+        "-progress", "pipe:1", "-nostats",
+        os.path.join(output_dir, "index.m3u8"),
+    ]
+
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+    # ffmpeg пишет прогресс в stdout построчно в формате key=value
+    for line in process.stdout:
+        if _stop_event.is_set():
+            process.kill()
+            process.wait()
+            raise JobInterrupted(f"Перекодирование ({name}) прервано остановкой процесса")
+        key, _, value = line.strip().partition("=")
+        # out_time_ms в ffmpeg исторически тоже содержит микросекунды
+        if key in ("out_time_us", "out_time_ms") and duration > 0 and value.isdigit():
+            on_progress(min(int(value) / 1_000_000 / duration, 1.0))
+
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg завершился с ошибкой ({name}): {stderr.strip()}")
+    on_progress(1.0)
+
+
+def _claim_job(db: Session, job_id: int) -> Optional[str]:
+    """
+    Атомарно переводит задачу из pending в processing.
+    Гарантирует, что задачу обработает только один воркер (в том числе в разных процессах).
+
+    Returns:
+        Optional[str]: Метка выполнения или None, если задача уже захвачена или завершена
+    """
+    token = uuid.uuid4().hex
+    result = db.execute(
+        update(VideoTranscodeJob)
+        .where(VideoTranscodeJob.id == job_id, VideoTranscodeJob.status == STATUS_PENDING)
+        .values(status=STATUS_PROCESSING, progress=0.0, claim_token=token, updated_at=datetime.utcnow())
+    )
+    db.commit()
+    return token if result.rowcount == 1 else None
+
+
+def _update_owned(db: Session, job_id: int, token: str, **values) -> bool:
+    """
+    Обновляет задачу, только если она все еще выполняется этим запуском
+
+    Returns:
+        bool: False, если задача перехвачена другим запуском или уже не выполняется
+    """
+    result = db.execute(
+        update(VideoTranscodeJob)
+        .where(
+            VideoTranscodeJob.id == job_id,
+            VideoTranscodeJob.status == STATUS_PROCESSING,
+            VideoTranscodeJob.claim_token == token
+        )
+        .values(updated_at=datetime.utcnow(), **values)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+class _Heartbeat:
+    """
+    Фоновый поток, который раз в HEARTBEAT_SECONDS секунд обновляет updated_at
+    выполняемой задачи, чтобы долгие скачивание и загрузка не считались прерванной задачей
+    """
+
+    def __init__(self, job_id: int, token: str):
+        self.job_id = job_id
+        self.token = token
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"video-transcode-heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stopped.wait(HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                _update_owned(db, self.job_id, self.token)
+            except Exception as e:
+                logger.warning(f"Не удалось обновить задачу {self.job_id}: {str(e)}")
+            finally:
+                db.close()
+
+
+def process_job(job_id: int):
+    """
+    Выполняет задачу перекодирования: скачивает исходник, перекодирует его
+    в несколько качеств, загружает сегменты и плейлисты в videos/{id}/
+
+    Args:
+        job_id (int): ID задачи
+    """
+    db = SessionLocal()
+    work_dir = None
+    token = _claim_job(db, job_id)
+    if token is None:
+        logger.info(f"Задача {job_id} уже обработана или выполняется другим воркером")
+        db.close()
+        return
+
+    _active_jobs[job_id] = token
+    try:
+        with _Heartbeat(job_id, token):
+            job = db.query(VideoTranscodeJob).filter(VideoTranscodeJob.id == job_id).first()
+            video_id, source_object = job.video_id, job.source_object
+            logger.info(f"Начато перекодирование видео {video_id} (задача {job_id})")
+
+            work_dir = scratch_space.mkdtemp(prefix="hls-")
+            source_path = os.path.join(work_dir, "source" + os.path.splitext(source_object)[1])
+            output_dir = os.path.join(work_dir, "hls")
+
+            get_storage().download_to_file(source_object, source_path)
+            info = probe_video(source_path)
+            record_video_metadata(db, video_id, info)
+            renditions = select_renditions(info["height"])
+
+            # Прогресс сохраняется не чаще, чем раз в процент
+            last_saved = {"progress": 0.0}
+
+            def report(index: int, fraction: float):
+                progress = round((index + fraction) / len(renditions) * 95, 1)
+                if progress - last_saved["progress"] >= 1.0:
+                    if not _update_owned(db, job_id, token, progress=progress):
+                        raise JobLost(f"Задача {job_id} выполняется другим запуском")
+                    last_saved["progress"] = progress
+
+            for index, rendition in enumerate(renditions):
+                if _stop_event.is_set():
+                    raise JobInterrupted("Перекодирование прервано остановкой процесса")
+                _run_ffmpeg_rendition(
+                    source_path,
+                    os.path.join(output_dir, rendition[0]),
+                    rendition,
+                    info["duration"],
+                    lambda fraction, index=index: report(index, fraction)
+                )
+
+            write_master_playlist(output_dir, renditions, info["width"], info["height"])
+
+            # Загружаем сегменты и плейлисты качеств, мастер-плейлист - последним,
+            # чтобы клиенты не получили ссылку на еще не загруженные файлы
+            prefix = hls_prefix(video_id)
+            for root, _, files in os.walk(output_dir):
+                for file_name in sorted(files):
+                    local_path = os.path.join(root, file_name)
+                    relative_path = os.path.relpath(local_path, output_dir).replace(os.sep, "/")
+                    if relative_path == MASTER_PLAYLIST:
+                        continue
+                    get_storage().put_file(local_path, prefix + relative_path)
+            get_storage().put_file(os.path.join(output_dir, MASTER_PLAYLIST), prefix + MASTER_PLAYLIST)
+
+            rendition_names = ",".join(r[0] for r in renditions)
+            if not _update_owned(
+                db, job_id, token,
+                status=STATUS_COMPLETED, progress=100.0, renditions=rendition_names, error=None
+            ):
+                raise JobLost(f"Задача {job_id} выполняется другим запуском")
+            logger.info(f"Видео {video_id} успешно перекодировано: {rendition_names}")
+    except JobLost as e:
+        db.rollback()
+        logger.warning(f"Результат перекодирования не сохранен: {str(e)}")
+    except JobInterrupted as e:
+        db.rollback()
+        _release_jobs(db, {job_id: token})
+        logger.info(f"Задача {job_id} возвращена в очередь: {str(e)}")
+    except Exception as e:
+        logger.error(f"Ошибка при перекодировании видео (задача {job_id}): {str(e)}")
+        db.rollback()
+        _update_owned(db, job_id, token, status=STATUS_FAILED, error=str(e))
+    finally:
+        _active_jobs.pop(job_id, None)
+        db.close()
+        if work_dir:
+            scratch_space.release(work_dir)
+
+
+def _release_jobs(db: Session, jobs: Dict[int, str]):
+    """
+    Возвращает выполняемые этим процессом задачи в pending, чтобы их сразу подхватил другой процесс
+
+    Args:
+        db (Session): Сессия базы данных
+        jobs (Dict[int, str]): Метки выполнения по ID задач
+    """
+    for job_id, token in jobs.items():
+        _update_owned(db, job_id, token, status=STATUS_PENDING, progress=0.0)
+
+
+def _worker_loop():
+    """
+    Цикл фонового потока: берет задачи из очереди до получения None
+    """
+    while True:
+        job_id = _job_queue.get()
+        try:
+            if job_id is None:
+                return
+            with _queue_lock:
+                _queued.discard(job_id)
+            # При остановке задачи из очереди не начинаются: они остаются в pending
+            if not _stop_event.is_set():
+                process_job(job_id)
+        finally:
+            _job_queue.task_done()
+
+
+def requeue_pending_jobs():
+    """
+    Возвращает в очередь ожидающие задачи и задачи, прерванные остановкой
+    или падением другого процесса. Задачи в статусе processing, которые давно
+    не обновлялись, сбрасываются в pending.
+    """
+    db = SessionLocal()
+    try:
+        stale_before = datetime.utcnow() - timedelta(seconds=STALE_JOB_SECONDS)
+        db.execute(
+            update(VideoTranscodeJob)
+            .where(
+                VideoTranscodeJob.status == STATUS_PROCESSING,
+                VideoTranscodeJob.updated_at < stale_before
+            )
+            .values(status=STATUS_PENDING, progress=0.0)
+        )
+        db.commit()
+        pending_ids = [
+            job_id for (job_id,) in db.query(VideoTranscodeJob.id).filter(
+                VideoTranscodeJob.status == STATUS_PENDING
+            ).order_by(VideoTranscodeJob.id)
+        ]
+        queued = sum(_enqueue(job_id) for job_id in pending_ids)
+        if queued:
+            logger.info(f"Возвращено в очередь {queued} задач перекодирования")
+    finally:
+        db.close()
+
+
+def _requeue_loop():
+    """
+    Цикл фонового потока: раз в REQUEUE_INTERVAL_SECONDS секунд подбирает
+    задачи, которые не выполняет ни один процесс
+    """
+    while not _stop_event.wait(REQUEUE_INTERVAL_SECONDS):
+        try:
+            requeue_pending_jobs()
+        except Exception as e:
+            logger.error(f"Не удалось восстановить очередь перекодирования: {str(e)}")
+
+
+def start_workers():
+    """
+    Запускает фоновые потоки перекодирования (вызывается при старте приложения)
+    """
+    global _requeuer
+    if _workers:
+        return
+    _stop_event.clear()
+    if shutil.which(FFMPEG_BINARY) is None:
+        logger.warning(f"ffmpeg ({FFMPEG_BINARY}) не найден, перекодирование видео будет завершаться ошибкой")
+
+    try:
+        requeue_pending_jobs()
+    except Exception as e:
+        logger.error(f"Не удалось восстановить очередь перекодирования: {str(e)}")
+
+    for i in range(max(TRANSCODE_WORKERS, 1)):
+        worker = threading.Thread(target=_worker_loop, name=f"video-transcoder-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+    _requeuer = threading.Thread(target=_requeue_loop, name="video-transcode-requeue", daemon=True)
+    _requeuer.start()
+    logger.info(f"Запущено потоков перекодирования видео: {len(_workers)}")
+
+
+def stop_workers():
+    """
+    Останавливает фоновые потоки. Выполняемые задачи прерываются и
+    возвращаются в pending, чтобы их продолжил другой процесс
+    """
+    global _requeuer
+    _stop_event.set()
+    if _requeuer is not None:
+        _requeuer.join(timeout=5)
+        _requeuer = None
+    for _ in _workers:
+        _job_queue.put(None)
+    for worker in _workers:
+        worker.join(timeout=5)
+    _workers.clear()
+
+    # Задачи, которые не успели прерваться (например, во время загрузки файла)
+    if _active_jobs:
+        db = SessionLocal()
+        try:
+            _release_jobs(db, dict(_active_jobs))
+            logger.info(f"Возвращено в очередь задач перекодирования при остановке: {len(_active_jobs)}")
+        except Exception as e:
+            logger.error(f"Не удалось вернуть задачи перекодирования в очередь: {str(e)}")
+        finally:
+            db.close()
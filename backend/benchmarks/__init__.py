@@ -0,0 +1,6 @@
+"""
+Бенчмарки бэкенда Zooracle.
+
+Запускаются из каталога backend, например:
+    python -m benchmarks.catalog_summary
+"""
@@ -0,0 +1,101 @@
+"""
+Накладные расходы аутентификации на запрос.
+
+Замеряется задержка пустого маршрута:
+- anonymous:  без аутентификации (базовая стоимость запроса)
+- legacy:     прежняя зависимость: декодирование токена и загрузка ORM-объекта
+              пользователя в каждой зависимости (маршрут с тремя зависимостями)
+- principal:  get_current_user (единая зависимость get_principal)
+- principal3: get_current_user, get_current_admin_user и get_optional_current_user
+              в одном маршруте - токен декодируется один раз за запрос
+
+Запуск: python -m benchmarks.auth_overhead [--iterations 2000]
+"""
+import argparse
+
+from .common import create_bench_database, measure, print_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    _, SessionLocal = create_bench_database()
+
+    import logging
+    from fastapi import Depends, FastAPI, HTTPException
+    from fastapi.testclient import TestClient
+    from app.database import get_db
+    from app.models import User
+    from app.services.auth_service import (
+        create_token_pair, decode_token, get_current_admin_user,
+        get_current_user, get_optional_current_user, optional_oauth2_scheme
+    )
+
+    db = SessionLocal()
+    user = User(login="bench", email="bench@example.com", password="-", is_admin=True)
+    db.add(user)
+    db.commit()
+    token = create_token_pair(user)["access_token"]
+    db.close()
+
+    def get_bench_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    async def legacy_user(token: str = Depends(optional_oauth2_scheme), db=Depends(get_bench_db)):
+        payload = decode_token(token) if token else None
+        if payload is None:
+            raise HTTPException(status_code=401)
+        return db.query(User).filter(User.login == payload["sub"]).first()
+
+    # Прежние зависимости были разными функциями, поэтому FastAPI не объединял их вызовы
+    async def legacy_admin(token: str = Depends(optional_oauth2_scheme), db=Depends(get_bench_db)):
+        return await legacy_user(token, db)
+
+    async def legacy_optional(token: str = Depends(optional_oauth2_scheme), db=Depends(get_bench_db)):
+        return await legacy_user(token, db)
+
+    app = FastAPI()
+    app.dependency_overrides[get_db] = get_bench_db
+
+    @app.get("/anonymous")
+    async def anonymous():
+        return {}
+
+    @app.get("/legacy")
+    async def legacy(a=Depends(legacy_user), b=Depends(legacy_admin), c=Depends(legacy_optional)):
+        return {}
+
+    @app.get("/principal")
+    async def principal(a=Depends(get_current_user)):
+        return {}
+
+    @app.get("/principal3")
+    async def principal3(a=Depends(get_current_user), b=Depends(get_current_admin_user),
+                         c=Depends(get_optional_current_user)):
+        return {}
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    results = {}
+    for name in ("anonymous", "legacy", "principal", "principal3"):
+        url = f"/{name}"
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        results[name] = measure(lambda: client.get(url, headers=headers), iterations=args.iterations, warmup=50)
+
+    base = results["anonymous"]["p50_ms"]
+    for name in ("legacy", "principal", "principal3"):
+        results[f"{name}_overhead_p50_ms"] = round(results[name]["p50_ms"] - base, 3)
+    print_results("Аутентификация, накладные расходы на запрос", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Сравнение полного списка животных (GET /api/animals/) и компактного
+списка для сетки каталога (GET /api/animals/summary): размер ответа и задержка.
+
+Запуск: python -m benchmarks.catalog_summary [--animals 10000] [--iterations 20]
+"""
+import argparse
+from types import SimpleNamespace
+
+from .common import create_bench_database, make_client, seed_animals, measure, print_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--animals", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    _, SessionLocal = create_bench_database()
+    seed_animals(SessionLocal, args.animals)
+    user = SimpleNamespace(id=1, login="bench", email="bench@example.com", is_admin=False)
+    client = make_client(SessionLocal, user=user)
+
+    results = {}
+    for name, url in (("full", "/api/animals/"), ("summary", "/api/animals/summary")):
+        response = client.get(url)
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == args.animals
+        stats = measure(lambda: client.get(url), iterations=args.iterations)
+        stats["payload_bytes"] = len(response.content)
+        results[name] = stats
+
+    results["payload_ratio"] = round(results["summary"]["payload_bytes"] / results["full"]["payload_bytes"], 3)
+    results["speedup_p50"] = round(results["full"]["p50_ms"] / results["summary"]["p50_ms"], 2)
+    print_results(f"Каталог, {args.animals} животных", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Общие утилиты бенчмарков: окружение для импорта приложения без внешних
+сервисов, отдельная SQLite-база, тестовый клиент и замер времени.
+"""
+import os
+import json
+import logging
+import time
+import random
+import statistics
+import tempfile
+
+
+def configure_environment():
+    """
+    Задает переменные окружения, необходимые для импорта приложения.
+    PostgreSQL указывает на недоступный порт, поэтому приложение сразу
+    переключается на резервную SQLite, которую бенчмарк затем подменяет.
+    """
+    defaults = {
+        "POSTGRES_HOST": "127.0.0.1",
+        "POSTGRES_PORT": "1",
+        "POSTGRES_USER": "bench",
+        "POSTGRES_PASSWORD": "bench",
+        "POSTGRES_DB": "bench",
+        "S3_INTERNAL_ENDPOINT": "127.0.0.1:9000",
+        "S3_EXTERNAL_ENDPOINT": "127.0.0.1:9000",
+        "S3_ACCESS_KEY": "bench",
+        "S3_SECRET_KEY": "bench",
+        "S3_BUCKET_NAME": "bench",
+        "S3_USE_SSL": "false",
+        "SMTP_PORT": "587",
+        # Медиафайлы хранятся на диске, чтобы бенчмаркам не требовался MinIO
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_ROOT": os.path.join(tempfile.gettempdir(), "zooracle_bench_storage"),
+        # Замеряется стоимость обработки запросов, а не срабатывание лимитов
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def create_bench_database(path: str = None, url: str = None):
+    """
+    Создает базу бенчмарка со всеми таблицами приложения
+
+    Args:
+        path (str, optional): Путь к файлу SQLite. По умолчанию - временный файл.
+        url (str, optional): URL базы SQLAlchemy (например, локальной PostgreSQL).
+            Существующие таблицы приложения в ней пересоздаются.
+
+    Returns:
+        tuple: (engine, SessionLocal)
+    """
+    configure_environment()
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base, RoutingSession
+    from app import models  # noqa: F401 - регистрирует модели в Base.metadata
+
+    if url is not None:
+        engine = create_engine(url, pool_size=20, max_overflow=20)
+        Base.metadata.drop_all(bind=engine)
+    else:
+        if path is None:
+            path = os.path.join(tempfile.mkdtemp(prefix="zooracle_bench_"), "bench.db")
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+
+def configure_app(SessionLocal, user=None):
+    """
+    Подключает приложение к базе бенчмарка через подмену зависимостей
+
+    Args:
+        SessionLocal: Фабрика сессий базы бенчмарка
+        user: Пользователь, возвращаемый зависимостями авторизации (None - без подмены)
+
+    Returns:
+        FastAPI: Приложение
+    """
+    configure_environment()
+    from app.main import app
+    from app import database
+    from app.services import auth_service
+
+    def get_bench_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[database.get_db] = get_bench_db
+
+    if user is not None:
+        # Все зависимости авторизации получают пользователя из get_principal
+        app.dependency_overrides[auth_service.get_principal] = lambda: user
+    return app
+
+
+def make_client(SessionLocal, user=None):
+    """
+    Создает TestClient приложения, работающий с базой бенчмарка
+
+    Args:
+        SessionLocal: Фабрика сессий базы бенчмарка
+        user: Пользователь, возвращаемый зависимостями авторизации (None - без подмены)
+
+    Returns:
+        TestClient: Клиент для запросов к приложению
+    """
+    from fastapi.testclient import TestClient
+
+    app = configure_app(SessionLocal, user)
+    # Не логируем каждый запрос тестового клиента
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return TestClient(app)
+
+
+def seed_animals(SessionLocal, count: int, description_words: int = 120, seed: int = 42, preview_ids: list = None):
+    """
+    Заполняет базу синтетическими животными
+
+    Args:
+        SessionLocal: Фабрика сессий
+        count (int): Количество животных
+        description_words (int): Количество слов в описании
+        seed (int): Зерно генератора случайных чисел
+        preview_ids (list, optional): ID медиафайлов для превью (по умолчанию - несуществующие ID)
+    """
+    from app.models import Animal, AnimalType, Habitat
+
+    rng = random.Random(seed)
+    words = ["лес", "хищник", "гнездо", "миграция", "стая", "окрас", "питание", "ареал", "потомство", "нора"]
+    db = SessionLocal()
+    try:
+        if db.query(AnimalType).count() == 0:
+            db.add_all([AnimalType(name=f"Тип {i}") for i in range(1, 6)])
+            db.add_all([Habitat(name=f"Среда {i}") for i in range(1, 13)])
+            db.commit()
+        db.bulk_insert_mappings(Animal, [
+            {
+                "name": f"Животное {i}",
+                "animal_type_id": rng.randint(1, 5),
+                "habitat_id": rng.randint(1, 12),
+                "description": " ".join(rng.choice(words) for _ in range(description_words)),
+                "preview_id": rng.choice(preview_ids) if preview_ids else f"{i:08d}-0000-0000-0000-000000000000",
+            }
+            for i in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def measure(fn, iterations: int = 20, warmup: int = 3) -> dict:
+    """
+    Замеряет время выполнения функции
+
+    Args:
+        fn (callable): Замеряемая функция без аргументов
+        iterations (int): Количество замеров
+        warmup (int): Количество прогревочных запусков
+
+    Returns:
+        dict: Статистика в миллисекундах (mean, p50, p95, min, max)
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def print_results(title: str, results: dict):
+    """
+    Печатает результаты бенчмарка в виде JSON
+    """
+    print(f"== {title} ==")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,220 @@
+"""
+Нагрузочный тест HTTP в стиле wrk: заданное число keep-alive соединений в
+течение заданного времени отправляют запросы к одному URL; выводятся
+запросы в секунду, перцентили задержки и ошибки.
+
+Нагрузка на запущенный сервер:
+    python -m benchmarks.http_load --url http://127.0.0.1:8080/api/animal-types/ -c 64 -d 10
+
+Сравнение конфигураций app.server: для каждой конфигурации сервер
+запускается с указанными переменными окружения, прогревается, нагружается
+и останавливается:
+    python -m benchmarks.http_load --compare \\
+        "single=WEB_CONCURRENCY=1,WEB_LOOP=asyncio,WEB_HTTP=h11" \\
+        "single-fast=WEB_CONCURRENCY=1" \\
+        "multi=WEB_CONCURRENCY=4"
+
+Без PostgreSQL каждый воркер использует свою резервную SQLite в памяти.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from .common import configure_environment, print_results
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    """
+    Читает ответ HTTP/1.1 целиком
+
+    Returns:
+        int: Код ответа
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Соединение закрыто сервером")
+    status = int(status_line.split(b" ", 2)[1])
+    length = None
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value.strip())
+        elif name == b"transfer-encoding" and b"chunked" in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _connection(host: str, port: int, request: bytes, deadline: float, stats: dict):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(request)
+            status = await _read_response(reader)
+            stats["latencies"].append(time.perf_counter() - started)
+            if status >= 400:
+                stats["non_2xx"] += 1
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            stats["errors"] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url: str, connections: int, duration: float, headers: list) -> dict:
+    """
+    Нагружает URL заданным числом соединений
+
+    Args:
+        url (str): Адрес (http://host:port/path)
+        connections (int): Количество одновременных соединений
+        duration (float): Длительность в секундах
+        headers (list): Дополнительные заголовки ('Name: value')
+
+    Returns:
+        dict: Запросы в секунду, задержка в миллисекундах, количество ошибок
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path or "/"
+    if parts.query:
+        path += f"?{parts.query}"
+    lines = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc}", "Accept-Encoding: gzip, br", *headers]
+    request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    stats = {"latencies": [], "errors": 0, "non_2xx": 0}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(_connection(host, port, request, deadline, stats) for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats["latencies"])
+    if not latencies:
+        return {"requests": 0, "errors": stats["errors"]}
+
+    def percentile(value: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * value))] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "non_2xx": stats["non_2xx"],
+        "errors": stats["errors"],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60):
+    parts = urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {process.returncode}")
+        try:
+            with socket.create_connection((parts.hostname, parts.port), timeout=1) as sock:
+                sock.sendall(f"GET {parts.path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n\r\n".encode())
+                if sock.recv(12).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError("Сервер не ответил вовремя")
+
+
+def compare(configs: list, path: str, connections: int, duration: float, warmup: float, headers: list) -> dict:
+    """
+    Запускает app.server с каждой конфигурацией и нагружает его
+
+    Args:
+        configs (list): Конфигурации 'имя=ПЕРЕМЕННАЯ=значение,ПЕРЕМЕННАЯ=значение'
+        path (str): Путь нагружаемого маршрута
+
+    Returns:
+        dict: Результаты по именам конфигураций
+    """
+    configure_environment()
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for config in configs:
+        name, _, assignments = config.partition("=")
+        port = _free_port()
+        env = dict(os.environ, PORT=str(port))
+        for assignment in filter(None, assignments.split(",")):
+            key, _, value = assignment.partition("=")
+            env[key.strip()] = value.strip()
+
+        url = f"http://127.0.0.1:{port}{path}"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.server"], cwd=backend_dir, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_ready(url, process)
+            asyncio.run(run_load(url, connections, warmup, headers))
+            results[name] = asyncio.run(run_load(url, connections, duration, headers))
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Адрес запущенного сервера")
+    parser.add_argument("--compare", nargs="+", metavar="CONFIG", help="Конфигурации app.server для сравнения")
+    parser.add_argument("--path", default="/api/animal-types/", help="Путь маршрута в режиме --compare")
+    parser.add_argument("-c", "--connections", type=int, default=64)
+    parser.add_argument("-d", "--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("-H", "--header", action="append", default=[], help="Дополнительный заголовок запроса")
+    args = parser.parse_args()
+
+    if args.compare:
+        results = compare(args.compare, args.path, args.connections, args.duration, args.warmup, args.header)
+        print_results(f"app.server, {args.connections} соединений, {args.duration} с", results)
+    elif args.url:
+        results = asyncio.run(run_load(args.url, args.connections, args.duration, args.header))
+        print_results(f"{args.url}, {args.connections} соединений, {args.duration} с", results)
+    else:
+        parser.error("укажите --url или --compare")
+
+
+if __name__ == "__main__":
+    main()
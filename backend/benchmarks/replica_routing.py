@@ -0,0 +1,90 @@
+"""
+Проверка чтения с реплик: основная БД и реплика - два файла SQLite.
+
+Реплика создается копией основной базы и дальше не обновляется, поэтому
+по ответам видно, откуда прочитаны данные. Проверяется, что:
+- GET-маршруты каталога читают с реплики;
+- изменяющие запросы выполняются на основной БД;
+- после своего изменения (добавление в избранное) клиент читает с основной
+  БД - по cookie и, для клиента без cookie, по ID пользователя;
+- по истечении REPLICA_STICKY_SECONDS чтения снова идут на реплику.
+
+Скрипт завершается с кодом 1, если хотя бы одна проверка не прошла.
+
+Запуск: python -m benchmarks.replica_routing
+"""
+import argparse
+import os
+import shutil
+import sys
+
+from .common import create_bench_database, make_client, seed_animals, print_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--animals", type=int, default=50)
+    args = parser.parse_args()
+
+    engine, SessionLocal = create_bench_database()
+    seed_animals(SessionLocal, args.animals)
+
+    from sqlalchemy import create_engine, event
+    from app.models import User
+    from app import database, replicas
+    from app.services.auth_service import create_token_pair
+
+    db = SessionLocal()
+    user = User(login="bench", email="bench@example.com", password="-", is_admin=False)
+    db.add(user)
+    db.commit()
+    token = create_token_pair(user)["access_token"]
+    db.close()
+
+    primary_path = engine.url.database
+    replica_path = os.path.join(os.path.dirname(primary_path), "replica.db")
+    shutil.copyfile(primary_path, replica_path)
+    replica = create_engine(f"sqlite:///{replica_path}", connect_args={"check_same_thread": False})
+    database.replica_engines[:] = [replica]
+
+    queries = {"primary": 0, "replica": 0}
+    event.listen(engine, "before_cursor_execute", lambda *a: queries.__setitem__("primary", queries["primary"] + 1))
+    event.listen(replica, "before_cursor_execute", lambda *a: queries.__setitem__("replica", queries["replica"] + 1))
+
+    def count(method, url, client, **kwargs):
+        queries.update(primary=0, replica=0)
+        response = client.request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+        assert response.status_code < 400, response.text
+        return response, dict(queries)
+
+    client = make_client(SessionLocal)
+    results = {}
+    checks = {}
+
+    _, results["catalog"] = count("GET", "/api/animals/summary", client)
+    # Пользователь может быть загружен с основной БД, если авторизация выполнилась раньше get_read_db
+    checks["catalog_from_replica"] = results["catalog"]["primary"] <= 1 and results["catalog"]["replica"] > 0
+
+    _, results["add_favorite"] = count("POST", "/api/animals/favorites/", client, json={"animal_id": 1})
+    checks["write_to_primary"] = results["add_favorite"]["replica"] == 0 and results["add_favorite"]["primary"] > 0
+
+    response, results["favorites_cookie"] = count("GET", "/api/animals/favorites/", client)
+    checks["sticky_by_cookie"] = results["favorites_cookie"]["replica"] == 0 and len(response.json()) == 1
+
+    client.cookies.clear()
+    response, results["favorites_user"] = count("GET", "/api/animals/favorites/", client)
+    checks["sticky_by_user"] = results["favorites_user"]["replica"] == 0 and len(response.json()) == 1
+
+    replicas._sticky_users.clear()
+    response, results["favorites_after_window"] = count("GET", "/api/animals/favorites/", client)
+    # Реплика не обновлялась, поэтому избранное на ней пустое
+    checks["replica_after_window"] = results["favorites_after_window"]["primary"] == 0 and response.json() == []
+
+    results["checks"] = checks
+    print_results("Чтение с реплик", results)
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
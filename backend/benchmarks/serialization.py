@@ -0,0 +1,74 @@
+"""
+Микробенчмарк сериализации списка животных (10 000 ORM-объектов по умолчанию).
+
+Сравниваются:
+- legacy:     from_orm-модели -> jsonable_encoder -> json.dumps (прежний путь FastAPI)
+- fastapi_v2: TypeAdapter.dump_python(mode="json") -> json.dumps (JSONResponse)
+- orjson:     TypeAdapter.dump_python(mode="json") -> orjson.dumps (ORJSONResponse)
+- dump_json:  TypeAdapter.validate_python -> dump_json сразу в байты (app.serialization)
+
+Запуск: python -m benchmarks.serialization [--animals 10000] [--iterations 20]
+"""
+import argparse
+import json
+
+from .common import create_bench_database, seed_animals, measure, print_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--animals", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    _, SessionLocal = create_bench_database()
+    seed_animals(SessionLocal, args.animals)
+
+    import orjson
+    from fastapi.encoders import jsonable_encoder
+    from app.models import Animal
+    from app.schemas import AnimalResponse
+    from app.serialization import animal_list_adapter, dump_json
+
+    db = SessionLocal()
+    animals = db.query(Animal).order_by(Animal.id).all()
+
+    def legacy():
+        models = [AnimalResponse.model_validate(a) for a in animals]
+        return json.dumps(jsonable_encoder(models), ensure_ascii=False).encode("utf-8")
+
+    def fastapi_v2():
+        value = animal_list_adapter.validate_python(animals, from_attributes=True)
+        return json.dumps(animal_list_adapter.dump_python(value, mode="json"), ensure_ascii=False).encode("utf-8")
+
+    def orjson_path():
+        value = animal_list_adapter.validate_python(animals, from_attributes=True)
+        return orjson.dumps(animal_list_adapter.dump_python(value, mode="json"))
+
+    def typeadapter_dump_json():
+        return dump_json(animal_list_adapter, animals)
+
+    strategies = {
+        "legacy": legacy,
+        "fastapi_v2": fastapi_v2,
+        "orjson": orjson_path,
+        "dump_json": typeadapter_dump_json,
+    }
+
+    # Все стратегии должны давать одинаковые данные
+    reference = json.loads(legacy())
+    results = {}
+    for name, fn in strategies.items():
+        assert json.loads(fn()) == reference, name
+        results[name] = measure(fn, iterations=args.iterations)
+
+    baseline = results["legacy"]["p50_ms"]
+    for name in strategies:
+        results[name]["speedup_vs_legacy"] = round(baseline / results[name]["p50_ms"], 2)
+
+    db.close()
+    print_results(f"Сериализация {args.animals} животных", results)
+
+
+if __name__ == "__main__":
+    main()
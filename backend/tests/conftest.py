@@ -0,0 +1,51 @@
+"""
+Общие настройки тестов бэкенда.
+
+Переменные окружения задаются до импорта приложения: PostgreSQL указывает на
+недоступный порт, поэтому приложение переключается на резервную SQLite,
+медиафайлы хранятся на диске.
+
+Запуск (из каталога backend): python -m pytest
+"""
+import pytest
+
+from benchmarks.common import configure_app, configure_environment, create_bench_database
+
+configure_environment()
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    Фабрика сессий временной базы SQLite. Внешние ключи проверяются, как в PostgreSQL.
+    """
+    from sqlalchemy import event
+
+    engine, SessionLocal = create_bench_database(str(tmp_path / "test.db"))
+    event.listen(engine, "connect", _enable_foreign_keys)
+    # Соединения, открытые при создании таблиц, открыты без PRAGMA
+    engine.dispose()
+    yield SessionLocal
+    engine.dispose()
+
+
+@pytest.fixture
+def client_factory(session_factory):
+    """
+    Создает TestClient приложения, работающий с временной базой.
+    С user зависимости авторизации возвращают этого пользователя, без него -
+    авторизация выполняется по заголовку Authorization.
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    def factory(user=None):
+        app.dependency_overrides.clear()
+        return TestClient(configure_app(session_factory, user))
+
+    yield factory
+    app.dependency_overrides.clear()
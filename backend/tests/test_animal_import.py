@@ -0,0 +1,91 @@
+import hashlib
+import io
+import json
+import queue
+import zipfile
+
+import pytest
+
+from app.models import Animal, AnimalPhoto, MediaObject, VideoTranscodeJob
+from app.services import media_processing_service as processing
+from app.services import video_transcoding_service as transcoding
+from app.services.auth_service import Principal
+from app.services.storage import get_storage
+
+ADMIN = Principal(id=1, login="admin", email="admin@example.com", is_admin=True)
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x01" * 2048
+MP4 = b"\x00\x00\x00\x18ftypmp42" + b"\x02" * 2048
+
+
+@pytest.fixture
+def queues(monkeypatch):
+    """
+    Пустые очереди обработки медиа и перекодирования
+    """
+    monkeypatch.setattr(processing, "_file_queue", queue.Queue())
+    monkeypatch.setattr(transcoding, "_job_queue", queue.Queue())
+    processing._queued.clear()
+    transcoding._queued.clear()
+    yield
+    processing._queued.clear()
+    transcoding._queued.clear()
+
+
+def run_import(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as target:
+        target.writestr("preview.jpg", JPEG)
+        # То же содержимое под другим именем
+        target.writestr("photos/copy.jpg", JPEG)
+        target.writestr("video.mp4", MP4)
+    manifest = json.dumps({
+        "name": "Животное", "description": "-",
+        "preview": "preview.jpg", "photos": ["photos/copy.jpg"], "video": "video.mp4"
+    })
+    response = client.post("/api/animals/import", files={
+        "manifest": ("animals.ndjson", manifest.encode("utf-8")),
+        "media": ("media.zip", archive.getvalue()),
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["failed_rows"] == 0
+    return response.json()
+
+
+def test_archive_media_is_content_addressed_and_registered(session_factory, client_factory, queues):
+    image_id = hashlib.sha256(JPEG).hexdigest()
+    video_id = hashlib.sha256(MP4).hexdigest()
+    client = client_factory(ADMIN)
+
+    report = run_import(client)
+
+    assert report["videos_queued"] == 1
+    db = session_factory()
+    try:
+        animal = db.query(Animal).one()
+        assert (animal.preview_id, animal.video_id) == (image_id, video_id)
+        assert [photo.photo_id for photo in db.query(AnimalPhoto)] == [image_id]
+        objects = {media.file_id: media.object_name for media in db.query(MediaObject)}
+        assert objects == {image_id: f"images/{image_id}.jpg", video_id: f"videos/{video_id}.mp4"}
+    finally:
+        db.close()
+    assert all(get_storage().exists(object_name) for object_name in objects.values())
+    assert sorted(processing._queued) == sorted([image_id, video_id])
+
+
+def test_reimported_archive_is_deduplicated(session_factory, client_factory, queues):
+    client = client_factory(ADMIN)
+    run_import(client)
+    processing._queued.clear()
+
+    report = run_import(client)
+
+    assert report["videos_queued"] == 0
+    assert not processing._queued
+    db = session_factory()
+    try:
+        assert db.query(Animal).count() == 2
+        assert db.query(MediaObject).count() == 2
+        assert db.query(VideoTranscodeJob).count() == 1
+    finally:
+        db.close()
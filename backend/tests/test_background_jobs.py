@@ -0,0 +1,178 @@
+import importlib
+import queue
+import stat
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import MediaObject, VideoTranscodeJob
+from app.services import media_processing_service as processing
+from app.services import video_transcoding_service as transcoding
+
+
+@pytest.fixture
+def jobs_db(session_factory, monkeypatch):
+    """
+    Фоновые задачи работают с временной базой; очереди процесса пустые
+    """
+    for module in (transcoding, processing):
+        monkeypatch.setattr(module, "SessionLocal", session_factory)
+    monkeypatch.setattr(transcoding, "_job_queue", queue.Queue())
+    monkeypatch.setattr(processing, "_file_queue", queue.Queue())
+    for collection in (transcoding._queued, transcoding._active_jobs, processing._queued, processing._active_files):
+        collection.clear()
+    yield session_factory
+    transcoding._stop_event.clear()
+    processing._stop_event.clear()
+
+
+def add_job(session_factory, status: str, updated_at: datetime = None, claim_token: str = None) -> int:
+    db = session_factory()
+    job = VideoTranscodeJob(
+        video_id="video", source_object="videos/video.mp4", status=status, progress=50.0,
+        claim_token=claim_token, updated_at=updated_at or datetime.utcnow()
+    )
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+    return job_id
+
+
+def job_status(session_factory, job_id: int) -> str:
+    db = session_factory()
+    try:
+        return db.get(VideoTranscodeJob, job_id).status
+    finally:
+        db.close()
+
+
+def test_requeue_picks_up_stale_jobs_once(jobs_db):
+    stale = add_job(jobs_db, transcoding.STATUS_PROCESSING, datetime.utcnow() - timedelta(hours=1))
+    running = add_job(jobs_db, transcoding.STATUS_PROCESSING)
+    pending = add_job(jobs_db, transcoding.STATUS_PENDING)
+
+    transcoding.requeue_pending_jobs()
+    transcoding.requeue_pending_jobs()
+
+    assert job_status(jobs_db, stale) == transcoding.STATUS_PENDING
+    assert job_status(jobs_db, running) == transcoding.STATUS_PROCESSING
+    queued = [transcoding._job_queue.get_nowait() for _ in range(transcoding._job_queue.qsize())]
+    assert queued == [stale, pending]
+
+
+def test_interrupted_job_returns_to_pending(jobs_db, monkeypatch):
+    job_id = add_job(jobs_db, transcoding.STATUS_PENDING)
+
+    class Storage:
+        def download_to_file(self, object_name, path):
+            pass
+
+    def interrupted(*args):
+        raise transcoding.JobInterrupted("остановка")
+
+    monkeypatch.setattr(transcoding, "get_storage", Storage)
+    monkeypatch.setattr(transcoding, "probe_video", lambda path: {"duration": 1.0, "width": 640, "height": 360, "codec": "h264"})
+    monkeypatch.setattr(transcoding, "_run_ffmpeg_rendition", interrupted)
+
+    transcoding.process_job(job_id)
+
+    assert job_status(jobs_db, job_id) == transcoding.STATUS_PENDING
+    assert not transcoding._active_jobs
+
+
+def test_heartbeat_refreshes_job_during_download(jobs_db, monkeypatch):
+    job_id = add_job(jobs_db, transcoding.STATUS_PENDING)
+    monkeypatch.setattr(transcoding, "HEARTBEAT_SECONDS", 0.05)
+    seen = {}
+
+    class Storage:
+        def download_to_file(self, object_name, path):
+            # Долгое скачивание: прогресс не пишется, но задача не должна выглядеть прерванной
+            db = jobs_db()
+            started = db.get(VideoTranscodeJob, job_id).updated_at
+            db.close()
+            time.sleep(0.3)
+            db = jobs_db()
+            seen["refreshed"] = db.get(VideoTranscodeJob, job_id).updated_at > started
+            db.close()
+            raise RuntimeError("обрыв соединения")
+
+    monkeypatch.setattr(transcoding, "get_storage", Storage)
+
+    transcoding.process_job(job_id)
+
+    assert seen["refreshed"]
+    assert job_status(jobs_db, job_id) == transcoding.STATUS_FAILED
+
+
+def test_reclaimed_job_is_not_overwritten(jobs_db, monkeypatch):
+    job_id = add_job(jobs_db, transcoding.STATUS_PENDING)
+
+    class Storage:
+        def download_to_file(self, object_name, path):
+            # Пока шло скачивание, задачу признали прерванной и захватил другой процесс
+            db = jobs_db()
+            db.query(VideoTranscodeJob).filter(VideoTranscodeJob.id == job_id).update(
+                {"status": transcoding.STATUS_PENDING}
+            )
+            db.commit()
+            assert transcoding._claim_job(db, job_id)
+            db.close()
+            raise RuntimeError("обрыв соединения")
+
+    monkeypatch.setattr(transcoding, "get_storage", Storage)
+
+    transcoding.process_job(job_id)
+
+    assert job_status(jobs_db, job_id) == transcoding.STATUS_PROCESSING
+
+
+def test_stop_interrupts_running_ffmpeg(jobs_db, monkeypatch, tmp_path):
+    # ffmpeg, который пишет прогресс и не завершается сам
+    fake_ffmpeg = tmp_path / "ffmpeg"
+    fake_ffmpeg.write_text("#!/bin/sh\nwhile true; do echo out_time_us=1000000; sleep 0.1; done\n")
+    fake_ffmpeg.chmod(fake_ffmpeg.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(transcoding, "FFMPEG_BINARY", str(fake_ffmpeg))
+    transcoding._stop_event.set()
+
+    with pytest.raises(transcoding.JobInterrupted):
+        transcoding._run_ffmpeg_rendition("source.mp4", str(tmp_path / "360p"), transcoding.RENDITIONS[0], 10.0, lambda fraction: None)
+
+
+def test_stop_releases_active_jobs(jobs_db):
+    job_id = add_job(jobs_db, transcoding.STATUS_PROCESSING, claim_token="token")
+    transcoding._active_jobs[job_id] = "token"
+
+    transcoding.stop_workers()
+
+    assert job_status(jobs_db, job_id) == transcoding.STATUS_PENDING
+
+
+def test_stop_releases_active_media(jobs_db):
+    db = jobs_db()
+    db.add(MediaObject(
+        file_id="image", object_name="images/image.jpg", size=1, content_type="image/jpeg",
+        uploaded_at=datetime.utcnow(), processing_status=processing.STATUS_PROCESSING
+    ))
+    db.commit()
+    db.close()
+    processing._active_files.add("image")
+
+    processing.stop_workers()
+
+    db = jobs_db()
+    try:
+        assert db.get(MediaObject, "image").processing_status == processing.STATUS_PENDING
+    finally:
+        db.close()
+
+
+def test_workers_are_not_recycled_by_default(monkeypatch):
+    from app import server
+
+    monkeypatch.delenv("WEB_MAX_REQUESTS", raising=False)
+    importlib.reload(server)
+
+    assert server.build_options()["max_requests"] == 0
@@ -0,0 +1,83 @@
+"""
+Каждый запрос к API должен занимать не больше одного соединения из пула
+одновременно: зависимости авторизации и обработчик используют одну сессию запроса.
+"""
+import pytest
+from sqlalchemy import event
+
+from app.models import AnswerOption, Question, QuestionAnswer, QuestionType, Test, TestQuestion, User
+from app.services.auth_service import create_token_pair
+from benchmarks.common import seed_animals
+
+ANSWERS = {"answers": [{"question_id": 1, "text_answer": "ответ"}]}
+
+REQUESTS = [
+    ("GET", "/api/animals/", None),
+    ("GET", "/api/animals/summary", None),
+    ("GET", "/api/animals/favorites/", None),
+    ("GET", "/api/tests/", None),
+    ("GET", "/api/tests/1", None),
+    ("GET", "/api/tests/1/questions", None),
+    ("POST", "/api/tests/1/check", ANSWERS),
+    ("POST", "/api/tests/1/attempts", ANSWERS),
+    ("GET", "/api/questions/questions/types", None),
+    ("GET", "/api/test-scores/", None),
+    ("GET", "/api/test-scores/leaderboard/1", None),
+]
+
+
+class PoolUsage:
+    """
+    Счетчик одновременно выданных пулом соединений
+    """
+
+    def __init__(self, engine):
+        self.checked_out = 0
+        self.peak = 0
+        event.listen(engine, "checkout", self._checkout)
+        event.listen(engine, "checkin", self._checkin)
+
+    def _checkout(self, *args):
+        self.checked_out += 1
+        self.peak = max(self.peak, self.checked_out)
+
+    def _checkin(self, *args):
+        self.checked_out -= 1
+
+    def reset(self):
+        self.peak = self.checked_out
+
+
+@pytest.fixture
+def token(session_factory):
+    """
+    Токен администратора; в базе есть животные и тест с вопросом
+    """
+    seed_animals(session_factory, 20)
+    db = session_factory()
+    user = User(login="admin", email="admin@example.com", password="-", is_admin=True)
+    db.add_all([
+        user,
+        QuestionType(id=1, name="Текстовый ответ"),
+        Test(id=1, name="Тест"),
+        Question(id=1, name="Вопрос", question_type_id=1),
+        AnswerOption(id=1, name="ответ", is_correct=True),
+    ])
+    db.flush()
+    db.add_all([QuestionAnswer(question_id=1, answer_id=1), TestQuestion(test_id=1, question_id=1)])
+    db.commit()
+    token = create_token_pair(user)["access_token"]
+    db.close()
+    return token
+
+
+@pytest.mark.parametrize("method, url, body", REQUESTS)
+def test_request_uses_at_most_one_connection(session_factory, client_factory, token, method, url, body):
+    # Без подмены пользователя: зависимости авторизации обращаются к БД
+    client = client_factory()
+    usage = PoolUsage(session_factory.kw["bind"])
+
+    response = client.request(method, url, json=body, headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200, response.text
+    assert usage.peak <= 1
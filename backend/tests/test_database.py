@@ -0,0 +1,21 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app import database
+
+
+def test_add_missing_columns_upgrades_sqlite_table(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        # Таблица tests в том виде, в котором она была до появления revision и updated_at
+        connection.execute(text("CREATE TABLE tests (id INTEGER PRIMARY KEY, name VARCHAR)"))
+        connection.execute(text("INSERT INTO tests (id, name) VALUES (1, 'Тест')"))
+    monkeypatch.setattr(database, "engine", engine)
+
+    database.add_missing_columns()
+
+    columns = {column["name"] for column in inspect(engine).get_columns("tests")}
+    assert {"revision", "updated_at"} <= columns
+    with engine.connect() as connection:
+        revision, updated_at = connection.execute(text("SELECT revision, updated_at FROM tests WHERE id = 1")).one()
+    assert revision == 1
+    assert updated_at is not None
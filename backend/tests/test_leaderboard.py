@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import (
+    Animal, AnswerOption, Question, QuestionAnswer, QuestionType, Test, TestLeaderboardEntry,
+    TestLeaderboardState, TestQuestion, TestScore, User
+)
+from app.services import leaderboard_service
+from app.services.auth_service import Principal
+
+ADMIN = Principal(id=1, login="admin", email="admin@example.com", is_admin=True)
+
+
+@pytest.fixture
+def scored_test(session_factory, client_factory):
+    """
+    Тест животного с одним вопросом, по которому администратор уже получил результат
+    """
+    db = session_factory()
+    db.add_all([
+        User(id=ADMIN.id, login=ADMIN.login, email=ADMIN.email, password="-", is_admin=True),
+        QuestionType(id=1, name="Текстовый ответ"),
+        Test(id=1, name="Тест"),
+        Question(id=1, name="Вопрос", question_type_id=1),
+        AnswerOption(id=1, name="ответ", is_correct=True),
+    ])
+    db.flush()
+    db.add_all([
+        QuestionAnswer(question_id=1, answer_id=1),
+        TestQuestion(test_id=1, question_id=1),
+        Animal(id=1, name="Животное", description="-", test_id=1),
+    ])
+    db.commit()
+    db.close()
+
+    client = client_factory(ADMIN)
+    response = client.post("/api/tests/1/attempts", json={
+        "answers": [{"question_id": 1, "text_answer": "ответ"}]
+    })
+    assert response.status_code < 400, response.text
+    # Рейтинг загружен в память воркера
+    assert client.get("/api/test-scores/leaderboard/1").json()["total_participants"] == 1
+    return client
+
+
+def assert_leaderboard_deleted(session_factory, client):
+    db = session_factory()
+    try:
+        assert db.query(TestLeaderboardEntry).count() == 0
+        assert db.query(TestLeaderboardState).count() == 0
+    finally:
+        db.close()
+    assert 1 not in leaderboard_service._boards
+    assert client.get("/api/test-scores/leaderboard/1").json()["total_participants"] == 0
+
+
+def test_delete_test_with_leaderboard(session_factory, scored_test):
+    response = scored_test.delete("/api/tests/1")
+
+    assert response.status_code == 204, response.text
+    assert_leaderboard_deleted(session_factory, scored_test)
+
+
+def test_delete_animal_with_scored_test(session_factory, scored_test):
+    response = scored_test.delete("/api/animals/1")
+
+    assert response.status_code == 200, response.text
+    db = session_factory()
+    try:
+        assert db.get(Test, 1) is None
+    finally:
+        db.close()
+    assert_leaderboard_deleted(session_factory, scored_test)
+
+
+def test_reported_score_is_validated(scored_test):
+    for correct, total in ((1000, 1), (-1, 5), (0, 0)):
+        response = scored_test.post("/api/test-scores/", json={
+            "test_id": 1, "correct_answers": correct, "total_questions": total
+        })
+        assert response.status_code == 422, response.text
+
+
+def test_reported_score_does_not_enter_leaderboard(session_factory, client_factory, scored_test):
+    other = Principal(id=2, login="user", email="user@example.com", is_admin=False)
+    db = session_factory()
+    db.add(User(id=other.id, login=other.login, email=other.email, password="-", is_admin=False))
+    db.commit()
+    db.close()
+    client = client_factory(other)
+
+    response = client.post("/api/test-scores/", json={"test_id": 1, "correct_answers": 1, "total_questions": 1})
+
+    assert response.status_code == 200, response.text
+    assert client.get("/api/test-scores/leaderboard/1").json()["total_participants"] == 1
+    assert client.get("/api/test-scores/leaderboard/1/me").status_code == 404
+
+
+def test_backfill_skips_invalid_scores(session_factory):
+    db = session_factory()
+    db.add_all([
+        User(id=1, login="first", email="first@example.com", password="-", is_admin=False),
+        User(id=2, login="second", email="second@example.com", password="-", is_admin=False),
+        Test(id=1, name="Тест"),
+    ])
+    db.flush()
+    db.add_all([
+        TestScore(user_id=1, test_id=1, score="1000/1", date=datetime.utcnow()),
+        TestScore(user_id=1, test_id=1, score="3/0", date=datetime.utcnow()),
+        TestScore(user_id=2, test_id=1, score="-2/4", date=datetime.utcnow()),
+        TestScore(user_id=2, test_id=1, score="3/4", date=datetime.utcnow()),
+    ])
+    db.commit()
+
+    try:
+        assert leaderboard_service.backfill_from_scores(db) == 1
+        entries = db.query(TestLeaderboardEntry).all()
+        assert [(entry.user_id, entry.score_percentage) for entry in entries] == [(2, 75)]
+    finally:
+        db.close()
@@ -0,0 +1,145 @@
+import io
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.models import MediaObject
+from app.services import media_cache as media_cache_module
+from app.services.media_cache import MediaCache
+from app.services.storage import ObjectInfo, get_storage
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 1024
+
+
+@pytest.fixture
+def storage():
+    storage = get_storage()
+    storage.ensure_ready()
+    return storage
+
+
+@pytest.fixture
+def stat_calls(storage, monkeypatch):
+    """
+    Имена объектов, по которым get_media обращался к хранилищу
+    """
+    calls = []
+    stat = storage.stat
+
+    def counting_stat(object_name):
+        calls.append(object_name)
+        return stat(object_name)
+
+    monkeypatch.setattr(storage, "stat", counting_stat)
+    return calls
+
+
+def put_object(storage, object_name: str, data: bytes = JPEG):
+    storage.put_stream(io.BytesIO(data), len(data), object_name, "image/jpeg")
+
+
+def test_registered_media_is_served_with_one_storage_lookup(session_factory, client_factory, storage, stat_calls):
+    file_id = uuid.uuid4().hex
+    object_name = f"images/{file_id}.png"
+    put_object(storage, object_name)
+    db = session_factory()
+    db.add(MediaObject(
+        file_id=file_id, object_name=object_name, size=len(JPEG), content_type="image/jpeg",
+        uploaded_at=datetime.utcnow(), processing_status="completed"
+    ))
+    db.commit()
+    db.close()
+
+    response = client_factory().get(f"/api/media/{file_id}")
+
+    assert response.status_code == 200
+    assert response.content == JPEG
+    assert stat_calls == [object_name]
+
+
+def test_legacy_media_is_found_by_probing(client_factory, storage, stat_calls):
+    file_id = str(uuid.uuid4())
+    put_object(storage, f"videos/{file_id}.mp4")
+
+    response = client_factory().get(f"/api/media/{file_id}")
+
+    assert response.status_code == 200
+    assert stat_calls[-1] == f"videos/{file_id}.mp4"
+
+
+def test_unknown_media_returns_404(client_factory, stat_calls):
+    response = client_factory().get(f"/api/media/{uuid.uuid4()}")
+
+    assert response.status_code == 404
+    assert len(stat_calls) == 12
+
+
+@pytest.mark.parametrize("processing_status, cache_control", [
+    ("pending", "no-store"),
+    ("processing", "no-store"),
+    ("failed", "no-store"),
+    ("completed", "public, max-age=31536000, immutable"),
+])
+def test_media_is_immutable_only_after_processing(session_factory, client_factory, storage, processing_status, cache_control):
+    file_id = uuid.uuid4().hex
+    object_name = f"images/{file_id}.jpg"
+    put_object(storage, object_name)
+    db = session_factory()
+    db.add(MediaObject(
+        file_id=file_id, object_name=object_name, size=len(JPEG), content_type="image/jpeg",
+        uploaded_at=datetime.utcnow(), processing_status=processing_status
+    ))
+    db.commit()
+    db.close()
+
+    response = client_factory().get(f"/api/media/{file_id}")
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == cache_control
+
+
+def register_media(session_factory, storage, data: bytes = JPEG) -> str:
+    file_id = uuid.uuid4().hex
+    object_name = f"images/{file_id}.jpg"
+    put_object(storage, object_name, data)
+    db = session_factory()
+    db.add(MediaObject(
+        file_id=file_id, object_name=object_name, size=len(data), content_type="image/jpeg",
+        uploaded_at=datetime.utcnow(), processing_status="completed"
+    ))
+    db.commit()
+    db.close()
+    return file_id
+
+
+def test_media_cache_limit_is_shared_between_workers(tmp_path):
+    class Storage:
+        def download_to_file(self, object_name, path):
+            with open(path, "wb") as target:
+                target.write(b"x" * 100)
+
+    # Два воркера с общим каталогом кэша
+    workers = [MediaCache(str(tmp_path), 300, 100) for _ in range(2)]
+    for index in range(10):
+        info = ObjectInfo(f"images/{index}.jpg", 100, "image/jpeg", str(index), None)
+        assert workers[index % 2].get_path(Storage(), info)
+
+    sizes = [path.stat().st_size for path in tmp_path.rglob("*.jpg")]
+    assert sum(sizes) <= 300
+
+
+def test_evicted_cache_file_is_served_from_storage(session_factory, client_factory, storage, monkeypatch, tmp_path):
+    file_id = register_media(session_factory, storage)
+    # Объект как будто лежит в S3, а файл кэша уже вытеснил другой воркер
+    monkeypatch.setattr(storage, "local_path", lambda object_name: None)
+    monkeypatch.setattr(media_cache_module.media_cache, "get_path", lambda storage, info: str(tmp_path / "evicted.jpg"))
+
+    client = client_factory()
+    response = client.get(f"/api/media/{file_id}")
+    partial = client.get(f"/api/media/{file_id}", headers={"Range": "bytes=0-3"})
+
+    assert response.status_code == 200
+    assert response.content == JPEG
+    assert partial.status_code == 206
+    assert partial.content == JPEG[:4]
@@ -0,0 +1,23 @@
+from app.services.auth_service import Principal
+
+ADMIN = Principal(id=1, login="admin", email="admin@example.com", is_admin=True)
+USER = Principal(id=2, login="user", email="user@example.com", is_admin=False)
+
+
+def test_metrics_require_authentication(client_factory):
+    response = client_factory().get("/api/metrics")
+
+    assert response.status_code == 401
+
+
+def test_metrics_forbidden_for_regular_users(client_factory):
+    response = client_factory(USER).get("/api/metrics")
+
+    assert response.status_code == 403
+
+
+def test_metrics_available_to_admins(client_factory):
+    response = client_factory(ADMIN).get("/api/metrics")
+
+    assert response.status_code == 200
+    assert isinstance(response.json(), dict)
@@ -0,0 +1,32 @@
+import io
+
+from app.services.scratch_space import ScratchSpace
+
+
+def test_release_frees_only_charged_space(tmp_path):
+    scratch = ScratchSpace(str(tmp_path), 1024, 3600)
+
+    with scratch.file(suffix=".bin") as path:
+        scratch.write_stream(io.BytesIO(b"x" * 100), path)
+        # Каталог, в который пишут в обход квоты (как ffmpeg в каталог перекодирования)
+        work_dir = scratch.mkdtemp(prefix="work-")
+        with open(f"{work_dir}/segment.ts", "wb") as target:
+            target.write(b"y" * 300)
+        scratch.release(work_dir)
+
+        # Место, занятое загрузкой, все еще учтено
+        assert scratch._usage == 100
+
+    assert scratch._usage == 0
+
+
+def test_sweep_charges_uncounted_contents_to_their_directory(tmp_path):
+    scratch = ScratchSpace(str(tmp_path), 1024, 3600)
+    work_dir = scratch.mkdtemp(prefix="work-")
+    with open(f"{work_dir}/segment.ts", "wb") as target:
+        target.write(b"y" * 300)
+
+    assert scratch.sweep()["usage_bytes"] == 300
+    scratch.release(work_dir)
+
+    assert scratch._usage == 0
@@ -0,0 +1,74 @@
+import pytest
+
+from app.models import User
+from app.services.auth_service import ACCESS_TOKEN_EXPIRE_MINUTES, create_token_pair, decode_token
+from app.services import token_revocation
+from app.services.token_revocation import revocation_state
+
+
+@pytest.fixture
+def user_tokens(session_factory):
+    """
+    Пользователь и выданная ему пара токенов
+    """
+    revocation_state.reset({})
+    db = session_factory()
+    user = User(id=1, login="user", email="user@example.com", password="-", is_admin=False, token_version=0)
+    db.add(user)
+    db.commit()
+    tokens = create_token_pair(user)
+    db.close()
+    yield tokens
+    revocation_state.reset({})
+
+
+def refresh(client, refresh_token):
+    return client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def bearer(tokens) -> dict:
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_filter_window_matches_access_token_lifetime():
+    assert token_revocation.REVOCATION_WINDOW == ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+
+def test_refresh_rotation_does_not_fill_access_token_filter(client_factory, user_tokens):
+    client = client_factory()
+    tokens = user_tokens
+    spent = []
+    for _ in range(5):
+        spent.append(decode_token(tokens["refresh_token"], "refresh")["jti"])
+        response = refresh(client, tokens["refresh_token"])
+        assert response.status_code == 200, response.text
+        tokens = response.json()
+
+    assert not any(revocation_state.may_be_revoked(jti) for jti in spent)
+    assert client.get("/api/test-scores/", headers=bearer(tokens)).status_code == 200
+
+
+def test_refresh_token_reuse_revokes_all_sessions(client_factory, user_tokens):
+    client = client_factory()
+    rotated = refresh(client, user_tokens["refresh_token"]).json()
+
+    response = refresh(client, user_tokens["refresh_token"])
+
+    assert response.status_code == 401
+    # Токены, выданные при ротации, тоже отозваны
+    assert refresh(client, rotated["refresh_token"]).status_code == 401
+    assert client.get("/api/test-scores/", headers=bearer(rotated)).status_code == 401
+
+
+def test_logout_revokes_access_and_refresh_tokens(client_factory, user_tokens):
+    client = client_factory()
+
+    response = client.post(
+        "/api/auth/logout", json={"refresh_token": user_tokens["refresh_token"]}, headers=bearer(user_tokens)
+    )
+
+    assert response.status_code == 200
+    assert client.get("/api/test-scores/", headers=bearer(user_tokens)).status_code == 401
+    assert refresh(client, user_tokens["refresh_token"]).status_code == 401
+    refresh_jti = decode_token(user_tokens["refresh_token"], "refresh")["jti"]
+    assert not revocation_state.may_be_revoked(refresh_jti)
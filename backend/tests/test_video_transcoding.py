@@ -0,0 +1,105 @@
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from app.services import video_transcoding_service as transcoding
+from app.services.video_transcoding_service import (
+    HLS_SEGMENT_SECONDS,
+    RENDITIONS,
+    probe_video,
+    select_renditions,
+    write_master_playlist,
+)
+
+requires_ffmpeg = pytest.mark.skipif(
+    shutil.which(transcoding.FFMPEG_BINARY) is None or shutil.which(transcoding.FFPROBE_BINARY) is None,
+    reason="ffmpeg/ffprobe не установлены"
+)
+
+
+def make_clip(path, seconds: float, fps: int, size: str = "320x180"):
+    """
+    Генерирует короткий ролик с тестовой картинкой и тоном
+    """
+    subprocess.run(
+        [
+            transcoding.FFMPEG_BINARY, "-y", "-nostdin", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size={size}:rate={fps}",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-shortest",
+            str(path),
+        ],
+        check=True
+    )
+    return str(path)
+
+
+def test_select_renditions_does_not_upscale():
+    assert select_renditions(720) == RENDITIONS[:2]
+    assert select_renditions(2160) == RENDITIONS
+
+
+def test_select_renditions_keeps_lowest_quality_for_small_sources():
+    assert select_renditions(240) == RENDITIONS[:1]
+
+
+def test_write_master_playlist(tmp_path):
+    path = write_master_playlist(str(tmp_path), RENDITIONS[:2], 1280, 720)
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[:2] == ["#EXTM3U", "#EXT-X-VERSION:3"]
+    assert lines[2] == "#EXT-X-STREAM-INF:BANDWIDTH=896000,RESOLUTION=640x360"
+    assert lines[3] == "360p/index.m3u8"
+    assert lines[4] == "#EXT-X-STREAM-INF:BANDWIDTH=2928000,RESOLUTION=1280x720"
+    assert lines[5] == "720p/index.m3u8"
+
+
+def test_write_master_playlist_without_source_size(tmp_path):
+    path = write_master_playlist(str(tmp_path), RENDITIONS[:1], 0, 0)
+
+    with open(path) as f:
+        assert "#EXT-X-STREAM-INF:BANDWIDTH=896000\n" in f.read()
+
+
+@requires_ffmpeg
+def test_probe_video(tmp_path):
+    clip = make_clip(tmp_path / "clip.mp4", seconds=2, fps=30)
+
+    info = probe_video(clip)
+
+    assert info["width"] == 320
+    assert info["height"] == 180
+    assert info["codec"] == "h264"
+    assert info["duration"] == pytest.approx(2, abs=0.1)
+
+
+@requires_ffmpeg
+def test_probe_video_rejects_non_video(tmp_path):
+    path = tmp_path / "not_a_video.mp4"
+    path.write_bytes(b"not a video")
+
+    with pytest.raises(RuntimeError):
+        probe_video(str(path))
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("fps", [24, 30, 60])
+def test_segments_match_segment_duration(tmp_path, fps):
+    seconds = HLS_SEGMENT_SECONDS * 2 + 1
+    clip = make_clip(tmp_path / "clip.mp4", seconds=seconds, fps=fps)
+    output_dir = tmp_path / "360p"
+    progress = []
+
+    transcoding._run_ffmpeg_rendition(clip, str(output_dir), RENDITIONS[0], seconds, progress.append)
+
+    with open(os.path.join(output_dir, "index.m3u8")) as f:
+        durations = [float(value) for value in re.findall(r"#EXTINF:([\d.]+),", f.read())]
+    # Все сегменты, кроме последнего, ровно HLS_SEGMENT_SECONDS при любой частоте кадров
+    assert durations[:-1] == pytest.approx([HLS_SEGMENT_SECONDS] * 2, abs=0.05)
+    assert durations[-1] == pytest.approx(1, abs=0.1)
+    assert progress[-1] == 1.0
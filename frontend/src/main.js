@@ -32,8 +32,19 @@ axios.interceptors.request.use(
 // Обработка ответов с ошибками авторизации
 axios.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
     if (error.response && error.response.status === 401) {
+      // Истекший токен доступа обновляем и повторяем запрос
+      const retry = authService.retryWithRefresh(error, axios);
+      if (retry) {
+        try {
+          return await retry;
+        } catch (retryError) {
+          if (!retryError.response || retryError.response.status !== 401) {
+            return Promise.reject(retryError);
+          }
+        }
+      }
       console.log('Получен статус 401 - перенаправление на страницу входа');
       authService.logout();
       router.push('/login');
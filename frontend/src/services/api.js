@@ -33,9 +33,23 @@ apiClient.interceptors.request.use(
 // Добавляем перехватчик для логирования ошибок
 apiClient.interceptors.response.use(
   response => response,
-  error => {
+  async error => {
     console.error('Ошибка API:', error.message);
     
+    // Истекший токен доступа обновляем и повторяем запрос
+    if (error.response && error.response.status === 401) {
+      const retry = AuthService.retryWithRefresh(error, apiClient);
+      if (retry) {
+        try {
+          return await retry;
+        } catch (retryError) {
+          if (!retryError.response || retryError.response.status !== 401) {
+            return Promise.reject(retryError);
+          }
+        }
+      }
+    }
+    
     // Проверка на истечение сессии
     if (error.response && error.response.status === 401 && AuthService.isAuthenticated()) {
       console.warn('Сессия истекла, выполняется выход');
@@ -105,10 +105,79 @@ class AuthService {
   }
 
   /**
-   * Выход пользователя из системы
+   * Выход пользователя из системы.
+   * Токены сессии отзываются на сервере; ошибка отзыва не мешает выходу
    */
   logout() {
+    const user = this.getCurrentUser();
     localStorage.removeItem('user');
+    if (user && user.access_token) {
+      axios.post(
+        `${API_URL}/auth/logout`,
+        { refresh_token: user.refresh_token },
+        { headers: { Authorization: `Bearer ${user.access_token}` } }
+      ).catch(() => {});
+    }
+  }
+
+  /**
+   * Обновление токена доступа по токену обновления.
+   * Одновременные вызовы ожидают один запрос к серверу
+   * @returns {Promise<string>} - Новый токен доступа
+   */
+  refreshSession() {
+    if (!this.refreshPromise) {
+      const user = this.getCurrentUser();
+      const usedRefreshToken = user?.refresh_token;
+      this.refreshPromise = (async () => {
+        if (!usedRefreshToken) {
+          throw new Error('Нет токена обновления');
+        }
+        try {
+          const response = await axios.post(`${API_URL}/auth/refresh`, {
+            refresh_token: usedRefreshToken
+          });
+          localStorage.setItem('user', JSON.stringify({ ...this.getCurrentUser(), ...response.data }));
+          return response.data.access_token;
+        } catch (error) {
+          // Токен могла уже обновить другая вкладка
+          const current = this.getCurrentUser();
+          if (current && current.refresh_token && current.refresh_token !== usedRefreshToken) {
+            return current.access_token;
+          }
+          throw error;
+        }
+      })().finally(() => {
+        this.refreshPromise = null;
+      });
+    }
+    return this.refreshPromise;
+  }
+
+  /**
+   * Повтор запроса, отклоненного с кодом 401, после обновления токена доступа
+   * @param {Object} error - Ошибка axios
+   * @param {Function} client - Экземпляр axios, которым выполняется повтор
+   * @returns {Promise<Object>|null} - Ответ повторного запроса или null, если повтор невозможен
+   */
+  retryWithRefresh(error, client) {
+    const config = error.config;
+    const url = config?.url || '';
+    if (
+      !config ||
+      config._retried ||
+      !this.getCurrentUser()?.refresh_token ||
+      url.includes('/auth/login') ||
+      url.includes('/auth/refresh') ||
+      url.includes('/auth/logout')
+    ) {
+      return null;
+    }
+    config._retried = true;
+    return this.refreshSession().then(token => {
+      config.headers.Authorization = `Bearer ${token}`;
+      return client(config);
+    });
   }
 
   /**